@@ -0,0 +1,109 @@
+"""
+Benchmark for the evaluation result write path.
+Compares one update_one round trip per test set (the previous path) with
+BulkResultWriter against a local MongoDB.
+
+Usage:
+    python benchmark_writes.py --items 5000 --concurrency 32 --batch-size 200
+
+Uses a scratch database that is dropped when the benchmark finishes.
+"""
+import argparse
+import asyncio
+import os
+import time
+import uuid
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from dotenv import load_dotenv
+
+from result_writer import BulkResultWriter
+
+load_dotenv()
+
+MONGODB_URI = os.getenv("MONGODB_URI", "mongodb://localhost:27017")
+DATABASE_NAME = "evalsgenie_benchmark"
+
+
+def result_update(run_id: str, idx: int) -> dict:
+    """Build the same $set a run writes for one test set"""
+    return {"$set": {
+        "last_status": ("pass", "fail", "warn")[idx % 3],
+        "last_agent_answer": f"Benchmark agent answer {idx}",
+        "last_evaluation_reasoning": "Benchmark reasoning",
+        "last_run_id": run_id,
+        "confidence_score": 90.0
+    }}
+
+
+async def seed(collection, items: int):
+    await collection.delete_many({})
+    await collection.insert_many([
+        {"_id": str(i), "domain_id": "benchmark", "question": f"q{i}", "ground_truth": f"g{i}", "difficulty": "easy"}
+        for i in range(items)
+    ])
+
+
+async def bench_update_one(collection, items: int, concurrency: int) -> float:
+    """Previous path: one update_one per result, issued as items complete"""
+    run_id = str(uuid.uuid4())
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def write(idx: int):
+        async with semaphore:
+            await collection.update_one({"_id": str(idx)}, result_update(run_id, idx))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(write(i) for i in range(items)))
+    return time.perf_counter() - started
+
+
+async def bench_bulk_writer(collection, items: int, concurrency: int, batch_size: int) -> float:
+    """New path: results buffered and flushed with unordered bulk_write"""
+    run_id = str(uuid.uuid4())
+    semaphore = asyncio.Semaphore(concurrency)
+
+    started = time.perf_counter()
+    async with BulkResultWriter(collection, batch_size=batch_size) as writer:
+        async def write(idx: int):
+            async with semaphore:
+                await writer.update({"_id": str(idx)}, result_update(run_id, idx))
+
+        await asyncio.gather(*(write(i) for i in range(items)))
+    elapsed = time.perf_counter() - started
+
+    if writer.written != items or writer.failed:
+        print(f"⚠️  Bulk writer wrote {writer.written}/{items} results ({writer.failed} failed)")
+    return elapsed
+
+
+async def main(items: int, concurrency: int, batch_size: int, repeat: int):
+    client = AsyncIOMotorClient(MONGODB_URI)
+    collection = client[DATABASE_NAME]["test_sets"]
+
+    print(f"📊 Writing {items} results, concurrency={concurrency}, batch_size={batch_size}")
+    try:
+        await seed(collection, items)
+        timings = {"update_one": [], "bulk_write": []}
+        for _ in range(repeat):
+            timings["update_one"].append(await bench_update_one(collection, items, concurrency))
+            timings["bulk_write"].append(await bench_bulk_writer(collection, items, concurrency, batch_size))
+
+        for name, runs in timings.items():
+            best = min(runs)
+            print(f"   {name:<11} best {best * 1000:8.1f}ms  ({items / best:9.0f} results/s)")
+        speedup = min(timings["update_one"]) / min(timings["bulk_write"])
+        print(f"✅ bulk_write is {speedup:.1f}x faster")
+    finally:
+        await client.drop_database(DATABASE_NAME)
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark evaluation result writes")
+    parser.add_argument("--items", type=int, default=5000, help="Results to write per pass")
+    parser.add_argument("--concurrency", type=int, default=32, help="Concurrent writers (as in a run)")
+    parser.add_argument("--batch-size", type=int, default=200, help="BulkResultWriter batch size")
+    parser.add_argument("--repeat", type=int, default=3, help="Passes per path; the best is reported")
+    args = parser.parse_args()
+    asyncio.run(main(args.items, args.concurrency, args.batch_size, args.repeat))
@@ -0,0 +1,148 @@
+"""
+Bootstrap confidence intervals and run-vs-run significance tests.
+Resampling n items with replacement only changes how many items fall in each
+(difficulty, status) cell, so a resample of the per-item results is drawn as
+one multinomial over the cells. That makes the cost independent of the number
+of items: 10^4 resamples of a 10^5-item run are a few (B x cells) arrays.
+Resampling is stratified by difficulty, since a suite's difficulty mix is fixed.
+Mean latency within a cell is resampled from its mean and variance (normal
+approximation), which the rollups keep as sums and sums of squares.
+"""
+import os
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from models import EvalMetrics, MetricInterval
+
+# Bootstrap resamples per interval
+BOOTSTRAP_RESAMPLES = int(os.getenv("BOOTSTRAP_RESAMPLES", "10000"))
+
+# Confidence level of reported intervals
+BOOTSTRAP_CONFIDENCE = float(os.getenv("BOOTSTRAP_CONFIDENCE", "0.95"))
+
+# Fixed seed so the same counts always give the same intervals (and responses stay cacheable)
+BOOTSTRAP_SEED = int(os.getenv("BOOTSTRAP_SEED", "0"))
+
+VERDICTS = ("pass", "warn", "fail")
+
+
+def bootstrap_samples(
+    groups: List[dict],
+    tiers: Optional[Dict[str, Dict[str, int]]] = None,
+    weights: Optional[Dict[str, float]] = None,
+    resamples: int = BOOTSTRAP_RESAMPLES,
+    seed: int = BOOTSTRAP_SEED
+) -> Dict[str, np.ndarray]:
+    """
+    Bootstrap distributions (one value per resample) of every metric from
+    per-(status, difficulty) groups (see rollups.rollup_groups) and per-tier
+    status counts. Keys: pass_rate, overall_score, hallucination_rate,
+    avg_latency, difficulty:<Name> and tier:<name>. Errored items are left out.
+    """
+    rng = np.random.default_rng(seed)
+    samples: Dict[str, np.ndarray] = {}
+    strata: Dict[str, Dict[str, dict]] = {}
+    for g in groups:
+        if g["status"] in VERDICTS and g["count"]:
+            strata.setdefault(g["difficulty"] or "unknown", {})[g["status"]] = g
+    if not strata:
+        return samples
+
+    passed = np.zeros(resamples)
+    warned = np.zeros(resamples)
+    total = 0.0
+    latency_sum = np.zeros(resamples)
+    timed = np.zeros(resamples)
+    for difficulty, cells in sorted(strata.items()):
+        weight = weights.get(difficulty, 1.0) if weights else 1.0
+        counts = np.array([cells[s]["count"] if s in cells else 0 for s in VERDICTS], dtype=float)
+        n = int(counts.sum())
+        drawn = rng.multinomial(n, counts / n, size=resamples)
+        passed += weight * drawn[:, 0]
+        warned += weight * drawn[:, 1]
+        total += weight * n
+        samples[f"difficulty:{difficulty.capitalize()}"] = drawn[:, 0] / n * 100
+
+        for index, status in enumerate(VERDICTS):
+            cell = cells.get(status)
+            if not cell or not cell.get("timed"):
+                continue
+            # Resampled items of this cell that carry a latency, and the sum of their latencies
+            share = cell["timed"] / cell["count"]
+            m = drawn[:, index] * share
+            mean = cell["latency_total"] / cell["timed"]
+            variance = max(0.0, cell.get("latency_sq", 0.0) / cell["timed"] - mean * mean)
+            noise = rng.standard_normal(resamples) * np.sqrt(m * variance)
+            latency_sum += weight * (m * mean + noise)
+            timed += weight * m
+
+    samples["pass_rate"] = passed / total * 100
+    samples["overall_score"] = (passed + 0.5 * warned) / total * 100
+    samples["hallucination_rate"] = (total - passed - warned) / total * 100
+    if timed.any():
+        samples["avg_latency"] = np.divide(latency_sum, timed, out=np.zeros(resamples), where=timed > 0)
+
+    for tier, statuses in sorted((tiers or {}).items()):
+        counts = np.array([statuses.get(s, 0) for s in VERDICTS], dtype=float)
+        n = int(counts.sum())
+        if n:
+            samples[f"tier:{tier}"] = rng.multinomial(n, counts / n, size=resamples)[:, 0] / n * 100
+    return samples
+
+
+def percentile_interval(values: np.ndarray, confidence: float = BOOTSTRAP_CONFIDENCE) -> Tuple[float, float]:
+    alpha = (1 - confidence) / 2
+    low, high = np.quantile(values, [alpha, 1 - alpha])
+    return round(float(low), 2), round(float(high), 2)
+
+
+def with_intervals(
+    metrics: EvalMetrics,
+    groups: List[dict],
+    tiers: Optional[Dict[str, Dict[str, int]]] = None,
+    weights: Optional[Dict[str, float]] = None
+) -> EvalMetrics:
+    """Attach bootstrap confidence intervals to metrics computed from the same counts"""
+    samples = bootstrap_samples(groups, tiers, weights)
+    if not samples:
+        return metrics
+    intervals = {name: percentile_interval(values) for name, values in samples.items()}
+    for breakdown, prefix in ((metrics.metric_breakdown, "difficulty"), (metrics.tier_breakdown, "tier")):
+        for item in breakdown:
+            interval = intervals.get(f"{prefix}:{item.category}")
+            if interval:
+                item.low, item.high = interval
+    metrics.confidence = BOOTSTRAP_CONFIDENCE
+    metrics.intervals = {
+        name: MetricInterval(low=low, high=high)
+        for name, (low, high) in intervals.items() if ":" not in name
+    }
+    return metrics
+
+
+def compare_samples(
+    candidate: Dict[str, np.ndarray],
+    baseline: Dict[str, np.ndarray],
+    confidence: float = BOOTSTRAP_CONFIDENCE
+) -> Dict[str, dict]:
+    """
+    Difference (candidate - baseline) of every metric both runs have, with a
+    bootstrap interval and a two-sided p-value for "no difference". The runs
+    are resampled independently.
+    """
+    comparison = {}
+    for name in sorted(set(candidate) & set(baseline)):
+        difference = candidate[name] - baseline[name]
+        # Share of resamples on each side of zero; ties count half to each side
+        below = float(np.mean(difference < 0) + 0.5 * np.mean(difference == 0))
+        p_value = min(1.0, 2 * min(below, 1 - below))
+        low, high = percentile_interval(difference, confidence)
+        comparison[name] = {
+            "difference": round(float(np.mean(difference)), 2),
+            "low": low,
+            "high": high,
+            "p_value": round(p_value, 4),
+            "significant": p_value < 1 - confidence
+        }
+    return comparison
@@ -0,0 +1,139 @@
+"""
+Two-tier caches for evaluation: judge verdicts and recorded agent answers.
+An in-process LRU sits in front of a MongoDB collection so entries survive
+restarts and are shared between processes.
+"""
+from fastapi import APIRouter, Depends
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List, Optional
+import hashlib
+import json
+import os
+
+from database import get_collection
+from auth import get_current_user
+from response_cache import response_cache
+
+# Entries kept in the in-process tier of each cache
+CACHE_MEMORY_SIZE = int(os.getenv("CACHE_MEMORY_SIZE", "10000"))
+
+# Seconds a judge verdict is kept in MongoDB before TTL eviction
+JUDGE_CACHE_TTL_SECONDS = int(os.getenv("JUDGE_CACHE_TTL_SECONDS", str(30 * 24 * 3600)))
+
+router = APIRouter()
+
+
+def content_hash(*parts: str) -> str:
+    """Stable SHA-256 over an ordered tuple of strings"""
+    return hashlib.sha256(json.dumps(parts, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+class TieredCache:
+    """LRU dict in front of a MongoDB collection keyed by `_id`"""
+
+    def __init__(self, collection_name: str, max_size: int = CACHE_MEMORY_SIZE):
+        self.collection_name = collection_name
+        self.max_size = max_size
+        self._memory: OrderedDict = OrderedDict()
+        self.memory_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+
+    def _remember(self, key: str, value: dict):
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        if len(self._memory) > self.max_size:
+            self._memory.popitem(last=False)
+
+    async def get(self, key: str) -> Optional[dict]:
+        """Look a key up in memory, then in MongoDB; a failed lookup counts as a miss"""
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            self.memory_hits += 1
+            return self._memory[key]
+
+        try:
+            doc = await get_collection(self.collection_name).find_one({"_id": key}, {"value": 1})
+        except Exception as e:
+            print(f"Cache lookup in {self.collection_name} failed: {e}")
+            doc = None
+        if doc is not None:
+            self.db_hits += 1
+            self._remember(key, doc["value"])
+            return doc["value"]
+
+        self.misses += 1
+        return None
+
+    async def set(self, key: str, value: dict, **fields):
+        """Store a value in both tiers; extra fields are stored alongside it in MongoDB"""
+        self._remember(key, value)
+        try:
+            await get_collection(self.collection_name).update_one(
+                {"_id": key},
+                {"$set": {"value": value, "created_at": datetime.utcnow(), **fields}},
+                upsert=True
+            )
+        except Exception as e:
+            print(f"Cache write to {self.collection_name} failed: {e}")
+
+    def stats(self) -> dict:
+        lookups = self.memory_hits + self.db_hits + self.misses
+        hits = self.memory_hits + self.db_hits
+        return {
+            "memory_entries": len(self._memory),
+            "memory_hits": self.memory_hits,
+            "db_hits": self.db_hits,
+            "misses": self.misses,
+            "hit_rate": round(hits / lookups * 100, 2) if lookups else 0.0
+        }
+
+
+async def ensure_cache_indexes():
+    """Create the TTL index that evicts stale judge verdicts"""
+    await get_collection("judge_verdicts").create_index("created_at", expireAfterSeconds=JUDGE_CACHE_TTL_SECONDS)
+
+
+# Judge verdicts keyed by (judge model, prompt template, question, ground truth, agent answer)
+verdict_cache = TieredCache("judge_verdicts")
+
+# Recorded agent answers keyed by (domain, test set, agent config hash)
+answer_cache = TieredCache("agent_answers")
+
+
+def answer_key(domain_id: str, test_set_id: str, config_hash: str) -> str:
+    """Cache key of a recorded agent answer"""
+    return content_hash(domain_id, test_set_id, config_hash)
+
+
+async def load_recorded_answers(domain_id: str, test_sets: List[dict], config_hash: str) -> Dict[str, str]:
+    """
+    Fetch recorded agent answers for a batch of test sets in one query.
+    Recordings made for a different question text are ignored.
+    Returns a map of test set ID to answer.
+    """
+    keys = {answer_key(domain_id, ts["_id"], config_hash): ts for ts in test_sets}
+    docs = await get_collection("agent_answers").find(
+        {"_id": {"$in": list(keys)}},
+        {"value": 1, "question": 1}
+    ).to_list(length=None)
+
+    answers = {}
+    for doc in docs:
+        test_set = keys[doc["_id"]]
+        if doc.get("question") == test_set["question"]:
+            answers[test_set["_id"]] = doc["value"]["answer"]
+    answer_cache.db_hits += len(answers)
+    answer_cache.misses += len(test_sets) - len(answers)
+    return answers
+
+
+@router.get("/cache/stats")
+async def get_cache_stats(current_user: dict = Depends(get_current_user)):
+    """Hit/miss counters for the evaluation caches in this process"""
+    return {
+        "judge_verdicts": verdict_cache.stats(),
+        "agent_answers": answer_cache.stats(),
+        "responses": response_cache.stats()
+    }
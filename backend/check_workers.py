@@ -0,0 +1,157 @@
+"""
+Local multi-process check of the worker queue.
+Seeds a scratch database with one worker-executed run, leases part of it to
+a "crashed" worker that never finishes, starts N worker processes and
+verifies that every test set ends up with exactly one result and that the
+run's counters match the recorded results.
+
+Usage:
+    python check_workers.py --items 2000 --workers 4
+
+Needs a local MongoDB; no Gemini key is used (agent and judge run in mock
+mode). The scratch database is dropped when the check finishes.
+"""
+import argparse
+import asyncio
+import os
+import signal
+import subprocess
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from dotenv import load_dotenv
+
+load_dotenv()
+
+MONGODB_URI = os.getenv("MONGODB_URI", "mongodb://localhost:27017")
+DATABASE_NAME = "evalsgenie_worker_check"
+DOMAIN_ID = "worker-check"
+
+
+async def seed(db, items: int, crashed_items: int, lease_seconds: float) -> str:
+    """Create test sets, a queued worker run and its items; lease some items to a dead worker"""
+    await db["test_sets"].insert_many([
+        {"_id": f"ts-{i}", "domain_id": DOMAIN_ID, "question": f"What is {i} + {i}?",
+         "ground_truth": str(2 * i), "difficulty": ("easy", "medium", "hard")[i % 3]}
+        for i in range(items)
+    ])
+    run_id = str(uuid.uuid4())
+    now = datetime.utcnow()
+    await db["eval_runs"].insert_one({
+        "_id": run_id, "domain_id": DOMAIN_ID, "status": "queued", "executor": "worker",
+        "test_set_ids": [f"ts-{i}" for i in range(items)], "total": items, "options": {},
+        "processed": 0, "passed": 0, "failed": 0, "warned": 0, "errored": 0,
+        "created_at": now, "heartbeat_at": now
+    })
+    await db["eval_run_items"].insert_many([
+        {"_id": f"{run_id}:ts-{i}", "run_id": run_id, "domain_id": DOMAIN_ID, "test_set_id": f"ts-{i}",
+         "difficulty": ("easy", "medium", "hard")[i % 3], "state": "pending", "attempts": 0, "lease_owner": None, "lease_expires_at": None, "created_at": now}
+        for i in range(items)
+    ])
+    # A worker that claimed these items and died: they must be re-queued when the lease expires
+    crashed = await db["eval_run_items"].find({}, {"_id": 1}).limit(crashed_items).to_list(length=None)
+    await db["eval_run_items"].update_many(
+        {"_id": {"$in": [c["_id"] for c in crashed]}},
+        {"$set": {"state": "leased", "lease_owner": "crashed-worker",
+                  "lease_expires_at": now + timedelta(seconds=lease_seconds)}, "$inc": {"attempts": 1}}
+    )
+    return run_id
+
+
+async def wait_for_run(db, run_id: str, timeout: float) -> dict:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        run = await db["eval_runs"].find_one({"_id": run_id})
+        if run["status"] == "completed":
+            return run
+        await asyncio.sleep(0.5)
+    raise TimeoutError(f"Run {run_id} did not complete within {timeout}s")
+
+
+async def verify(db, run_id: str, items: int) -> list:
+    """Return a list of problems; empty when recording was exactly-once"""
+    problems = []
+    results = await db["eval_results"].find({"run_id": run_id}, {"test_set_id": 1, "status": 1}).to_list(length=None)
+    test_set_ids = [r["test_set_id"] for r in results]
+    if len(results) != items:
+        problems.append(f"expected {items} results, found {len(results)}")
+    if len(set(test_set_ids)) != len(test_set_ids):
+        problems.append("some test sets have more than one result")
+    not_done = await db["eval_run_items"].count_documents({"run_id": run_id, "state": {"$ne": "done"}})
+    if not_done:
+        problems.append(f"{not_done} items are not done")
+
+    run = await db["eval_runs"].find_one({"_id": run_id})
+    counted = run["passed"] + run["failed"] + run["warned"] + run["errored"]
+    if run["processed"] != items or counted != items:
+        problems.append(f"run counters processed={run['processed']} verdicts={counted}, expected {items}")
+    statuses = {}
+    for r in results:
+        statuses[r["status"]] = statuses.get(r["status"], 0) + 1
+    expected = {"pass": run["passed"], "fail": run["failed"], "warn": run["warned"], "error": run["errored"]}
+    if any(statuses.get(k, 0) != v for k, v in expected.items()):
+        problems.append(f"run counters {expected} do not match results {statuses}")
+
+    stale = await db["test_sets"].count_documents({"domain_id": DOMAIN_ID, "last_run_id": {"$ne": run_id}})
+    if stale:
+        problems.append(f"{stale} test sets do not point at the run")
+    return problems
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Check exactly-once recording across worker processes")
+    parser.add_argument("--items", type=int, default=2000)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--batch-size", type=int, default=50)
+    parser.add_argument("--crashed-items", type=int, default=25)
+    parser.add_argument("--lease-seconds", type=float, default=3.0)
+    parser.add_argument("--timeout", type=float, default=300.0)
+    args = parser.parse_args()
+
+    client = AsyncIOMotorClient(MONGODB_URI)
+    await client.drop_database(DATABASE_NAME)
+    db = client[DATABASE_NAME]
+    env = {
+        **os.environ,
+        "DATABASE_NAME": DATABASE_NAME,
+        "GEMINI_API_KEY": "",
+        "WORKER_LEASE_SECONDS": str(args.lease_seconds),
+        "WORKER_HEARTBEAT_INTERVAL": str(args.lease_seconds / 3),
+        "WORKER_POLL_INTERVAL": "0.2"
+    }
+    workers = []
+    try:
+        run_id = await seed(db, args.items, args.crashed_items, args.lease_seconds)
+        started = time.perf_counter()
+        workers = [
+            subprocess.Popen(
+                [sys.executable, "worker.py", "--batch-size", str(args.batch_size), "--worker-id", f"check-{n}"],
+                cwd=os.path.dirname(os.path.abspath(__file__)),
+                env=env
+            )
+            for n in range(args.workers)
+        ]
+        await wait_for_run(db, run_id, args.timeout)
+        elapsed = time.perf_counter() - started
+
+        problems = await verify(db, run_id, args.items)
+        print(f"{args.items} items, {args.workers} workers: {elapsed:.2f}s ({args.items / elapsed:.0f} items/s)")
+        if problems:
+            for problem in problems:
+                print(f"FAIL: {problem}")
+            sys.exit(1)
+        print("OK: every item recorded exactly once")
+    finally:
+        for worker in workers:
+            worker.send_signal(signal.SIGINT)
+        for worker in workers:
+            worker.wait()
+        await client.drop_database(DATABASE_NAME)
+        client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
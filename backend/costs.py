@@ -0,0 +1,245 @@
+"""
+Token and cost accounting for evaluation runs.
+Prices every agent and judge call from a per-model price table, aggregates
+usage per domain and model, and estimates the cost of a run before it starts
+from the domain's historical per-item token usage.
+"""
+from fastapi import APIRouter, HTTPException, Depends, Body
+from typing import Dict, List, Optional
+import json
+import os
+
+from database import get_collection
+from models import EvalRunRequest
+from auth import get_current_user
+from llm import model_settings, LLM_EXPECTED_OUTPUT_TOKENS
+
+# USD per million tokens; cached prompt tokens are billed at the cached rate instead of the prompt rate
+DEFAULT_PRICE_TABLE = {
+    "gemini-2.5-flash": {"prompt": 0.30, "completion": 2.50, "cached": 0.075},
+    "gemini-2.5-flash-lite": {"prompt": 0.10, "completion": 0.40, "cached": 0.025},
+    "gemini-2.5-pro": {"prompt": 1.25, "completion": 10.00, "cached": 0.31},
+    "gemini-2.0-flash": {"prompt": 0.10, "completion": 0.40, "cached": 0.025}
+}
+
+# JSON object overriding or extending the price table, e.g. {"my-model": {"prompt": 1, "completion": 2, "cached": 0.5}}
+PRICE_TABLE = {**DEFAULT_PRICE_TABLE, **json.loads(os.getenv("LLM_PRICE_TABLE", "{}"))}
+
+# Recent results per domain used for historical per-item averages
+COST_ESTIMATE_HISTORY = int(os.getenv("COST_ESTIMATE_HISTORY", "500"))
+
+router = APIRouter()
+
+_unpriced_models: set = set()
+
+
+def call_cost(usage: dict, model_name: str) -> float:
+    """USD cost of one call's usage (prompt/completion/cached tokens); unknown models cost 0"""
+    price = PRICE_TABLE.get(model_name)
+    if price is None:
+        if model_name not in _unpriced_models:
+            _unpriced_models.add(model_name)
+            print(f"No price configured for model {model_name}; its calls are counted as free")
+        return 0.0
+    cached = usage.get("cached_tokens", 0)
+    uncached = max(0, usage.get("prompt_tokens", 0) - cached)
+    return (
+        uncached * price["prompt"]
+        + cached * price.get("cached", price["prompt"])
+        + usage.get("completion_tokens", 0) * price["completion"]
+    ) / 1_000_000
+
+
+def price_tokens(tokens: dict, models: dict) -> dict:
+    """Add a cost_usd to the agent and judge usage of one item"""
+    return {
+        "agent": {**tokens["agent"], "cost_usd": call_cost(tokens["agent"], models["agent_model"])},
+        "judge": {**tokens["judge"], "cost_usd": call_cost(tokens["judge"], models["judge_model"])}
+    }
+
+
+async def usage_by_model(match: dict) -> List[dict]:
+    """Tokens and cost per model over the eval_results matching `match`"""
+    groups = await get_collection("eval_results").aggregate([
+        {"$match": match},
+        {"$project": {"usage": [
+            {"model": "$models.agent_model", "tokens": "$tokens.agent"},
+            {"model": "$models.judge_model", "tokens": "$tokens.judge"}
+        ]}},
+        {"$unwind": "$usage"},
+        {"$match": {"usage.model": {"$ne": None}}},
+        {"$group": {
+            "_id": "$usage.model",
+            "calls": {"$sum": {"$cond": [{"$gt": ["$usage.tokens.prompt_tokens", 0]}, 1, 0]}},
+            "prompt_tokens": {"$sum": "$usage.tokens.prompt_tokens"},
+            "completion_tokens": {"$sum": "$usage.tokens.completion_tokens"},
+            "cached_tokens": {"$sum": "$usage.tokens.cached_tokens"},
+            "cost_usd": {"$sum": "$usage.tokens.cost_usd"}
+        }},
+        {"$sort": {"_id": 1}}
+    ]).to_list(length=None)
+    return [
+        {
+            "model": g["_id"],
+            "calls": g["calls"],
+            "prompt_tokens": round(g["prompt_tokens"]),
+            "completion_tokens": round(g["completion_tokens"]),
+            "cached_tokens": round(g["cached_tokens"]),
+            "cost_usd": round(g["cost_usd"], 6)
+        }
+        for g in groups
+    ]
+
+
+@router.get("/domains/{domain_id}/costs")
+async def get_domain_costs(domain_id: str, current_user: dict = Depends(get_current_user)):
+    """Tokens and cost of every evaluation in a domain, in total, per model and per run"""
+    by_model = await usage_by_model({"domain_id": domain_id})
+    runs = await get_collection("eval_runs").find(
+        {"domain_id": domain_id, "cost_usd": {"$exists": True}},
+        {"status": 1, "tokens": 1, "cost_usd": 1, "created_at": 1}
+    ).sort("created_at", -1).limit(50).to_list(length=50)
+    return {
+        "domain_id": domain_id,
+        "prompt_tokens": sum(m["prompt_tokens"] for m in by_model),
+        "completion_tokens": sum(m["completion_tokens"] for m in by_model),
+        "cached_tokens": sum(m["cached_tokens"] for m in by_model),
+        "cost_usd": round(sum(m["cost_usd"] for m in by_model), 6),
+        "by_model": by_model,
+        "recent_runs": [
+            {
+                "run_id": r["_id"],
+                "status": r["status"],
+                "tokens": r.get("tokens", {}),
+                "cost_usd": r.get("cost_usd", 0.0),
+                "created_at": r["created_at"]
+            }
+            for r in runs
+        ]
+    }
+
+
+@router.get("/runs/{run_id}/costs")
+async def get_run_costs(run_id: str, current_user: dict = Depends(get_current_user)):
+    """Tokens and cost of one run, in total and per model"""
+    run = await get_collection("eval_runs").find_one(
+        {"_id": run_id}, {"tokens": 1, "cost_usd": 1, "options.budget_usd": 1}
+    )
+    if not run:
+        raise HTTPException(status_code=404, detail="Evaluation run not found")
+    return {
+        "run_id": run_id,
+        "tokens": run.get("tokens", {}),
+        "cost_usd": run.get("cost_usd", 0.0),
+        "budget_usd": run.get("options", {}).get("budget_usd"),
+        "by_model": await usage_by_model({"run_id": run_id})
+    }
+
+
+async def historical_usage(domain_id: str) -> Optional[Dict[str, dict]]:
+    """Average agent and judge usage per item over the domain's recent evaluated results"""
+    results = await get_collection("eval_results").find(
+        {"domain_id": domain_id, "answer_source": {"$ne": "carried"}, "status": {"$ne": "error"}},
+        {"tokens": 1, "answer_source": 1}
+    ).sort("created_at", -1).limit(COST_ESTIMATE_HISTORY).to_list(length=COST_ESTIMATE_HISTORY)
+    live = [r for r in results if r.get("answer_source") == "live"]
+    if not results:
+        return None
+
+    def average(rows: List[dict], part: str) -> dict:
+        keys = ("prompt_tokens", "completion_tokens", "cached_tokens")
+        if not rows:
+            return {k: 0.0 for k in keys}
+        return {k: sum(r.get("tokens", {}).get(part, {}).get(k, 0) for r in rows) / len(rows) for k in keys}
+
+    # Replayed answers cost no agent tokens, so only live results describe the agent
+    return {"agent": average(live, "agent"), "judge": average(results, "judge"), "items": len(results)}
+
+
+@router.post("/domains/{domain_id}/cost-estimate")
+async def estimate_run_cost(
+    domain_id: str,
+    data: Optional[EvalRunRequest] = Body(default=None),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Estimate the cost of a run before starting it.
+    Accepts the run-eval request body. Per-item token usage is averaged over the
+    domain's recent results and priced with the domain's current models; without
+    history, usage is approximated from prompt sizes.
+    """
+    # Imported here: the engine prices its calls with this module
+    from engine import AGENT_PROMPT_TEMPLATE, agent_config_hash, judge_config_hash, test_set_fingerprint
+    from judges import JUDGE_PROMPT_TEMPLATE
+    from runs import load_domain_settings, domain_prompt_hash
+
+    options = data or EvalRunRequest()
+    test_sets = await get_collection("test_sets").find(
+        {"domain_id": domain_id}, {"question": 1, "ground_truth": 1, "last_fingerprint": 1}
+    ).to_list(length=None)
+    domain = await load_domain_settings(domain_id)
+    models = model_settings(domain)
+
+    items = len(test_sets)
+    if options.sample:
+        items = options.sample.size or max(1, round(options.sample.fraction * items))
+        items = min(items, len(test_sets))
+    elif options.incremental:
+        prompt_hash = await domain_prompt_hash(domain_id)
+        config_hash = agent_config_hash(models)
+        judge_hash = judge_config_hash(models, domain, options.judge_cascade)
+        items = sum(
+            1 for ts in test_sets
+            if ts.get("last_fingerprint") != test_set_fingerprint(ts, prompt_hash, config_hash, judge_hash)
+        )
+
+    history = await historical_usage(domain_id)
+    if history is not None:
+        basis = f"average of the domain's last {history['items']} evaluated results"
+        agent_usage, judge_usage = history["agent"], history["judge"]
+    else:
+        basis = "prompt size heuristic (no history)"
+        texts = [(ts["question"], ts["ground_truth"]) for ts in test_sets] or [("", "")]
+        question_tokens = sum(len(q) for q, _ in texts) / len(texts) / 4
+        truth_tokens = sum(len(t) for _, t in texts) / len(texts) / 4
+        agent_usage = {
+            "prompt_tokens": len(AGENT_PROMPT_TEMPLATE) / 4 + question_tokens,
+            "completion_tokens": LLM_EXPECTED_OUTPUT_TOKENS,
+            "cached_tokens": 0
+        }
+        judge_usage = {
+            "prompt_tokens": len(JUDGE_PROMPT_TEMPLATE) / 4 + question_tokens + truth_tokens + LLM_EXPECTED_OUTPUT_TOKENS,
+            "completion_tokens": LLM_EXPECTED_OUTPUT_TOKENS,
+            "cached_tokens": 0
+        }
+
+    # Replay only calls the agent for test sets without a recorded answer
+    agent_items = items
+    if options.answer_mode == "replay":
+        recorded = await get_collection("agent_answers").count_documents(
+            {"domain_id": domain_id, "agent_config_hash": agent_config_hash(models)}
+        )
+        agent_items = max(0, items - recorded)
+
+    agent_cost = call_cost(agent_usage, models["agent_model"])
+    judge_cost = call_cost(judge_usage, models["judge_model"])
+    estimated_cost = agent_cost * agent_items + judge_cost * items
+    return {
+        "domain_id": domain_id,
+        "items": items,
+        "agent_calls": agent_items,
+        "agent_model": models["agent_model"],
+        "judge_model": models["judge_model"],
+        "agent_cost_per_item_usd": round(agent_cost, 6),
+        "judge_cost_per_item_usd": round(judge_cost, 6),
+        "estimated_cost_usd": round(estimated_cost, 4),
+        "estimated_tokens": round(
+            agent_items * (agent_usage["prompt_tokens"] + agent_usage["completion_tokens"])
+            + items * (judge_usage["prompt_tokens"] + judge_usage["completion_tokens"])
+        ),
+        "basis": basis,
+        # Sequential runs usually stop early, so the full estimate is an upper bound
+        "upper_bound": options.sequential is not None,
+        "budget_usd": options.budget_usd,
+        "within_budget": options.budget_usd is None or estimated_cost <= options.budget_usd
+    }
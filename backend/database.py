@@ -7,7 +7,7 @@ load_dotenv()
 
 # MongoDB configuration
 MONGODB_URI = os.getenv("MONGODB_URI", "mongodb://localhost:27017")
-DATABASE_NAME = "evalsgenie"
+DATABASE_NAME = os.getenv("DATABASE_NAME", "evalsgenie")
 
 # Global database client
 client: AsyncIOMotorClient = None
@@ -48,4 +48,22 @@ def get_collection(collection_name: str):
     """Get a specific collection from the database"""
     if database is None:
         raise Exception("Database not initialized. Call connect_to_mongo() first.")
-    return database[collection_name]
\ No newline at end of file
+    return database[collection_name]
+
+async def ensure_indexes():
+    """Create indexes used by evaluation queries"""
+    await database["eval_runs"].create_index([("domain_id", 1), ("created_at", -1)])
+    await database["eval_runs"].create_index([("status", 1), ("heartbeat_at", 1)])
+    await database["eval_runs"].create_index([("domain_id", 1), ("status", 1), ("completed_at", -1)])
+    # Recently finished runs across all domains (dashboard)
+    await database["eval_runs"].create_index([("status", 1), ("completed_at", -1)])
+    await database["eval_results"].create_index([("domain_id", 1), ("run_id", 1)])
+    # Per-run counts by status and difficulty (rollup rebuilds, status-filtered result listings)
+    await database["eval_results"].create_index([("run_id", 1), ("status", 1), ("difficulty", 1), ("agent_latency_ms", 1)])
+    await database["test_sets"].create_index([("domain_id", 1), ("last_status", 1), ("difficulty", 1)])
+    await database["eval_run_items"].create_index([("state", 1), ("created_at", 1)])
+    await database["eval_run_items"].create_index([("run_id", 1), ("state", 1)])
+    await database["eval_run_items"].create_index([("lease_owner", 1), ("state", 1)])
+    await database["metric_history"].create_index([("domain_id", 1), ("timestamp", 1)])
+    await database["metric_history"].create_index([("timestamp", 1)])
+    await database["metrics_rollups"].create_index([("kind", 1), ("domain_id", 1)])
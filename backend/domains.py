@@ -2,6 +2,7 @@ from fastapi import APIRouter, HTTPException, status
 from typing import List
 from models import Domain, DomainUpdate
 from database import get_collection
+from response_cache import bump_generation
 
 router = APIRouter()
 
@@ -49,6 +50,7 @@ async def create_domain(domain: Domain):
         domain_dict["_id"] = domain_dict.pop("id")
         
         await collection.insert_one(domain_dict)
+        await bump_generation(domain.id)
         
         # Return the created domain
         return domain
@@ -115,6 +117,7 @@ async def update_domain(domain_id: str, domain_update: DomainUpdate):
             {"_id": domain_id},
             {"$set": update_data}
         )
+        await bump_generation(domain_id)
         
         # Fetch and return the updated domain
         updated_domain = await collection.find_one({"_id": domain_id})
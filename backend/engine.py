@@ -0,0 +1,205 @@
+"""
+Concurrent evaluation engine.
+Runs agent generation and judging for many test sets at once with a
+per-run and a process-wide concurrency limit.
+"""
+import asyncio
+import json
+import os
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from llm import GEMINI_API_KEY, DEFAULT_MODEL, generate_content, response_usage, empty_usage, model_settings
+from cache import content_hash
+from costs import price_tokens
+from judges import (
+    JudgeBatcher, evaluate_answer_with_gemini, cascade_verdict,
+    JUDGE_PROMPT_TEMPLATE, BATCH_JUDGE_PROMPT_TEMPLATE
+)
+
+# Maximum number of test sets evaluated at once across all runs
+EVAL_GLOBAL_CONCURRENCY = int(os.getenv("EVAL_GLOBAL_CONCURRENCY", "32"))
+
+# Default number of test sets evaluated at once within a single run
+EVAL_RUN_CONCURRENCY = int(os.getenv("EVAL_RUN_CONCURRENCY", "8"))
+
+_global_semaphore = asyncio.Semaphore(EVAL_GLOBAL_CONCURRENCY)
+
+# Default model used to generate agent answers (domains may override it)
+AGENT_MODEL = DEFAULT_MODEL
+
+AGENT_PROMPT_TEMPLATE = """You are a data analytics agent. Answer the following question as if you're analyzing business data:
+
+Question: {question}
+
+Provide a concise, data-driven answer."""
+
+# Helper Functions for Evaluation
+
+async def generate_agent_answer(
+    question: str,
+    model_name: str = AGENT_MODEL,
+    generation_config: Optional[dict] = None
+) -> dict:
+    """
+    Simulate a data analytics agent generating an answer to a question.
+    In a real scenario, this would call your actual agent.
+    For now, we'll use Gemini to generate a plausible answer.
+    Returns a dict with the answer text, whether the call failed, and token usage.
+    """
+    if not GEMINI_API_KEY:
+        # Fallback to mock answer if no API key
+        return {"answer": f"Mock agent answer for: {question}", "error": False, "usage": empty_usage()}
+
+    try:
+        prompt = AGENT_PROMPT_TEMPLATE.format(question=question)
+
+        response = await generate_content(prompt, model_name, generation_config)
+        return {"answer": response.text, "error": False, "usage": response_usage(response)}
+    except Exception as e:
+        print(f"Error generating agent answer: {e}")
+        return {"answer": f"Error generating answer: {str(e)}", "error": True, "usage": empty_usage()}
+
+
+def agent_config_hash(models: Optional[dict] = None) -> str:
+    """Hash of everything that determines the agent's answer besides the question"""
+    models = models or model_settings()
+    return content_hash(
+        models["agent_model"],
+        json.dumps(models["agent_generation_config"] or {}, sort_keys=True),
+        AGENT_PROMPT_TEMPLATE,
+        str(bool(GEMINI_API_KEY))
+    )
+
+
+def judge_config_hash(models: Optional[dict] = None, domain: Optional[dict] = None, cascade: bool = True) -> str:
+    """Hash of everything that determines a verdict besides the answer: judge model, prompts, batching and cascade"""
+    models = models or model_settings()
+    domain = domain or {}
+    batch_size = domain.get("judge_batch_size") or 1
+    return content_hash(
+        models["judge_model"],
+        JUDGE_PROMPT_TEMPLATE,
+        BATCH_JUDGE_PROMPT_TEMPLATE if batch_size > 1 else "",
+        str(batch_size),
+        str(bool(cascade)),
+        # The SQL tier parses queries in the domain's dialect
+        str(domain.get("dialect") or "") if cascade else ""
+    )
+
+
+def test_set_fingerprint(test_set: dict, prompt_hash: str, config_hash: str, judge_hash: str) -> str:
+    """Fingerprint of every input that determines a test set's result"""
+    return content_hash(test_set["question"], test_set["ground_truth"], prompt_hash, config_hash, judge_hash)
+
+
+# Engine
+
+async def evaluate_test_set(
+    test_set: dict,
+    recorded_answer: Optional[str] = None,
+    batcher: Optional[JudgeBatcher] = None,
+    cascade: bool = True,
+    sql_context: Optional[dict] = None,
+    models: Optional[dict] = None
+) -> dict:
+    """
+    Generate the agent answer for one test set and judge it against the ground truth.
+    When a recorded answer is given, generation is skipped and it is judged directly.
+    With `cascade`, deterministic judges get the first chance to decide the item;
+    only undecided items reach the LLM judge (batched if a batcher is given).
+    `models` (see llm.model_settings) selects the agent and judge models.
+    """
+    models = models or model_settings()
+    if recorded_answer is not None:
+        agent = {"answer": recorded_answer, "error": False, "usage": empty_usage()}
+        answer_source = "replay"
+        agent_latency_ms = None
+    else:
+        started = time.perf_counter()
+        agent = await generate_agent_answer(
+            test_set["question"], models["agent_model"], models["agent_generation_config"]
+        )
+        agent_latency_ms = round((time.perf_counter() - started) * 1000, 2)
+        answer_source = "live"
+
+    agent_answer = agent["answer"]
+    started = time.perf_counter()
+    verdict = None
+    if agent["error"]:
+        # Nothing to judge; the item is reported as an error rather than a verdict
+        verdict = {"status": "error", "reasoning": agent_answer, "decided_by": "agent_error"}
+    elif cascade:
+        verdict = await cascade_verdict(test_set["ground_truth"], agent_answer, sql_context)
+    if verdict is None:
+        if batcher:
+            verdict = await batcher.judge(test_set["question"], test_set["ground_truth"], agent_answer)
+        else:
+            verdict = await evaluate_answer_with_gemini(
+                test_set["question"], test_set["ground_truth"], agent_answer, models["judge_model"]
+            )
+    judge_latency_ms = round((time.perf_counter() - started) * 1000, 2)
+    tokens = price_tokens({"agent": agent["usage"], "judge": verdict.get("usage") or empty_usage()}, models)
+
+    return {
+        "test_set_id": test_set["_id"],
+        "question": test_set["question"],
+        "difficulty": test_set.get("difficulty"),
+        "status": verdict["status"],
+        "agent_answer": agent_answer,
+        "answer_source": answer_source,
+        "agent_error": agent["error"],
+        "reasoning": verdict["reasoning"],
+        "decided_by": verdict.get("decided_by", "llm"),
+        "confidence": verdict.get("confidence"),
+        "agent_latency_ms": agent_latency_ms,
+        "judge_latency_ms": judge_latency_ms,
+        "models": {"agent_model": models["agent_model"], "judge_model": models["judge_model"]},
+        "tokens": tokens,
+        "cost_usd": tokens["agent"]["cost_usd"] + tokens["judge"]["cost_usd"]
+    }
+
+
+async def run_engine(
+    test_sets: List[dict],
+    concurrency: Optional[int] = None,
+    on_result: Optional[Callable[[dict], Awaitable[None]]] = None,
+    recorded_answers: Optional[Dict[str, str]] = None,
+    judge_batch_size: int = 1,
+    cascade: bool = True,
+    sql_context: Optional[dict] = None,
+    stop: Optional[asyncio.Event] = None,
+    models: Optional[dict] = None
+) -> List[dict]:
+    """
+    Evaluate test sets concurrently.
+    At most `concurrency` items of this run are in flight, and at most
+    EVAL_GLOBAL_CONCURRENCY items across all runs in the process.
+    `on_result` is awaited for each item as soon as it finishes.
+    `recorded_answers` maps test set IDs to agent answers to replay.
+    With `judge_batch_size` > 1, judge calls are packed into batched prompts.
+    With `cascade`, deterministic judges decide items before the LLM judge;
+    `sql_context` (dialect, domain_id) lets the SQL tier parse and execute queries.
+    Once `stop` is set, items that have not started are skipped; items are
+    started in list order, and skipped items are left out of the returned results.
+    `models` (see llm.model_settings) selects the agent and judge models.
+    """
+    recorded_answers = recorded_answers or {}
+    models = models or model_settings()
+    batcher = JudgeBatcher(judge_batch_size, models["judge_model"]) if judge_batch_size > 1 else None
+    run_semaphore = asyncio.Semaphore(concurrency or EVAL_RUN_CONCURRENCY)
+
+    async def worker(test_set: dict) -> Optional[dict]:
+        async with run_semaphore:
+            async with _global_semaphore:
+                if stop is not None and stop.is_set():
+                    return None
+                result = await evaluate_test_set(
+                    test_set, recorded_answers.get(test_set["_id"]), batcher, cascade, sql_context, models
+                )
+        if on_result is not None:
+            await on_result(result)
+        return result
+
+    results = await asyncio.gather(*(worker(ts) for ts in test_sets))
+    return [r for r in results if r is not None]
@@ -1,25 +1,21 @@
-from fastapi import APIRouter, HTTPException, Depends
-from typing import List
+from fastapi import APIRouter, HTTPException, Depends, Body, Request
+from typing import Dict, List, Optional
 import uuid
 import random
-import os
-import google.generativeai as genai
-from dotenv import load_dotenv
 
 from database import get_collection
 from models import (
     TestSet, TestSetCreate,
-    EvalMetrics, MetricBreakdown
+    EvalMetrics,
+    EvalRunRequest
 )
 from auth import get_current_user
-
-# Load environment variables
-load_dotenv()
-
-# Configure Gemini API
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-if GEMINI_API_KEY:
-    genai.configure(api_key=GEMINI_API_KEY)
+from runs import create_run, start_run, RUN_QUEUED, RUN_EXECUTOR
+from run_items import enqueue_run_items
+from sampling import stratified_sample, stratum_weights
+from rollups import load_domain_rollup, load_run_rollup, rollup_groups, summarize_counts
+from bootstrap import BOOTSTRAP_CONFIDENCE, BOOTSTRAP_SEED, bootstrap_samples, compare_samples, with_intervals
+from response_cache import bump_generation, cached_response
 
 router = APIRouter()
 
@@ -41,6 +37,7 @@ async def list_test_sets(domain_id: str, current_user: dict = Depends(get_curren
         last_agent_answer=ts.get("last_agent_answer"),
         last_evaluation_reasoning=ts.get("last_evaluation_reasoning"),
         last_run_id=ts.get("last_run_id"),
+        last_decided_by=ts.get("last_decided_by"),
         confidence_score=ts.get("confidence_score")
     ) for ts in test_sets]
 
@@ -65,6 +62,7 @@ async def create_test_set(
     }
     
     await collection.insert_one(test_set_doc)
+    await bump_generation(domain_id)
     return TestSet(
         id=test_set_id,
         domain_id=domain_id,
@@ -87,110 +85,24 @@ async def delete_test_set(
     
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Test set not found")
+    await bump_generation(domain_id)
     
     return {"message": "Test set deleted successfully"}
 
 
-# Helper Functions for Evaluation
-
-async def generate_agent_answer(question: str) -> str:
-    """
-    Simulate a data analytics agent generating an answer to a question.
-    In a real scenario, this would call your actual agent.
-    For now, we'll use Gemini to generate a plausible answer.
-    """
-    if not GEMINI_API_KEY:
-        # Fallback to mock answer if no API key
-        return f"Mock agent answer for: {question}"
-    
-    try:
-        model = genai.GenerativeModel('gemini-2.5-flash')
-        prompt = f"""You are a data analytics agent. Answer the following question as if you're analyzing business data:
-
-Question: {question}
-
-Provide a concise, data-driven answer."""
-        
-        response = model.generate_content(prompt)
-        return response.text
-    except Exception as e:
-        print(f"Error generating agent answer: {e}")
-        return f"Error generating answer: {str(e)}"
-
-
-async def evaluate_answer_with_gemini(question: str, ground_truth: str, agent_answer: str) -> dict:
-    """
-    Use Gemini to evaluate if the agent's answer matches the ground truth.
-    Returns a dict with status ('pass', 'fail', 'warn') and reasoning.
-    """
-    if not GEMINI_API_KEY:
-        # Fallback to random evaluation if no API key
-        return {
-            "status": random.choice(["pass", "fail", "warn"]),
-            "reasoning": "No API key configured - using random evaluation"
-        }
-    
-    try:
-        model = genai.GenerativeModel('gemini-2.5-flash')
-        prompt = f"""You are an evaluation agent. Compare the agent's answer with the ground truth and determine if they match.
-
-Question: {question}
-
-Golden Answer: {ground_truth}
-
-Agent's Answer: {agent_answer}
-
-Evaluate if the agent's answer is:
-- PASS: Correct and matches the ground truth intent (even if wording differs)
-- FAIL: Incorrect or contradicts the ground truth
-- WARN: Partially correct or missing some details
-
-Respond in this exact format:
-STATUS: [PASS/FAIL/WARN]
-REASONING: [Brief explanation of your evaluation]"""
-        
-        response = model.generate_content(prompt)
-        result_text = response.text.strip()
-        
-        # Parse the response
-        status = "warn"  # default
-        reasoning = "Unable to parse evaluation result"
-        
-        lines = result_text.split('\n')
-        for line in lines:
-            if line.startswith('STATUS:'):
-                status_text = line.replace('STATUS:', '').strip().lower()
-                if 'pass' in status_text:
-                    status = 'pass'
-                elif 'fail' in status_text:
-                    status = 'fail'
-                elif 'warn' in status_text:
-                    status = 'warn'
-            elif line.startswith('REASONING:'):
-                reasoning = line.replace('REASONING:', '').strip()
-        
-        return {
-            "status": status,
-            "reasoning": reasoning
-        }
-    except Exception as e:
-        print(f"Error evaluating with Gemini: {e}")
-        return {
-            "status": "warn",
-            "reasoning": f"Error during evaluation: {str(e)}"
-        }
-
-
 # Evaluation Run Endpoint
 
 @router.post("/domains/{domain_id}/run-eval")
 async def run_evaluation(
     domain_id: str,
+    data: Optional[EvalRunRequest] = Body(default=None),
     current_user: dict = Depends(get_current_user)
 ):
     """
-    Trigger evaluation run - uses pre-seeded demo data for consistent results.
-    In production, this would use real Gemini API evaluation.
+    Queue an evaluation run and return its run_id immediately.
+    Agent answers are generated and judged concurrently in the background,
+    bounded by the per-run concurrency (request body or EVAL_RUN_CONCURRENCY)
+    and the process-wide EVAL_GLOBAL_CONCURRENCY limit.
     """
     collection = get_collection("test_sets")
     
@@ -200,113 +112,140 @@ async def run_evaluation(
     if not test_sets:
         raise HTTPException(status_code=400, detail="No test sets found for this domain")
     
-    # Generate a unique run ID
+    # Register the run and evaluate it in the background
     run_id = str(uuid.uuid4())
-    
-    # For demo purposes, use pre-defined results to maintain 82% accuracy
-    # In production, this would call Gemini API for real evaluation
-    demo_results = [
-        {"status": "pass", "answer": "Correct calculation approach", "reasoning": "Accurate formula and methodology", "confidence": 95.8},
-        {"status": "pass", "answer": "Query matches requirements", "reasoning": "Exact match with ground truth", "confidence": 98.2},
-        {"status": "pass", "answer": "Correct calculation method", "reasoning": "Proper CLV calculation", "confidence": 92.5},
-        {"status": "warn", "answer": "Partial implementation", "reasoning": "Missing final confirmation step", "confidence": 78.3},
-        {"status": "pass", "answer": "Correct SQL structure", "reasoning": "Proper GROUP BY usage", "confidence": 96.7},
-        {"status": "pass", "answer": "Accurate MRR calculation", "reasoning": "Correct aggregation", "confidence": 94.1},
-        {"status": "fail", "answer": "Incomplete analysis", "reasoning": "Missing feature usage and support tickets", "confidence": 45.2},
-        {"status": "pass", "answer": "Correct time calculation", "reasoning": "Proper AVG function usage", "confidence": 97.4},
-        {"status": "pass", "answer": "Proper forecasting approach", "reasoning": "Correct time series methodology", "confidence": 89.6},
-        {"status": "fail", "answer": "Incorrect customer count", "reasoning": "Should only count new customers", "confidence": 52.9},
-        {"status": "pass", "answer": "Correct profit margin query", "reasoning": "Proper ORDER BY and LIMIT", "confidence": 93.8},
-    ]
-    
-    # Update each test set with demo results
-    for idx, test_set in enumerate(test_sets):
-        if idx < len(demo_results):
-            result = demo_results[idx]
-            await collection.update_one(
-                {"_id": test_set["_id"]},
-                {"$set": {
-                    "last_status": result["status"],
-                    "last_agent_answer": result["answer"],
-                    "last_evaluation_reasoning": result["reasoning"],
-                    "last_run_id": run_id,
-                    "confidence_score": result["confidence"]
-                }}
-            )
+    options = (data or EvalRunRequest()).model_dump()
+    if options["sequential"] and options["sample"]:
+        raise HTTPException(status_code=400, detail="A run cannot be both sequential and sampled")
+    # Fix seeds up front so a resumed run keeps the same order and sample
+    for mode in ("sequential", "sample"):
+        if options[mode] and options[mode]["seed"] is None:
+            options[mode]["seed"] = random.randrange(2 ** 31)
+
+    executor, scope, sample = RUN_EXECUTOR, "full", None
+    if options["sequential"]:
+        # Early stopping needs one process to see every verdict as it arrives
+        executor, scope = "api", "sequential"
+    elif options["sample"]:
+        sample_options = options["sample"]
+        size = sample_options["size"] or max(1, round(sample_options["fraction"] * len(test_sets)))
+        test_sets, strata = stratified_sample(test_sets, size, sample_options["seed"])
+        scope = "sample"
+        sample = {"seed": sample_options["seed"], "size": len(test_sets), "strata": strata}
+
+    test_set_ids = [ts["_id"] for ts in test_sets]
+    await create_run(run_id, domain_id, test_set_ids, options, executor, scope, sample)
+    if executor == "worker":
+        # Standalone workers claim the items from eval_run_items
+        await enqueue_run_items(run_id, domain_id, test_sets)
+    else:
+        start_run(run_id, domain_id, test_sets, options)
     
     return {
-        "status": "completed",
+        "status": RUN_QUEUED,
         "run_id": run_id,
-        "test_sets_evaluated": len(test_sets),
-        "message": "Evaluation completed with demo results (82% accuracy)"
+        "total": len(test_sets),
+        "stream_url": f"/api/v1/runs/{run_id}/stream",
+        "message": "Sampled evaluation queued" if sample else "Evaluation queued"
     }
 
 
 # Metrics Dashboard Endpoint
 
+async def count_results(collection: str, match: dict, status_field: str) -> List[dict]:
+    """Count items per (status, difficulty) with a $group aggregation so only counts leave the database"""
+    groups = await get_collection(collection).aggregate([
+        {"$match": match},
+        {"$project": {"_id": 0, "status": f"${status_field}", "difficulty": 1}},
+        {"$group": {"_id": {"status": "$status", "difficulty": "$difficulty"}, "count": {"$sum": 1}}}
+    ]).to_list(length=None)
+    return [
+        {
+            "status": g["_id"].get("status"),
+            "difficulty": g["_id"].get("difficulty"),
+            "count": g["count"],
+            "latency_total": 0.0,
+            "timed": 0
+        }
+        for g in groups
+    ]
+
+
+async def load_run_counts(run_id: str) -> tuple:
+    """Groups, tier counts and sample weights behind a run's metrics (404 if the run does not exist)"""
+    run = await get_collection("eval_runs").find_one({"_id": run_id}, {"sample": 1})
+    if not run:
+        raise HTTPException(status_code=404, detail="Evaluation run not found")
+    rollup = await load_run_rollup(run_id)
+    weights = stratum_weights(run["sample"]["strata"]) if run.get("sample") else None
+    return rollup_groups(rollup), rollup.get("tiers") or {}, weights
+
+
+def metric_values(metrics: EvalMetrics) -> Dict[str, float]:
+    """Point estimates keyed like bootstrap samples"""
+    values = {name: getattr(metrics, name) for name in ("pass_rate", "overall_score", "hallucination_rate", "avg_latency")}
+    values.update({f"difficulty:{b.category}": b.value for b in metrics.metric_breakdown})
+    values.update({f"tier:{b.category}": b.value for b in metrics.tier_breakdown})
+    return values
+
+
+@router.get("/runs/{run_id}/metrics", response_model=EvalMetrics)
+async def get_run_metrics(run_id: str, current_user: dict = Depends(get_current_user)):
+    """
+    Get evaluation metrics for one run, with bootstrap confidence intervals.
+    For a sampled run, results are reweighted by difficulty to estimate the
+    full-suite metrics, and the response is marked as an estimate.
+    """
+    groups, tiers, weights = await load_run_counts(run_id)
+    return with_intervals(summarize_counts(groups, weights, tiers), groups, tiers, weights)
+
+
+@router.get("/runs/{run_id}/compare")
+async def compare_runs(run_id: str, baseline: str, current_user: dict = Depends(get_current_user)):
+    """
+    Test whether a run's metrics differ from a baseline run's.
+    Both runs are bootstrapped independently; each metric reports the difference
+    (run - baseline), its confidence interval and a two-sided p-value.
+    """
+    candidate_counts = await load_run_counts(run_id)
+    baseline_counts = await load_run_counts(baseline)
+    candidate_values = metric_values(summarize_counts(candidate_counts[0], candidate_counts[2], candidate_counts[1]))
+    baseline_values = metric_values(summarize_counts(baseline_counts[0], baseline_counts[2], baseline_counts[1]))
+    # Different seeds keep the two runs' resamples independent
+    comparison = compare_samples(
+        bootstrap_samples(*candidate_counts, seed=BOOTSTRAP_SEED),
+        bootstrap_samples(*baseline_counts, seed=BOOTSTRAP_SEED + 1)
+    )
+    return {
+        "run_id": run_id,
+        "baseline_run_id": baseline,
+        "confidence": BOOTSTRAP_CONFIDENCE,
+        "metrics": {
+            name: {"value": candidate_values.get(name), "baseline": baseline_values.get(name), **result}
+            for name, result in comparison.items()
+        }
+    }
+
+
 @router.get("/domains/{domain_id}/metrics", response_model=EvalMetrics)
 async def get_metrics(
     domain_id: str,
+    request: Request,
     current_user: dict = Depends(get_current_user)
 ):
     """
     Get evaluation metrics for a domain.
-    Calculates aggregations from test sets and returns mock data for other metrics.
+    Read from the domain's rollup, which holds the counts of its latest completed
+    full run, with bootstrap confidence intervals; domains without one fall back
+    to the last verdict on each test set (no latency). Served from the response
+    cache until the domain's data changes.
     """
-    collection = get_collection("test_sets")
-    
-    # Get all test sets for this domain
-    test_sets = await collection.find({"domain_id": domain_id}).to_list(length=None)
-    
-    if not test_sets:
-        # Return default metrics if no test sets exist
-        return EvalMetrics(
-            overall_score=0.0,
-            hallucination_rate=0.0,
-            avg_latency=0.0,
-            pass_rate=0.0,
-            metric_breakdown=[]
-        )
-    
-    # Calculate pass rate
-    total_tests = len(test_sets)
-    passed_tests = sum(1 for ts in test_sets if ts.get("last_status") == "pass")
-    pass_rate = (passed_tests / total_tests * 100) if total_tests > 0 else 0.0
-    
-    # Calculate metrics by difficulty
-    difficulty_stats = {}
-    for ts in test_sets:
-        difficulty = ts.get("difficulty", "unknown")
-        if difficulty not in difficulty_stats:
-            difficulty_stats[difficulty] = {"total": 0, "passed": 0}
-        difficulty_stats[difficulty]["total"] += 1
-        if ts.get("last_status") == "pass":
-            difficulty_stats[difficulty]["passed"] += 1
-    
-    # Create metric breakdown
-    metric_breakdown = []
-    for difficulty, stats in difficulty_stats.items():
-        rate = (stats["passed"] / stats["total"] * 100) if stats["total"] > 0 else 0.0
-        metric_breakdown.append(MetricBreakdown(
-            category=difficulty.capitalize(),
-            value=round(rate, 2)
-        ))
-    
-    # Generate mock metrics for other fields
-    # Overall score is based on pass rate with some variation
-    overall_score = round(pass_rate * random.uniform(0.9, 1.1), 2)
-    overall_score = min(100.0, max(0.0, overall_score))  # Clamp between 0-100
-    
-    # Mock hallucination rate (inverse of pass rate with noise)
-    hallucination_rate = round((100 - pass_rate) * random.uniform(0.3, 0.5), 2)
-    
-    # Mock average latency (200-800ms)
-    avg_latency = round(random.uniform(200, 800), 2)
-    
-    return EvalMetrics(
-        overall_score=overall_score,
-        hallucination_rate=hallucination_rate,
-        avg_latency=avg_latency,
-        pass_rate=round(pass_rate, 2),
-        metric_breakdown=metric_breakdown
-    )
\ No newline at end of file
+    async def compute() -> EvalMetrics:
+        rollup = await load_domain_rollup(domain_id)
+        if rollup is not None:
+            groups, tiers = rollup_groups(rollup), rollup.get("tiers") or {}
+            return with_intervals(summarize_counts(groups, tiers=tiers), groups, tiers)
+        groups = await count_results("test_sets", {"domain_id": domain_id}, "last_status")
+        return with_intervals(summarize_counts(groups), groups)
+
+    return await cached_response(request, domain_id, compute)
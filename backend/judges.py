@@ -0,0 +1,407 @@
+"""
+Judges that decide whether an agent answer matches the ground truth.
+Cheap deterministic judges run first and decide items with certainty;
+only the remaining items reach the Gemini judge, either one per call or
+packed several to a prompt by the batcher.
+"""
+import asyncio
+import json
+import os
+import random
+import re
+from typing import List, Optional, Tuple
+
+from llm import GEMINI_API_KEY, DEFAULT_MODEL, generate_content, response_usage
+from cache import content_hash, verdict_cache
+from sql_compare import extract_sql, sql_verdict
+
+# Default model used to judge agent answers (domains may override it)
+JUDGE_MODEL = DEFAULT_MODEL
+
+JUDGE_PROMPT_TEMPLATE = """You are an evaluation agent. Compare the agent's answer with the ground truth and determine if they match.
+
+Question: {question}
+
+Golden Answer: {ground_truth}
+
+Agent's Answer: {agent_answer}
+
+Evaluate if the agent's answer is:
+- PASS: Correct and matches the ground truth intent (even if wording differs)
+- FAIL: Incorrect or contradicts the ground truth
+- WARN: Partially correct or missing some details
+
+Respond in this exact format:
+STATUS: [PASS/FAIL/WARN]
+CONFIDENCE: [0-100, how confident you are in this evaluation]
+REASONING: [Brief explanation of your evaluation]"""
+
+BATCH_JUDGE_PROMPT_TEMPLATE = """You are an evaluation agent. For each numbered item below, compare the agent's answer with the ground truth and determine if they match.
+
+Evaluate each agent's answer as:
+- PASS: Correct and matches the ground truth intent (even if wording differs)
+- FAIL: Incorrect or contradicts the ground truth
+- WARN: Partially correct or missing some details
+
+Judge every item independently.
+
+{items}
+
+Respond with only a JSON array containing exactly one object per item, in item order:
+[{{"item": 1, "status": "PASS|FAIL|WARN", "confidence": 0-100, "reasoning": "Brief explanation of your evaluation"}}]"""
+
+BATCH_JUDGE_ITEM_TEMPLATE = """### Item {number}
+Question: {question}
+
+Golden Answer: {ground_truth}
+
+Agent's Answer: {agent_answer}"""
+
+# Seconds a partially filled judge batch waits for more items before it is sent
+JUDGE_BATCH_LINGER_SECONDS = float(os.getenv("JUDGE_BATCH_LINGER_SECONDS", "0.5"))
+
+# Relative tolerance for numeric answers to count as equal
+JUDGE_NUMERIC_TOLERANCE = float(os.getenv("JUDGE_NUMERIC_TOLERANCE", "0.001"))
+
+NUMBER_PATTERN = re.compile(r"[-+]?(?:\d{1,3}(?:,\d{3})+|\d+)(?:\.\d+)?(?:[eE][-+]?\d+)?")
+TOKEN_PATTERN = re.compile(r"[a-z0-9_]+(?:\.[a-z0-9_]+)*|[<>=!]+|[-+*/%]")
+
+
+def judge_error(error: Exception) -> dict:
+    """
+    Verdict for an item the judge could not evaluate.
+    'error' is kept apart from pass/fail/warn so provider failures do not skew metrics.
+    """
+    return {
+        "status": "error",
+        "reasoning": f"Error during evaluation: {str(error)}"
+    }
+
+
+def parse_status(text: str) -> Optional[str]:
+    """Map judge status text to 'pass', 'fail' or 'warn'"""
+    text = text.strip().lower()
+    for status in ("pass", "fail", "warn"):
+        if status in text:
+            return status
+    return None
+
+
+def parse_confidence(value) -> Optional[float]:
+    """Parse a 0-100 confidence value, or None if it is missing or malformed"""
+    match = re.search(r"\d+(?:\.\d+)?", str(value))
+    if not match:
+        return None
+    return min(100.0, max(0.0, float(match.group(0))))
+
+
+def parse_verdict_text(result_text: str) -> dict:
+    """Parse a STATUS:/CONFIDENCE:/REASONING: judge response"""
+    status = "warn"  # default
+    reasoning = "Unable to parse evaluation result"
+    confidence = None
+
+    for line in result_text.strip().split('\n'):
+        if line.startswith('STATUS:'):
+            status = parse_status(line.replace('STATUS:', '')) or status
+        elif line.startswith('CONFIDENCE:'):
+            confidence = parse_confidence(line.replace('CONFIDENCE:', ''))
+        elif line.startswith('REASONING:'):
+            reasoning = line.replace('REASONING:', '').strip()
+
+    return {
+        "status": status,
+        "reasoning": reasoning,
+        "confidence": confidence
+    }
+
+
+def parse_batch_verdicts(result_text: str, count: int) -> List[dict]:
+    """
+    Parse a batched judge response into one verdict per item.
+    Raises ValueError if the response is not a complete, well-formed array.
+    """
+    match = re.search(r"\[.*\]", result_text, re.DOTALL)
+    if not match:
+        raise ValueError("No JSON array in batched judge response")
+    entries = json.loads(match.group(0))
+    if not isinstance(entries, list) or len(entries) != count:
+        raise ValueError(f"Expected {count} verdicts in batched judge response")
+
+    verdicts = [None] * count
+    for position, entry in enumerate(entries):
+        number = entry.get("item", position + 1) if isinstance(entry, dict) else None
+        status = parse_status(str(entry.get("status", ""))) if isinstance(entry, dict) else None
+        if not isinstance(number, int) or not 1 <= number <= count or status is None:
+            raise ValueError(f"Malformed verdict at position {position + 1}")
+        verdicts[number - 1] = {
+            "status": status,
+            "reasoning": str(entry.get("reasoning", "")).strip(),
+            "confidence": parse_confidence(entry.get("confidence")),
+            "decided_by": "llm_batch"
+        }
+    if any(v is None for v in verdicts):
+        raise ValueError("Duplicate item numbers in batched judge response")
+    return verdicts
+
+
+def split_count(total: int, parts: int, index: int) -> int:
+    """Share of `index` when `total` is split into `parts` integers that add up to it"""
+    base, remainder = divmod(int(total), parts)
+    return base + (1 if index < remainder else 0)
+
+
+# Deterministic judges
+
+def normalize_text(text: str) -> str:
+    """Casefold, collapse whitespace and drop surrounding quotes and trailing punctuation"""
+    text = " ".join(text.casefold().split())
+    return text.strip(" \"'`").rstrip(".;!")
+
+
+def parse_number(text: str) -> Optional[Tuple[float, bool]]:
+    """
+    Parse text that is a single number, allowing currency and thousands separators.
+    Returns the value and whether it was given as a percentage.
+    """
+    candidate = normalize_text(text).lstrip("$€£").strip()
+    percent = candidate.endswith("%")
+    candidate = candidate.rstrip("%").strip()
+    if not NUMBER_PATTERN.fullmatch(candidate):
+        return None
+    return float(candidate.replace(",", "")), percent
+
+
+def numbers_match(a: float, b: float) -> bool:
+    return abs(a - b) <= JUDGE_NUMERIC_TOLERANCE * max(abs(a), abs(b), 1e-12)
+
+
+def quantities_match(expected: Tuple[float, bool], actual: Tuple[float, bool]) -> Optional[bool]:
+    """
+    Compare parsed numbers. A percentage matches its fraction ("50%" and "0.5");
+    a percentage/number pair that does not is undecided (None), since the
+    number may be meant as a percentage too.
+    """
+    (a, a_percent), (b, b_percent) = expected, actual
+    if a_percent == b_percent:
+        return numbers_match(a, b)
+    scaled_a, scaled_b = (a / 100, b) if a_percent else (a, b / 100)
+    return True if numbers_match(scaled_a, scaled_b) else None
+
+
+def exact_match_judge(ground_truth: str, agent_answer: str) -> Optional[dict]:
+    """Pass answers identical to the ground truth after normalization"""
+    if normalize_text(ground_truth) and normalize_text(ground_truth) == normalize_text(agent_answer):
+        return {"status": "pass", "reasoning": "Answer exactly matches the ground truth"}
+    return None
+
+
+def numeric_judge(ground_truth: str, agent_answer: str) -> Optional[dict]:
+    """
+    Decide bare-number answers to numeric ground truths on tolerance.
+    Answers with any surrounding text ("not 42", "42 in Q3") are left to the
+    LLM judge, since the number alone does not decide them.
+    """
+    expected = parse_number(ground_truth)
+    actual = parse_number(agent_answer)
+    if expected is None or actual is None:
+        return None
+    match = quantities_match(expected, actual)
+    if match is None:
+        return None
+    if match:
+        return {"status": "pass", "reasoning": f"Numeric answer {actual[0]:g} matches {expected[0]:g}"}
+    return {"status": "fail", "reasoning": f"Numeric answer {actual[0]:g} does not match {expected[0]:g}"}
+
+
+def token_set_judge(ground_truth: str, agent_answer: str) -> Optional[dict]:
+    """
+    Pass answers with the same word tokens in the same order as the ground truth,
+    i.e. differing only in case, spacing or punctuation. Any other difference,
+    however small ("not"), is left to the LLM judge.
+    """
+    tokens = TOKEN_PATTERN.findall(ground_truth.casefold())
+    if tokens and tokens == TOKEN_PATTERN.findall(agent_answer.casefold()):
+        return {"status": "pass", "reasoning": "Answer matches the ground truth up to punctuation"}
+    return None
+
+
+# Cascade tiers in order; the first tier that returns a verdict decides the item
+DETERMINISTIC_JUDGES = [
+    ("exact", exact_match_judge),
+    ("numeric", numeric_judge),
+    ("token_set", token_set_judge),
+]
+
+
+def deterministic_verdict(ground_truth: str, agent_answer: str) -> Optional[dict]:
+    """Run the deterministic text tiers; None means the item needs the LLM judge"""
+    for tier, judge in DETERMINISTIC_JUDGES:
+        verdict = judge(ground_truth, agent_answer)
+        if verdict is not None:
+            return {**verdict, "decided_by": tier, "confidence": 100.0}
+    return None
+
+
+async def cascade_verdict(ground_truth: str, agent_answer: str, sql_context: Optional[dict] = None) -> Optional[dict]:
+    """
+    Run the deterministic cascade for one item; None means the item needs the LLM judge.
+    SQL ground truths are decided by exact match or the SQL comparator only, since
+    numeric and token-set heuristics are unreliable on SQL text.
+    `sql_context` carries the domain's `dialect` and `domain_id` (for its fixture).
+    """
+    if extract_sql(ground_truth) is None:
+        return deterministic_verdict(ground_truth, agent_answer)
+
+    verdict = exact_match_judge(ground_truth, agent_answer)
+    if verdict is not None:
+        return {**verdict, "decided_by": "exact", "confidence": 100.0}
+    sql_context = sql_context or {}
+    verdict = await sql_verdict(agent_answer, ground_truth, sql_context.get("dialect"), sql_context.get("domain_id"))
+    if verdict is not None:
+        return {**verdict, "decided_by": "sql", "confidence": 100.0}
+    return None
+
+
+# LLM judges
+
+async def evaluate_answer_with_gemini(
+    question: str,
+    ground_truth: str,
+    agent_answer: str,
+    model_name: str = JUDGE_MODEL
+) -> dict:
+    """
+    Use Gemini to evaluate if the agent's answer matches the ground truth.
+    Returns a dict with status ('pass', 'fail', 'warn', or 'error' if the call failed),
+    reasoning, confidence and the call's token usage.
+    Verdicts are cached by content hash, so identical inputs are judged once.
+    """
+    if not GEMINI_API_KEY:
+        # Fallback to random evaluation if no API key
+        return {
+            "status": random.choice(["pass", "fail", "warn"]),
+            "reasoning": "No API key configured - using random evaluation"
+        }
+
+    cache_key = content_hash(model_name, JUDGE_PROMPT_TEMPLATE, question, ground_truth, agent_answer)
+    cached = await verdict_cache.get(cache_key)
+    if cached is not None:
+        return {**cached, "cached": True}
+
+    try:
+        prompt = JUDGE_PROMPT_TEMPLATE.format(
+            question=question,
+            ground_truth=ground_truth,
+            agent_answer=agent_answer
+        )
+
+        response = await generate_content(prompt, model_name)
+        verdict = {**parse_verdict_text(response.text), "decided_by": "llm"}
+    except Exception as e:
+        print(f"Error evaluating with Gemini: {e}")
+        return judge_error(e)
+
+    await verdict_cache.set(cache_key, verdict, judge_model=model_name)
+    return {**verdict, "usage": response_usage(response)}
+
+
+class JudgeBatcher:
+    """
+    Packs concurrent judge requests into batched prompts of up to `batch_size` items.
+    A batch is sent when it is full or JUDGE_BATCH_LINGER_SECONDS after its first item.
+    If a batched response cannot be parsed, its items are judged one by one.
+    """
+
+    def __init__(self, batch_size: int, model_name: str = JUDGE_MODEL, linger: float = JUDGE_BATCH_LINGER_SECONDS):
+        self.batch_size = batch_size
+        self.model_name = model_name
+        self.linger = linger
+        self.batches = 0
+        self.fallbacks = 0
+        self._pending: List[Tuple[dict, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: set = set()
+
+    async def judge(self, question: str, ground_truth: str, agent_answer: str) -> dict:
+        """Judge one item as part of the next batch"""
+        if not GEMINI_API_KEY or self.batch_size <= 1:
+            return await evaluate_answer_with_gemini(question, ground_truth, agent_answer, self.model_name)
+
+        cache_key = content_hash(self.model_name, BATCH_JUDGE_PROMPT_TEMPLATE, question, ground_truth, agent_answer)
+        cached = await verdict_cache.get(cache_key)
+        if cached is not None:
+            return {**cached, "cached": True}
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        item = {
+            "question": question,
+            "ground_truth": ground_truth,
+            "agent_answer": agent_answer,
+            "cache_key": cache_key
+        }
+        self._pending.append((item, future))
+        if len(self._pending) >= self.batch_size:
+            self._dispatch()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.linger, self._dispatch)
+        return await future
+
+    def _dispatch(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.create_task(self._judge_batch(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _judge_batch(self, batch: List[Tuple[dict, asyncio.Future]]):
+        items = [item for item, _ in batch]
+        self.batches += 1
+        try:
+            prompt = BATCH_JUDGE_PROMPT_TEMPLATE.format(items="\n\n".join(
+                BATCH_JUDGE_ITEM_TEMPLATE.format(number=i + 1, **item)
+                for i, item in enumerate(items)
+            ))
+            try:
+                response = await generate_content(prompt, self.model_name)
+            except Exception as e:
+                # Provider failures were already retried; splitting the batch would only add load
+                print(f"Batched judge call for {len(items)} items failed: {e}")
+                verdicts = [judge_error(e) for _ in items]
+            else:
+                try:
+                    verdicts = parse_batch_verdicts(response.text, len(items))
+                except ValueError as e:
+                    print(f"Batched judge response for {len(items)} items unusable, judging individually: {e}")
+                    self.fallbacks += 1
+                    verdicts = await asyncio.gather(*(
+                        evaluate_answer_with_gemini(
+                            item["question"], item["ground_truth"], item["agent_answer"], self.model_name
+                        )
+                        for item in items
+                    ))
+                else:
+                    for item, verdict in zip(items, verdicts):
+                        await verdict_cache.set(item["cache_key"], verdict, judge_model=self.model_name)
+                    # Attribute the batch's tokens evenly to its items, in whole tokens
+                    usage = response_usage(response)
+                    verdicts = [
+                        {**verdict, "usage": {k: split_count(v, len(items), index) for k, v in usage.items()}}
+                        for index, verdict in enumerate(verdicts)
+                    ]
+            for (_, future), verdict in zip(batch, verdicts):
+                if not future.done():
+                    future.set_result(verdict)
+        except asyncio.CancelledError:
+            for _, future in batch:
+                future.cancel()
+            raise
+        except Exception as e:
+            # Never leave a caller waiting on a batch that died
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
@@ -0,0 +1,508 @@
+"""
+LLM provider access for evaluation.
+Wraps the blocking Gemini SDK so calls run on a dedicated thread pool
+instead of stalling the event loop. Model handles are built once per
+(provider, model, generation config) and shared by every call.
+Every call goes through a shared token-bucket rate limiter and an adaptive (AIMD) concurrency limit, and
+throttled or failed calls are retried with jittered exponential backoff.
+Each attempt has a deadline, and slow attempts can be hedged with a
+duplicate request once they pass the model's p95 latency.
+"""
+from fastapi import APIRouter, Depends
+import asyncio
+import json
+import os
+import random
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import List, Optional
+
+import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
+from dotenv import load_dotenv
+
+from auth import get_current_user
+
+# Load environment variables
+load_dotenv()
+
+# Configure Gemini API
+GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+if GEMINI_API_KEY:
+    genai.configure(api_key=GEMINI_API_KEY)
+
+DEFAULT_MODEL = "gemini-2.5-flash"
+DEFAULT_PROVIDER = "gemini"
+
+# Build model handles and open the provider connection at startup
+LLM_WARMUP = os.getenv("LLM_WARMUP", "true").lower() == "true"
+
+# Size of the thread pool that runs blocking SDK calls
+LLM_THREAD_POOL_SIZE = int(os.getenv("LLM_THREAD_POOL_SIZE", "32"))
+
+# Provider quota shared by all calls in this process
+LLM_REQUESTS_PER_MINUTE = int(os.getenv("LLM_REQUESTS_PER_MINUTE", "1000"))
+LLM_TOKENS_PER_MINUTE = int(os.getenv("LLM_TOKENS_PER_MINUTE", "1000000"))
+
+# Output tokens assumed per call when charging the token bucket
+LLM_EXPECTED_OUTPUT_TOKENS = int(os.getenv("LLM_EXPECTED_OUTPUT_TOKENS", "256"))
+
+# Bounds of the adaptive concurrency limit
+LLM_INITIAL_CONCURRENCY = int(os.getenv("LLM_INITIAL_CONCURRENCY", "8"))
+LLM_MIN_CONCURRENCY = int(os.getenv("LLM_MIN_CONCURRENCY", "1"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", str(LLM_THREAD_POOL_SIZE)))
+
+# Retries of throttled (429) or server-side (5xx) failures
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "5"))
+LLM_BACKOFF_BASE_SECONDS = float(os.getenv("LLM_BACKOFF_BASE_SECONDS", "1.0"))
+LLM_BACKOFF_MAX_SECONDS = float(os.getenv("LLM_BACKOFF_MAX_SECONDS", "60.0"))
+
+# Seconds an attempt may take before it is abandoned and retried
+LLM_CALL_DEADLINE_SECONDS = float(os.getenv("LLM_CALL_DEADLINE_SECONDS", "60"))
+
+# Hedging: once an attempt outlives the model's LLM_HEDGE_QUANTILE latency, send a duplicate and take the first answer
+LLM_HEDGE_ENABLED = os.getenv("LLM_HEDGE_ENABLED", "false").lower() == "true"
+LLM_HEDGE_QUANTILE = float(os.getenv("LLM_HEDGE_QUANTILE", "0.95"))
+
+# Maximum hedged attempts as a percentage of a model's attempts
+LLM_HEDGE_BUDGET_PERCENT = float(os.getenv("LLM_HEDGE_BUDGET_PERCENT", "5"))
+
+# Latencies needed before a model's quantiles are trusted for hedging
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+
+# Recent latencies kept per model for percentiles
+LLM_LATENCY_WINDOW = int(os.getenv("LLM_LATENCY_WINDOW", "1000"))
+
+_executor = ThreadPoolExecutor(max_workers=LLM_THREAD_POOL_SIZE, thread_name_prefix="llm")
+
+router = APIRouter()
+
+
+class TokenBucket:
+    """Token bucket refilled continuously at `rate_per_minute`, holding at most one minute of tokens"""
+
+    def __init__(self, rate_per_minute: int):
+        self.capacity = float(rate_per_minute)
+        self.rate_per_second = rate_per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.waits = 0
+        self.wait_seconds = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate_per_second)
+        self.updated = now
+
+    async def acquire(self, amount: float = 1):
+        """Wait until `amount` tokens are available and take them"""
+        amount = min(amount, self.capacity)
+        # Callers queue on the lock so tokens are handed out in arrival order
+        async with self._lock:
+            self._refill()
+            if self.tokens < amount:
+                delay = (amount - self.tokens) / self.rate_per_second
+                self.waits += 1
+                self.wait_seconds += delay
+                await asyncio.sleep(delay)
+                self._refill()
+            self.tokens -= amount
+
+    def try_acquire(self, amount: float = 1) -> bool:
+        """Take `amount` tokens only if they are available now and nobody is queued"""
+        amount = min(amount, self.capacity)
+        if self._lock.locked():
+            return False
+        self._refill()
+        if self.tokens < amount:
+            return False
+        self.tokens -= amount
+        return True
+
+
+class AdaptiveConcurrency:
+    """
+    AIMD concurrency limit.
+    Each success raises the limit by 1/limit (about +1 per limit's worth of calls);
+    a throttled call halves it, at most once per window: calls that started
+    before the last cut do not cut again, so a burst of throttled responses
+    halves the limit once.
+    """
+
+    def __init__(self, initial: int, minimum: int, maximum: int):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.in_flight = 0
+        self.decreases = 0
+        self._condition = asyncio.Condition()
+
+    async def acquire(self) -> int:
+        """Take a slot; returns the number of cuts so far, to pass back to release"""
+        async with self._condition:
+            while self.in_flight >= int(self.limit):
+                await self._condition.wait()
+            self.in_flight += 1
+            return self.decreases
+
+    def try_acquire(self) -> Optional[int]:
+        """Take a slot only if one is free right now (for hedges); None otherwise"""
+        if self.in_flight >= int(self.limit):
+            return None
+        self.in_flight += 1
+        return self.decreases
+
+    async def discard(self):
+        """Give back a slot whose call was cancelled or never sent, without adjusting the limit"""
+        async with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+    async def release(self, throttled: bool, started_after: int):
+        async with self._condition:
+            self.in_flight -= 1
+            if throttled:
+                # The limit was already cut since this call started
+                if self.decreases == started_after:
+                    self.limit = max(float(self.minimum), self.limit / 2)
+                    self.decreases += 1
+            else:
+                self.limit = min(float(self.maximum), self.limit + 1 / self.limit)
+            self._condition.notify_all()
+
+
+class LLMStats:
+    """Process-wide counters for LLM calls"""
+
+    def __init__(self):
+        self.calls = 0
+        self.successes = 0
+        self.failures = 0
+        self.retries = 0
+        self.rate_limited = 0
+        self.server_errors = 0
+        self.timeouts = 0
+
+
+class LLMDeadlineExceeded(Exception):
+    """An attempt took longer than LLM_CALL_DEADLINE_SECONDS"""
+
+
+class ModelLatency:
+    """Recent successful-attempt latencies and hedging counters of one model"""
+
+    def __init__(self, window: int = LLM_LATENCY_WINDOW):
+        self.latencies = deque(maxlen=window)
+        self.attempts = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.timeouts = 0
+
+    def record(self, seconds: float):
+        self.latencies.append(seconds)
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def hedge_delay(self) -> Optional[float]:
+        """Seconds after which an attempt is hedged, or None while hedging is off or untuned"""
+        if not LLM_HEDGE_ENABLED or len(self.latencies) < LLM_HEDGE_MIN_SAMPLES:
+            return None
+        return self.percentile(LLM_HEDGE_QUANTILE)
+
+    def hedge_allowed(self) -> bool:
+        return self.hedges < self.attempts * LLM_HEDGE_BUDGET_PERCENT / 100
+
+    def summary(self) -> dict:
+        def ms(q: float) -> Optional[float]:
+            value = self.percentile(q)
+            return round(value * 1000, 1) if value is not None else None
+
+        return {
+            "attempts": self.attempts,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "hedge_rate": round(self.hedges / self.attempts * 100, 2) if self.attempts else 0.0,
+            "timeouts": self.timeouts,
+            "p50_ms": ms(0.50),
+            "p95_ms": ms(0.95),
+            "p99_ms": ms(0.99)
+        }
+
+
+class ModelRegistry:
+    """
+    Model handles keyed by (provider, model, generation config).
+    Handles are built on first use and reused; they share the SDK's
+    process-wide transport client, so connections are reused as well.
+    """
+
+    def __init__(self):
+        self._models: dict = {}
+        self.builds = 0
+        self.hits = 0
+
+    @staticmethod
+    def key(provider: str, model_name: str, generation_config: Optional[dict]) -> tuple:
+        return provider, model_name, json.dumps(generation_config or {}, sort_keys=True)
+
+    def get(self, model_name: str, generation_config: Optional[dict] = None, provider: str = DEFAULT_PROVIDER):
+        if provider != DEFAULT_PROVIDER:
+            raise ValueError(f"Unsupported LLM provider: {provider}")
+        key = self.key(provider, model_name, generation_config)
+        model = self._models.get(key)
+        if model is None:
+            model = genai.GenerativeModel(model_name, generation_config=generation_config or None)
+            self._models[key] = model
+            self.builds += 1
+        else:
+            self.hits += 1
+        return model
+
+    async def warm_up(self, model_name: str, generation_config: Optional[dict] = None):
+        """Build a handle and make one free call (token count) to open the provider connection"""
+        model = self.get(model_name, generation_config)
+        if GEMINI_API_KEY:
+            await run_blocking(model.count_tokens, "warm-up")
+
+    def describe(self) -> List[dict]:
+        return [
+            {"provider": provider, "model": model_name, "generation_config": json.loads(config)}
+            for provider, model_name, config in self._models
+        ]
+
+
+request_bucket = TokenBucket(LLM_REQUESTS_PER_MINUTE)
+token_bucket = TokenBucket(LLM_TOKENS_PER_MINUTE)
+concurrency = AdaptiveConcurrency(LLM_INITIAL_CONCURRENCY, LLM_MIN_CONCURRENCY, LLM_MAX_CONCURRENCY)
+stats = LLMStats()
+registry = ModelRegistry()
+latency: dict = {}
+
+
+def model_latency(model_name: str) -> ModelLatency:
+    if model_name not in latency:
+        latency[model_name] = ModelLatency()
+    return latency[model_name]
+
+
+def empty_usage() -> dict:
+    return {"prompt_tokens": 0, "completion_tokens": 0, "cached_tokens": 0}
+
+
+def response_usage(response) -> dict:
+    """Token counts reported in a Gemini response's usage metadata"""
+    metadata = getattr(response, "usage_metadata", None)
+    return {
+        "prompt_tokens": getattr(metadata, "prompt_token_count", 0) or 0,
+        "completion_tokens": getattr(metadata, "candidates_token_count", 0) or 0,
+        "cached_tokens": getattr(metadata, "cached_content_token_count", 0) or 0
+    }
+
+
+def estimate_tokens(prompt: str) -> int:
+    """Rough token count of a call: ~4 characters per prompt token plus the expected output"""
+    return len(prompt) // 4 + LLM_EXPECTED_OUTPUT_TOKENS
+
+
+def classify_error(error: Exception) -> Optional[str]:
+    """Return 'rate_limited', 'server_error' or 'timeout' for retryable failures, None otherwise"""
+    if isinstance(error, (LLMDeadlineExceeded, google_exceptions.DeadlineExceeded)):
+        return "timeout"
+    if isinstance(error, google_exceptions.TooManyRequests):
+        return "rate_limited"
+    if isinstance(error, google_exceptions.ServerError):
+        return "server_error"
+    code = getattr(error, "code", None)
+    if code == 429:
+        return "rate_limited"
+    if isinstance(code, int) and 500 <= code < 600:
+        return "server_error"
+    return None
+
+
+def backoff_delay(attempt: int) -> float:
+    """Full-jitter exponential backoff"""
+    return random.uniform(0, min(LLM_BACKOFF_MAX_SECONDS, LLM_BACKOFF_BASE_SECONDS * 2 ** attempt))
+
+
+async def run_blocking(func, *args, **kwargs):
+    """Run a blocking function on the LLM thread pool"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, partial(func, *args, **kwargs))
+
+
+def model_settings(domain: Optional[dict] = None) -> dict:
+    """Agent and judge models of a domain (and the agent's generation config), with defaults"""
+    domain = domain or {}
+    generation_config = {}
+    if domain.get("agent_temperature") is not None:
+        generation_config["temperature"] = domain["agent_temperature"]
+    if domain.get("agent_max_output_tokens") is not None:
+        generation_config["max_output_tokens"] = domain["agent_max_output_tokens"]
+    return {
+        "agent_model": domain.get("agent_model") or DEFAULT_MODEL,
+        "agent_generation_config": generation_config or None,
+        "judge_model": domain.get("judge_model") or DEFAULT_MODEL
+    }
+
+
+async def warm_up_models(domains: List[dict]):
+    """Build the model handles used by the given domains ahead of the first run"""
+    handles = {}
+    for domain in [{}] + domains:
+        settings = model_settings(domain)
+        for model_name, config in (
+            (settings["agent_model"], settings["agent_generation_config"]),
+            (settings["judge_model"], None)
+        ):
+            handles[ModelRegistry.key(DEFAULT_PROVIDER, model_name, config)] = (model_name, config)
+    for model_name, config in handles.values():
+        try:
+            await registry.warm_up(model_name, config)
+        except Exception as e:
+            print(f"Warm-up of {model_name} failed: {e}")
+
+
+async def _attempt(model, prompt: str, model_name: str, estimated_tokens: int):
+    """
+    One attempt at a call, bounded by LLM_CALL_DEADLINE_SECONDS.
+    With hedging on, a duplicate request is sent once the attempt outlives the
+    model's hedge delay (if the hedge budget, rate limits and a free concurrency
+    slot allow), and the first successful response wins. Raises
+    LLMDeadlineExceeded when the deadline passes.
+    """
+    tracker = model_latency(model_name)
+    tracker.attempts += 1
+    started = time.monotonic()
+    deadline = started + LLM_CALL_DEADLINE_SECONDS
+
+    def call():
+        # The SDK enforces the deadline on the request itself, so abandoned threads do not linger
+        return asyncio.ensure_future(run_blocking(
+            model.generate_content, prompt, request_options={"timeout": LLM_CALL_DEADLINE_SECONDS}
+        ))
+
+    async def hedge(window: int):
+        # A hedge holds its own concurrency slot, so the AIMD limit sees (and reacts to) its load
+        try:
+            result = await call()
+        except asyncio.CancelledError:
+            await concurrency.discard()
+            raise
+        except Exception as e:
+            await concurrency.release(throttled=classify_error(e) in ("rate_limited", "server_error"), started_after=window)
+            raise
+        await concurrency.release(throttled=False, started_after=window)
+        return result
+
+    primary = call()
+    pending = {primary}
+    try:
+        delay = tracker.hedge_delay()
+        if delay is not None and delay < LLM_CALL_DEADLINE_SECONDS:
+            done, pending = await asyncio.wait(pending, timeout=delay)
+            if not done and tracker.hedge_allowed():
+                window = concurrency.try_acquire()
+                if window is not None:
+                    if request_bucket.try_acquire(1) and token_bucket.try_acquire(estimated_tokens):
+                        tracker.hedges += 1
+                        pending.add(asyncio.ensure_future(hedge(window)))
+                    else:
+                        await concurrency.discard()
+            pending |= done
+
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, timeout=max(0.0, deadline - time.monotonic()), return_when=asyncio.FIRST_COMPLETED
+            )
+            if not done:
+                tracker.timeouts += 1
+                raise LLMDeadlineExceeded(f"{model_name} call exceeded {LLM_CALL_DEADLINE_SECONDS}s")
+            for task in done:
+                if task.exception() is None:
+                    if task is not primary:
+                        tracker.hedge_wins += 1
+                    tracker.record(time.monotonic() - started)
+                    return task.result()
+                error = error or task.exception()
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+async def generate_content(prompt: str, model_name: str = DEFAULT_MODEL, generation_config: Optional[dict] = None):
+    """
+    Call Gemini generate_content without blocking the event loop.
+    Waits for rate limit and concurrency capacity first; 429 and 5xx
+    responses shrink the concurrency limit and are retried with backoff.
+    Attempts that pass LLM_CALL_DEADLINE_SECONDS are retried as well.
+    Raises the last error once retries are exhausted.
+    """
+    model = registry.get(model_name, generation_config)
+    estimated_tokens = estimate_tokens(prompt)
+
+    for attempt in range(LLM_MAX_RETRIES + 1):
+        await request_bucket.acquire(1)
+        await token_bucket.acquire(estimated_tokens)
+        window = await concurrency.acquire()
+        stats.calls += 1
+        try:
+            response = await _attempt(model, prompt, model_name, estimated_tokens)
+        except Exception as e:
+            kind = classify_error(e)
+            # Timeouts are retried but do not shrink the concurrency limit
+            await concurrency.release(throttled=kind in ("rate_limited", "server_error"), started_after=window)
+            if kind == "rate_limited":
+                stats.rate_limited += 1
+            elif kind == "server_error":
+                stats.server_errors += 1
+            elif kind == "timeout":
+                stats.timeouts += 1
+            if kind is None or attempt == LLM_MAX_RETRIES:
+                stats.failures += 1
+                raise
+            stats.retries += 1
+            await asyncio.sleep(backoff_delay(attempt))
+            continue
+        await concurrency.release(throttled=False, started_after=window)
+        stats.successes += 1
+        return response
+
+
+def shutdown_executor():
+    """Stop accepting new LLM calls and release pool threads"""
+    _executor.shutdown(wait=False, cancel_futures=True)
+
+
+@router.get("/llm/stats")
+async def get_llm_stats(current_user: dict = Depends(get_current_user)):
+    """Throttling and retry counters for LLM calls in this process"""
+    return {
+        "calls": stats.calls,
+        "successes": stats.successes,
+        "failures": stats.failures,
+        "retries": stats.retries,
+        "rate_limited": stats.rate_limited,
+        "server_errors": stats.server_errors,
+        "timeouts": stats.timeouts,
+        "concurrency_limit": round(concurrency.limit, 2),
+        "concurrency_decreases": concurrency.decreases,
+        "in_flight": concurrency.in_flight,
+        "request_bucket_waits": request_bucket.waits,
+        "token_bucket_waits": token_bucket.waits,
+        "rate_limit_wait_seconds": round(request_bucket.wait_seconds + token_bucket.wait_seconds, 2),
+        "model_handles": registry.describe(),
+        "model_handle_builds": registry.builds,
+        "model_handle_reuses": registry.hits,
+        "hedging_enabled": LLM_HEDGE_ENABLED,
+        "latency_by_model": {name: tracker.summary() for name, tracker in latency.items()}
+    }
@@ -1,16 +1,22 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
+import asyncio
 import os
 
-from database import connect_to_mongo, close_mongo_connection, get_collection
+from database import connect_to_mongo, close_mongo_connection, get_collection, ensure_indexes
 from auth import router as auth_router
 from domains import router as domains_router
 from context import router as context_router
 from documents import router as documents_router
 from evaluation import router as evaluation_router
 from dashboard import router as dashboard_router
+from runs import router as runs_router, watch_stale_runs
+from cache import router as cache_router, ensure_cache_indexes
 from models import Domain
+from llm import router as llm_router, shutdown_executor, warm_up_models, LLM_WARMUP
+from costs import router as costs_router
+from metric_history import router as metric_history_router
 
 # Load environment variables
 load_dotenv()
@@ -22,11 +28,16 @@ app = FastAPI(
     version="1.0.0"
 )
 
+# Background task that resumes runs interrupted by a restart
+_stale_run_watcher = None
+
 # Startup and shutdown events
 @app.on_event("startup")
 async def startup_event():
     """Initialize database connection on startup"""
     await connect_to_mongo()
+    await ensure_indexes()
+    await ensure_cache_indexes()
     
     # Seed default domain if collection is empty
     try:
@@ -50,9 +61,27 @@ async def startup_event():
     except Exception as e:
         print(f"Warning: Failed to seed default domain: {e}")
 
+    # Build LLM model handles and open the provider connection before the first run
+    if LLM_WARMUP:
+        try:
+            domains = await get_collection("domains").find(
+                {"is_active": True},
+                {"agent_model": 1, "judge_model": 1, "agent_temperature": 1, "agent_max_output_tokens": 1}
+            ).to_list(length=None)
+            await warm_up_models(domains)
+        except Exception as e:
+            print(f"Warning: LLM warm-up failed: {e}")
+
+    # Resume runs left queued or running by a previous process
+    global _stale_run_watcher
+    _stale_run_watcher = asyncio.create_task(watch_stale_runs())
+
 @app.on_event("shutdown")
 async def shutdown_event():
     """Close database connection on shutdown"""
+    if _stale_run_watcher is not None:
+        _stale_run_watcher.cancel()
+    shutdown_executor()
     await close_mongo_connection()
 
 # Configure CORS
@@ -70,6 +99,11 @@ app.include_router(domains_router, prefix="/api/v1/domains", tags=["Domains"])
 app.include_router(context_router, prefix="/api/v1", tags=["Context Assets"])
 app.include_router(documents_router, prefix="/api/v1", tags=["RAG Documents"])
 app.include_router(evaluation_router, prefix="/api/v1", tags=["Evaluation & Metrics"])
+app.include_router(runs_router, prefix="/api/v1", tags=["Evaluation Runs"])
+app.include_router(cache_router, prefix="/api/v1", tags=["Evaluation Caches"])
+app.include_router(llm_router, prefix="/api/v1", tags=["LLM Provider"])
+app.include_router(costs_router, prefix="/api/v1", tags=["Costs"])
+app.include_router(metric_history_router, prefix="/api/v1", tags=["Evaluation & Metrics"])
 app.include_router(dashboard_router, prefix="/api/v1/dashboard", tags=["Dashboard"])
 
 @app.get("/healthz")
@@ -0,0 +1,148 @@
+"""
+Metric history: one point per completed full run in `metric_history`, and
+trend queries over it downsampled on the server into fixed-width time
+buckets (min/max/avg per metric), so long ranges come back as a bounded
+number of points.
+"""
+from fastapi import APIRouter, HTTPException, Depends
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+import os
+
+from database import get_collection
+from models import EvalMetrics
+from auth import get_current_user
+
+# Metrics stored with every point and queryable as trends
+HISTORY_METRICS = ("pass_rate", "overall_score", "hallucination_rate", "avg_latency", "cost_usd")
+
+# Days compared by the dashboard trend: the last window against the one before it
+TREND_WINDOW_DAYS = float(os.getenv("TREND_WINDOW_DAYS", "7"))
+
+router = APIRouter()
+
+
+def get_history_collection():
+    return get_collection("metric_history")
+
+
+async def record_point(domain_id: str, run_id: str, timestamp: datetime, metrics: EvalMetrics, rollup: dict):
+    """Append (or replace) the point of one completed full run"""
+    await get_history_collection().replace_one(
+        {"_id": run_id},
+        {
+            "domain_id": domain_id,
+            "run_id": run_id,
+            "timestamp": timestamp,
+            "pass_rate": metrics.pass_rate,
+            "overall_score": metrics.overall_score,
+            "hallucination_rate": metrics.hallucination_rate,
+            "avg_latency": metrics.avg_latency,
+            "cost_usd": rollup.get("cost_usd", 0.0),
+            "items": rollup.get("items", 0)
+        },
+        upsert=True
+    )
+
+
+def as_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """Naive UTC datetime, as stored by the API"""
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+async def downsample(match: dict, start: datetime, end: datetime, points: int, metrics: List[str]) -> dict:
+    """Group points matching `match` between start and end into `points` equal time buckets"""
+    width_ms = max(1, int((end - start).total_seconds() * 1000 / points))
+    stats = {}
+    for metric in metrics:
+        stats[f"{metric}_min"] = {"$min": f"${metric}"}
+        stats[f"{metric}_max"] = {"$max": f"${metric}"}
+        stats[f"{metric}_avg"] = {"$avg": f"${metric}"}
+    buckets = await get_history_collection().aggregate([
+        {"$match": {**match, "timestamp": {"$gte": start, "$lte": end}}},
+        {"$group": {
+            # Points stamped exactly at `end` belong to the last bucket
+            "_id": {"$min": [
+                {"$floor": {"$divide": [{"$subtract": ["$timestamp", start]}, width_ms]}},
+                points - 1
+            ]},
+            "count": {"$sum": 1},
+            **stats
+        }},
+        {"$sort": {"_id": 1}}
+    ]).to_list(length=None)
+    return {
+        "start": start,
+        "end": end,
+        "bucket_seconds": width_ms / 1000,
+        "points": [
+            {
+                "timestamp": start + timedelta(milliseconds=int(bucket["_id"]) * width_ms),
+                "runs": bucket["count"],
+                **{
+                    metric: {
+                        "min": bucket[f"{metric}_min"],
+                        "max": bucket[f"{metric}_max"],
+                        "avg": round(bucket[f"{metric}_avg"], 4) if bucket[f"{metric}_avg"] is not None else None
+                    }
+                    for metric in metrics
+                }
+            }
+            for bucket in buckets
+        ]
+    }
+
+
+@router.get("/domains/{domain_id}/metrics/history")
+async def get_metric_history(
+    domain_id: str,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    points: int = 200,
+    metrics: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Trend of a domain's metrics over completed full runs.
+    The range [start, end] (default: first point to now) is split into `points`
+    equal buckets; each non-empty bucket reports min/max/avg of every metric.
+    `metrics` is a comma-separated subset of the stored metrics.
+    """
+    if not 1 <= points <= 2000:
+        raise HTTPException(status_code=400, detail="points must be between 1 and 2000")
+    selected = metrics.split(",") if metrics else list(HISTORY_METRICS)
+    unknown = [m for m in selected if m not in HISTORY_METRICS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown metrics: {', '.join(unknown)}")
+
+    start, end = as_utc(start), as_utc(end) or datetime.utcnow()
+    if start is None:
+        first = await get_history_collection().find_one(
+            {"domain_id": domain_id}, {"timestamp": 1}, sort=[("timestamp", 1)]
+        )
+        start = first["timestamp"] if first else end
+    if start > end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+    return {"domain_id": domain_id, **await downsample({"domain_id": domain_id}, start, end, points, selected)}
+
+
+async def window_average(metric: str, start: datetime, end: datetime) -> Optional[float]:
+    """Mean of a metric over all domains' points in [start, end)"""
+    rows = await get_history_collection().aggregate([
+        {"$match": {"timestamp": {"$gte": start, "$lt": end}}},
+        {"$group": {"_id": None, "value": {"$avg": f"${metric}"}}}
+    ]).to_list(length=1)
+    return rows[0]["value"] if rows else None
+
+
+async def metric_trend(metric: str = "pass_rate") -> float:
+    """Change of a metric's mean over the last TREND_WINDOW_DAYS against the window before; 0 without data"""
+    now = datetime.utcnow()
+    window = timedelta(days=TREND_WINDOW_DAYS)
+    current = await window_average(metric, now - window, now)
+    previous = await window_average(metric, now - 2 * window, now - window)
+    if current is None or previous is None:
+        return 0.0
+    return round(current - previous, 1)
@@ -1,5 +1,5 @@
-from pydantic import BaseModel, EmailStr, Field
-from typing import Optional
+from pydantic import BaseModel, EmailStr, Field, model_validator
+from typing import Literal, Optional
 from datetime import datetime
 
 
@@ -42,6 +42,11 @@ class Domain(BaseModel):
     secret: str = Field(..., description="Secret/credential identifier")
     schema_name: str = Field(..., description="Database schema name")
     retriever_top_k: int = Field(default=10, description="Number of top results for retriever")
+    judge_batch_size: int = Field(default=1, ge=1, le=50, description="Test sets judged per LLM call (1 disables batching)")
+    agent_model: Optional[str] = Field(default=None, description="Model generating agent answers (default gemini-2.5-flash)")
+    agent_temperature: Optional[float] = Field(default=None, ge=0, le=2, description="Sampling temperature of the agent model")
+    agent_max_output_tokens: Optional[int] = Field(default=None, ge=1, description="Maximum output tokens of the agent model")
+    judge_model: Optional[str] = Field(default=None, description="Model judging agent answers (default gemini-2.5-flash)")
     is_active: bool = Field(default=True, description="Whether the domain is active")
 
 
@@ -53,6 +58,11 @@ class DomainUpdate(BaseModel):
     secret: Optional[str] = Field(default=None, description="Secret/credential identifier")
     schema_name: Optional[str] = Field(default=None, description="Database schema name")
     retriever_top_k: Optional[int] = Field(default=None, description="Number of top results for retriever")
+    judge_batch_size: Optional[int] = Field(default=None, ge=1, le=50, description="Test sets judged per LLM call (1 disables batching)")
+    agent_model: Optional[str] = Field(default=None, description="Model generating agent answers")
+    agent_temperature: Optional[float] = Field(default=None, ge=0, le=2, description="Sampling temperature of the agent model")
+    agent_max_output_tokens: Optional[int] = Field(default=None, ge=1, description="Maximum output tokens of the agent model")
+    judge_model: Optional[str] = Field(default=None, description="Model judging agent answers")
     is_active: Optional[bool] = Field(default=None, description="Whether the domain is active")
 
 
@@ -147,6 +157,7 @@ class TestSet(BaseModel):
     last_agent_answer: Optional[str] = Field(default=None, description="Last agent-generated answer")
     last_evaluation_reasoning: Optional[str] = Field(default=None, description="Reasoning for last evaluation")
     last_run_id: Optional[str] = Field(default=None, description="ID of the last evaluation run")
+    last_decided_by: Optional[str] = Field(default=None, description="Judge tier that decided the last evaluation (exact, sql, numeric, token_set, llm, llm_batch)")
     confidence_score: Optional[float] = Field(default=None, description="Confidence score (0-100)")
 
 
@@ -161,6 +172,14 @@ class MetricBreakdown(BaseModel):
     """Metric breakdown by category"""
     category: str = Field(..., description="Metric category name")
     value: float = Field(..., description="Metric value")
+    low: Optional[float] = Field(default=None, description="Lower bound of the confidence interval")
+    high: Optional[float] = Field(default=None, description="Upper bound of the confidence interval")
+
+
+class MetricInterval(BaseModel):
+    """Bootstrap confidence interval of a metric"""
+    low: float = Field(..., description="Lower bound")
+    high: float = Field(..., description="Upper bound")
 
 
 class EvalMetrics(BaseModel):
@@ -169,4 +188,115 @@ class EvalMetrics(BaseModel):
     hallucination_rate: float = Field(..., description="Hallucination rate percentage")
     avg_latency: float = Field(..., description="Average latency in milliseconds")
     pass_rate: float = Field(..., description="Pass rate percentage")
-    metric_breakdown: list[MetricBreakdown] = Field(..., description="Breakdown of metrics by category")
\ No newline at end of file
+    metric_breakdown: list[MetricBreakdown] = Field(..., description="Breakdown of metrics by category")
+    tier_breakdown: list[MetricBreakdown] = Field(default_factory=list, description="Pass rate of the items each judge tier decided")
+    intervals: dict[str, MetricInterval] = Field(default_factory=dict, description="Confidence intervals of the headline metrics")
+    confidence: Optional[float] = Field(default=None, description="Confidence level of the intervals")
+    estimated: bool = Field(default=False, description="True when the metrics are estimates for the full suite from a sampled run")
+    sample_size: Optional[int] = Field(default=None, description="Test sets evaluated by the sampled run behind estimated metrics")
+
+
+class SequentialGateOptions(BaseModel):
+    """Options of a sequential early-stopping run"""
+    threshold: float = Field(..., ge=0, le=100, description="Pass rate (%) the run must clear")
+    confidence: float = Field(default=0.95, gt=0.5, lt=1, description="Confidence level of the interval")
+    method: Literal["wilson", "clopper_pearson"] = Field(default="wilson", description="Binomial interval used for the pass rate")
+    min_items: int = Field(default=10, ge=1, description="Judged items required before the run may stop")
+    seed: Optional[int] = Field(default=None, description="Seed of the stratified random order (random if omitted)")
+
+
+class SampleOptions(BaseModel):
+    """Options of a sampled run; set exactly one of size and fraction"""
+    size: Optional[int] = Field(default=None, ge=1, description="Number of test sets to sample")
+    fraction: Optional[float] = Field(default=None, gt=0, le=1, description="Fraction of test sets to sample")
+    seed: Optional[int] = Field(default=None, description="Seed of the sample (random if omitted)")
+
+    @model_validator(mode="after")
+    def check_size_or_fraction(self):
+        if (self.size is None) == (self.fraction is None):
+            raise ValueError("Set exactly one of size and fraction")
+        return self
+
+
+class GateResult(BaseModel):
+    """Outcome of a sequential early-stopping run"""
+    decision: Literal["pass", "fail", "inconclusive"] = Field(..., description="Whether the interval cleared the threshold")
+    threshold: float = Field(..., description="Pass rate threshold (%)")
+    confidence: float = Field(..., description="Confidence level of the interval")
+    method: str = Field(..., description="Binomial interval method")
+    pass_rate: float = Field(..., description="Observed pass rate (%) over judged items")
+    interval_low: float = Field(..., description="Lower bound of the pass rate interval (%)")
+    interval_high: float = Field(..., description="Upper bound of the pass rate interval (%)")
+    items_consumed: int = Field(..., description="Test sets evaluated before the run stopped")
+
+
+class EvalRunRequest(BaseModel):
+    """Options for an evaluation run"""
+    concurrency: Optional[int] = Field(default=None, ge=1, le=256, description="Maximum test sets evaluated at once in this run")
+    answer_mode: Literal["live", "record", "replay"] = Field(
+        default="live",
+        description="live: generate agent answers; record: generate and store them; replay: judge stored answers, generating (and storing) only missing ones"
+    )
+    judge_cascade: bool = Field(default=True, description="Decide items with deterministic judges before calling the LLM judge")
+    incremental: bool = Field(default=False, description="Re-evaluate only test sets whose fingerprint changed since their last result; carry the rest forward")
+    sequential: Optional[SequentialGateOptions] = Field(
+        default=None,
+        description="Evaluate in stratified random order and stop once the pass rate interval clears or misses the threshold"
+    )
+    sample: Optional[SampleOptions] = Field(
+        default=None,
+        description="Evaluate a reproducible sample stratified by difficulty and estimate full-suite metrics"
+    )
+    budget_usd: Optional[float] = Field(default=None, gt=0, description="Abort the run once its LLM cost reaches this many USD")
+
+
+class EvalRun(BaseModel):
+    """Evaluation run state"""
+    id: str = Field(..., description="Run ID")
+    domain_id: str = Field(..., description="Domain ID this run belongs to")
+    status: str = Field(..., description="Run state (queued, running, completed, failed, aborted)")
+    processed: int = Field(default=0, description="Test sets evaluated so far")
+    total: int = Field(default=0, description="Test sets in this run")
+    passed: int = Field(default=0, description="Test sets that passed so far")
+    failed: int = Field(default=0, description="Test sets that failed so far")
+    warned: int = Field(default=0, description="Test sets with a warning so far")
+    errored: int = Field(default=0, description="Test sets that could not be evaluated (agent or judge call failed)")
+    decided_by: dict[str, int] = Field(default_factory=dict, description="Test sets decided by each judge tier so far")
+    eta_seconds: Optional[float] = Field(default=None, description="Estimated seconds until the run completes")
+    replayed_answers: int = Field(default=0, description="Agent answers replayed from recordings instead of generated")
+    carried_forward: int = Field(default=0, description="Unchanged test sets whose previous result was carried into this run")
+    resumes: int = Field(default=0, description="Times the run was resumed after an interruption")
+    scope: str = Field(default="full", description="full, sequential (early-stopping) or sample")
+    sample: Optional[dict] = Field(default=None, description="Seed, size and per-difficulty population/sampled counts of a sampled run")
+    models: Optional[dict] = Field(default=None, description="Agent and judge models used by the run")
+    gate: Optional[GateResult] = Field(default=None, description="Outcome of a sequential run")
+    tokens: dict[str, int] = Field(default_factory=dict, description="Prompt, completion and cached tokens used so far")
+    cost_usd: float = Field(default=0.0, description="LLM cost of the run so far in USD")
+    budget_usd: Optional[float] = Field(default=None, description="Cost cap at which the run is aborted")
+    error: Optional[str] = Field(default=None, description="Error message if the run failed")
+    created_at: datetime = Field(..., description="Time the run was queued")
+    started_at: Optional[datetime] = Field(default=None, description="Time the run started")
+    completed_at: Optional[datetime] = Field(default=None, description="Time the run finished")
+
+
+class EvalResult(BaseModel):
+    """Immutable result of one test set in one evaluation run"""
+    id: str = Field(..., description="Result ID ({run_id}:{test_set_id})")
+    run_id: str = Field(..., description="Run ID")
+    domain_id: str = Field(..., description="Domain ID")
+    test_set_id: str = Field(..., description="Test set ID")
+    difficulty: Optional[str] = Field(default=None, description="Test set difficulty at run time")
+    status: str = Field(..., description="Evaluation status (pass, fail, warn, error)")
+    confidence: Optional[float] = Field(default=None, description="Judge confidence (0-100)")
+    decided_by: Optional[str] = Field(default=None, description="Judge tier that decided the result")
+    answer_source: Optional[str] = Field(default=None, description="live, replay or carried")
+    agent_answer: Optional[str] = Field(default=None, description="Agent answer that was judged")
+    reasoning: Optional[str] = Field(default=None, description="Judge reasoning")
+    agent_latency_ms: Optional[float] = Field(default=None, description="Agent call latency in milliseconds (None when replayed)")
+    judge_latency_ms: Optional[float] = Field(default=None, description="Judging latency in milliseconds")
+    tokens: dict = Field(default_factory=dict, description="Token usage and cost of the agent and judge calls")
+    models: Optional[dict] = Field(default=None, description="Agent and judge models that produced the result")
+    cost_usd: float = Field(default=0.0, description="LLM cost of the item in USD")
+    fingerprint: Optional[str] = Field(default=None, description="Fingerprint of the evaluated inputs")
+    carried_from: Optional[str] = Field(default=None, description="ID of the result this one was carried forward from")
+    created_at: datetime = Field(..., description="Time the result was recorded")
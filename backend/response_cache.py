@@ -0,0 +1,135 @@
+"""
+Versioned response cache for polled read endpoints.
+Every domain has a generation counter in `cache_generations`, bumped whenever
+its test sets or run results change; a global counter is bumped with every
+domain. Cached responses are keyed by path, query and the generation they were
+built at, so a bump invalidates them in every process without a broadcast.
+Responses carry strong ETags and `If-None-Match` requests get a 304.
+"""
+from fastapi import Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import Response
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable
+import hashlib
+import json
+import os
+import time
+
+from pymongo import ReturnDocument
+
+from database import get_collection
+
+# Serialized responses kept in this process
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "1000"))
+
+# Seconds a generation read from MongoDB is trusted before it is read again;
+# bumps made by other processes (workers, other API replicas) show up within this delay
+RESPONSE_CACHE_GENERATION_TTL = float(os.getenv("RESPONSE_CACHE_GENERATION_TTL", "1.0"))
+
+# Seconds a cached response is served at most, for bodies that also depend on the clock (e.g. trend windows)
+RESPONSE_CACHE_MAX_AGE = float(os.getenv("RESPONSE_CACHE_MAX_AGE", "300"))
+
+# Generation scope of responses that cover every domain
+GLOBAL_SCOPE = "*"
+
+
+class ResponseCache:
+    """LRU of serialized response bodies and their ETags"""
+
+    def __init__(self, max_size: int = RESPONSE_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries: OrderedDict = OrderedDict()
+        self._generations: dict = {}
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.generation_reads = 0
+
+    async def generation(self, scope: str) -> int:
+        cached = self._generations.get(scope)
+        if cached is not None and time.monotonic() - cached[1] < RESPONSE_CACHE_GENERATION_TTL:
+            return cached[0]
+        doc = await get_collection("cache_generations").find_one({"_id": scope}, {"generation": 1})
+        self.generation_reads += 1
+        value = doc["generation"] if doc else 0
+        self._generations[scope] = (value, time.monotonic())
+        return value
+
+    async def bump(self, domain_id: str):
+        """Invalidate every cached response of a domain and of the global scope"""
+        for scope in (domain_id, GLOBAL_SCOPE):
+            doc = await get_collection("cache_generations").find_one_and_update(
+                {"_id": scope},
+                {"$inc": {"generation": 1}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+            self._generations[scope] = (doc["generation"], time.monotonic())
+
+    def get(self, key: tuple):
+        entry = self._entries.get(key)
+        if entry is None or time.monotonic() - entry[2] > RESPONSE_CACHE_MAX_AGE:
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def put(self, key: tuple, etag: str, body: bytes):
+        self._entries[key] = (etag, body, time.monotonic())
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "not_modified": self.not_modified,
+            "generation_reads": self.generation_reads,
+            "hit_rate": round(self.hits / lookups * 100, 2) if lookups else 0.0
+        }
+
+
+response_cache = ResponseCache()
+
+
+async def bump_generation(domain_id: str):
+    """Mark a domain's data as changed; failures are logged, never raised into the write path"""
+    try:
+        await response_cache.bump(domain_id)
+    except Exception as e:
+        print(f"Cache generation bump for domain {domain_id} failed: {e}")
+
+
+def etag_matches(header: str, etag: str) -> bool:
+    """Strong comparison against an If-None-Match header (a list of ETags or *)"""
+    tags = [tag.strip() for tag in header.split(",")]
+    return "*" in tags or etag in tags
+
+
+async def cached_response(request: Request, scope: str, compute: Callable[[], Awaitable[Any]]) -> Response:
+    """
+    Serve a JSON response from the cache if it was built at the scope's current
+    generation, otherwise compute, serialize and cache it. Answers 304 when the
+    request's If-None-Match holds the response's ETag.
+    """
+    generation = await response_cache.generation(scope)
+    key = (request.url.path, str(request.url.query), scope, generation)
+    entry = response_cache.get(key)
+    if entry is None:
+        response_cache.misses += 1
+        body = json.dumps(jsonable_encoder(await compute()), separators=(",", ":")).encode("utf-8")
+        etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+        response_cache.put(key, etag, body)
+    else:
+        response_cache.hits += 1
+        etag, body, _ = entry
+
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and etag_matches(if_none_match, etag):
+        response_cache.not_modified += 1
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
@@ -0,0 +1,117 @@
+"""
+Buffered bulk writer for evaluation results.
+Collects per-item updates and flushes them with unordered bulk_write,
+either when the batch is full or when the flush interval elapses.
+"""
+import asyncio
+import os
+from typing import List, Optional, Tuple
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, PyMongoError
+
+# Number of buffered updates that triggers a flush
+BULK_WRITE_BATCH_SIZE = int(os.getenv("BULK_WRITE_BATCH_SIZE", "200"))
+
+# Maximum seconds an update waits in the buffer before being flushed
+BULK_WRITE_FLUSH_INTERVAL = float(os.getenv("BULK_WRITE_FLUSH_INTERVAL", "1.0"))
+
+# Attempts per update when a bulk write fails and updates are retried one by one
+BULK_WRITE_RETRIES = int(os.getenv("BULK_WRITE_RETRIES", "3"))
+
+
+class BulkResultWriter:
+    """
+    Buffers update operations for one collection and writes them in batches.
+    Updates that fail inside a bulk write are retried individually.
+
+    Usage:
+        async with BulkResultWriter(collection) as writer:
+            await writer.update({"_id": ...}, {"$set": {...}})
+    """
+
+    def __init__(
+        self,
+        collection,
+        batch_size: int = BULK_WRITE_BATCH_SIZE,
+        flush_interval: float = BULK_WRITE_FLUSH_INTERVAL
+    ):
+        self.collection = collection
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.written = 0
+        self.failed = 0
+        self.batches = 0
+        self._buffer: List[Tuple[dict, dict, bool]] = []
+        self._closed = asyncio.Event()
+        self._timer: Optional[asyncio.Task] = None
+
+    async def __aenter__(self):
+        self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    def start(self):
+        """Start the periodic flush task"""
+        if self._timer is None:
+            self._timer = asyncio.create_task(self._flush_periodically())
+
+    async def update(self, filter: dict, update: dict, upsert: bool = False):
+        """Buffer an update; flushes immediately if the batch is full"""
+        self._buffer.append((filter, update, upsert))
+        if len(self._buffer) >= self.batch_size:
+            await self.flush()
+
+    async def flush(self):
+        """Write all buffered updates with one unordered bulk_write"""
+        if not self._buffer:
+            return
+        # Swap the buffer before awaiting so concurrent updates start a new batch
+        batch, self._buffer = self._buffer, []
+        self.batches += 1
+        operations = [UpdateOne(f, u, upsert=upsert) for f, u, upsert in batch]
+
+        try:
+            result = await self.collection.bulk_write(operations, ordered=False)
+            self.written += result.matched_count + result.upserted_count
+        except BulkWriteError as e:
+            details = e.details or {}
+            self.written += details.get("nMatched", 0) + details.get("nUpserted", 0)
+            failed_indexes = {err["index"] for err in details.get("writeErrors", [])}
+            await self._retry_individually([batch[i] for i in sorted(failed_indexes)])
+        except PyMongoError as e:
+            # The whole batch may not have been applied; updates are idempotent so retry all
+            print(f"Bulk write of {len(batch)} results failed: {e}")
+            await self._retry_individually(batch)
+
+    async def close(self):
+        """Stop the periodic flush task and write anything still buffered"""
+        self._closed.set()
+        if self._timer is not None:
+            await self._timer
+            self._timer = None
+        await self.flush()
+
+    async def _flush_periodically(self):
+        while not self._closed.is_set():
+            try:
+                await asyncio.wait_for(self._closed.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            await self.flush()
+
+    async def _retry_individually(self, batch: List[Tuple[dict, dict, bool]]):
+        for f, u, upsert in batch:
+            for attempt in range(BULK_WRITE_RETRIES):
+                try:
+                    await self.collection.update_one(f, u, upsert=upsert)
+                    self.written += 1
+                    break
+                except PyMongoError as e:
+                    if attempt == BULK_WRITE_RETRIES - 1:
+                        print(f"Failed to write result {f}: {e}")
+                        self.failed += 1
+                    else:
+                        await asyncio.sleep(0.1 * 2 ** attempt)
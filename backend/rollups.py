@@ -0,0 +1,504 @@
+"""
+Materialized metrics rollups.
+`metrics_rollups` holds one document per run (`run:{run_id}`) and one per
+domain (`domain:{domain_id}`) with result counts per difficulty and status,
+agent latency sums and a latency histogram, and token and cost totals.
+Run rollups are incremented as results are written and rebuilt exactly from
+`eval_results` when the run finishes; the domain rollup is a copy of its
+latest completed full run plus lifetime totals, so metrics reads are a single
+document lookup.
+
+Usage (consistency check / repair, from the backend directory):
+    python rollups.py                  Rebuild every rollup (and metric history point) from eval_results
+    python rollups.py --domain ID      Only one domain
+    python rollups.py --check          Report drifted rollups without writing
+"""
+import argparse
+import asyncio
+import math
+import os
+import sys
+from datetime import datetime
+from typing import Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from pymongo.errors import DuplicateKeyError
+
+from database import get_collection
+from models import EvalMetrics, MetricBreakdown
+from metric_history import record_point
+from response_cache import bump_generation
+
+# Upper bounds (ms) of the agent latency histogram buckets; slower items fall in le_inf
+LATENCY_BUCKETS_MS = (100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000)
+
+TOKEN_FIELDS = ("prompt_tokens", "completion_tokens", "cached_tokens")
+
+# Run scopes whose results define a domain's metrics
+FULL_SCOPES = ("full",)
+
+
+def get_rollups_collection():
+    return get_collection("metrics_rollups")
+
+
+def run_rollup_id(run_id: str) -> str:
+    return f"run:{run_id}"
+
+
+def domain_rollup_id(domain_id: str) -> str:
+    return f"domain:{domain_id}"
+
+
+def field_key(value: Optional[str]) -> str:
+    """Difficulty or judge tier as a rollup field name (no dots or leading $)"""
+    return (value or "").replace(".", "_").lstrip("$") or "unknown"
+
+
+def latency_bucket(latency_ms: Optional[float]) -> Optional[str]:
+    if latency_ms is None:
+        return None
+    for bound in LATENCY_BUCKETS_MS:
+        if latency_ms < bound:
+            return f"le_{bound}"
+    return "le_inf"
+
+
+class RollupDelta:
+    """Increments of a run rollup for a batch of result records, applied with one $inc"""
+
+    def __init__(self, run_id: str, domain_id: str):
+        self.run_id = run_id
+        self.domain_id = domain_id
+        self.increments: Dict[str, float] = {}
+
+    def _inc(self, path: str, value: float):
+        if value:
+            self.increments[path] = self.increments.get(path, 0) + value
+
+    def add(self, doc: dict):
+        """Count one eval_results record"""
+        cell = f"cells.{field_key(doc.get('difficulty'))}.{doc['status']}"
+        self._inc(f"{cell}.count", 1)
+        latency = doc.get("agent_latency_ms")
+        if latency is not None:
+            self._inc(f"{cell}.latency_total", latency)
+            self._inc(f"{cell}.latency_sq", latency * latency)
+            self._inc(f"{cell}.timed", 1)
+            self._inc(f"latency_histogram.{latency_bucket(latency)}", 1)
+        self._inc(f"tiers.{field_key(doc.get('decided_by') or 'llm')}.{doc['status']}", 1)
+        for usage in (doc.get("tokens") or {}).values():
+            for key in TOKEN_FIELDS:
+                self._inc(f"tokens.{key}", usage.get(key, 0))
+        self._inc("cost_usd", doc.get("cost_usd") or 0.0)
+        self._inc("items", 1)
+
+    async def flush(self):
+        if not self.increments:
+            return
+        increments, self.increments = self.increments, {}
+        await get_rollups_collection().update_one(
+            {"_id": run_rollup_id(self.run_id)},
+            {
+                "$inc": increments,
+                "$set": {"updated_at": datetime.utcnow()},
+                "$setOnInsert": {"kind": "run", "run_id": self.run_id, "domain_id": self.domain_id}
+            },
+            upsert=True
+        )
+
+
+def rollup_groups(rollup: dict) -> List[dict]:
+    """Flatten a rollup's cells into the (status, difficulty) groups metrics are computed from"""
+    return [
+        {
+            "status": status,
+            "difficulty": difficulty,
+            "count": cell.get("count", 0),
+            "latency_total": cell.get("latency_total", 0.0),
+            "latency_sq": cell.get("latency_sq", 0.0),
+            "timed": cell.get("timed", 0)
+        }
+        for difficulty, statuses in (rollup.get("cells") or {}).items()
+        for status, cell in statuses.items()
+    ]
+
+
+def summarize_counts(
+    groups: List[dict],
+    weights: Optional[Dict[str, float]] = None,
+    tiers: Optional[Dict[str, Dict[str, int]]] = None
+) -> EvalMetrics:
+    """
+    Compute dashboard metrics from per-(status, difficulty) counts (see rollup_groups).
+    Errored items had no verdict and are left out of every rate.
+    `weights` maps a difficulty to the number of suite items each sampled item
+    stands for; with it the metrics are estimates for the full suite.
+    `tiers` (per judge tier status counts) adds the pass rate of each tier.
+    """
+    decided = [g for g in groups if g["status"] in ("pass", "fail", "warn") and g["count"]]
+    if not decided:
+        return EvalMetrics(
+            overall_score=0.0,
+            hallucination_rate=0.0,
+            avg_latency=0.0,
+            pass_rate=0.0,
+            metric_breakdown=[]
+        )
+
+    def weight(g: dict) -> float:
+        return weights.get(g["difficulty"] or "unknown", 1.0) if weights else 1.0
+
+    total = sum(g["count"] * weight(g) for g in decided)
+    passed = sum(g["count"] * weight(g) for g in decided if g["status"] == "pass")
+    warned = sum(g["count"] * weight(g) for g in decided if g["status"] == "warn")
+    failed = total - passed - warned
+    pass_rate = passed / total * 100
+
+    # Calculate metrics by difficulty (weights are constant within a difficulty)
+    difficulty_stats = {}
+    for g in sorted(decided, key=lambda g: g["difficulty"] or "unknown"):
+        difficulty = g["difficulty"] or "unknown"
+        if difficulty not in difficulty_stats:
+            difficulty_stats[difficulty] = {"total": 0, "passed": 0}
+        difficulty_stats[difficulty]["total"] += g["count"]
+        if g["status"] == "pass":
+            difficulty_stats[difficulty]["passed"] += g["count"]
+
+    metric_breakdown = []
+    for difficulty, stats in difficulty_stats.items():
+        rate = stats["passed"] / stats["total"] * 100
+        metric_breakdown.append(MetricBreakdown(
+            category=difficulty.capitalize(),
+            value=round(rate, 2)
+        ))
+
+    # Warnings (partially correct answers) count for half
+    overall_score = (passed + 0.5 * warned) / total * 100
+
+    # Answers the judge marked incorrect
+    hallucination_rate = failed / total * 100
+
+    # Replayed answers have no measured latency
+    timed_weight = sum(g["timed"] * weight(g) for g in decided)
+    avg_latency = sum(g["latency_total"] * weight(g) for g in decided) / timed_weight if timed_weight else 0.0
+
+    tier_breakdown = []
+    for tier, statuses in sorted((tiers or {}).items()):
+        judged = sum(statuses.get(status, 0) for status in ("pass", "fail", "warn"))
+        if judged:
+            tier_breakdown.append(MetricBreakdown(
+                category=tier,
+                value=round(statuses.get("pass", 0) / judged * 100, 2)
+            ))
+
+    return EvalMetrics(
+        overall_score=round(overall_score, 2),
+        hallucination_rate=round(hallucination_rate, 2),
+        avg_latency=round(avg_latency, 2),
+        pass_rate=round(pass_rate, 2),
+        metric_breakdown=metric_breakdown,
+        tier_breakdown=tier_breakdown,
+        estimated=weights is not None,
+        sample_size=sum(g["count"] for g in groups) if weights is not None else None
+    )
+
+
+async def compute_run_rollup(run_id: str) -> dict:
+    """Aggregate a run's eval_results into rollup fields (cells, tiers, histogram, tokens, cost, items)"""
+    latency = "$agent_latency_ms"
+    bucket = {"$switch": {
+        "branches": [
+            {"case": {"$lt": [latency, bound]}, "then": f"le_{bound}"} for bound in LATENCY_BUCKETS_MS
+        ],
+        "default": "le_inf"
+    }}
+    groups = await get_collection("eval_results").aggregate([
+        {"$match": {"run_id": run_id}},
+        {"$project": {
+            "status": 1,
+            "difficulty": 1,
+            "decided_by": 1,
+            "latency": latency,
+            "bucket": {"$cond": [{"$isNumber": latency}, bucket, None]},
+            "cost_usd": 1,
+            **{key: {"$sum": [f"$tokens.agent.{key}", f"$tokens.judge.{key}"]} for key in TOKEN_FIELDS}
+        }},
+        {"$group": {
+            "_id": {"status": "$status", "difficulty": "$difficulty", "tier": "$decided_by", "bucket": "$bucket"},
+            "count": {"$sum": 1},
+            "latency_total": {"$sum": "$latency"},
+            "latency_sq": {"$sum": {"$multiply": ["$latency", "$latency"]}},
+            "cost_usd": {"$sum": "$cost_usd"},
+            **{key: {"$sum": f"${key}"} for key in TOKEN_FIELDS}
+        }}
+    ]).to_list(length=None)
+
+    rollup = {
+        "cells": {},
+        "tiers": {},
+        "latency_histogram": {},
+        "tokens": {key: 0 for key in TOKEN_FIELDS},
+        "cost_usd": 0.0,
+        "items": 0
+    }
+    for group in groups:
+        key = group["_id"]
+        cell = rollup["cells"].setdefault(field_key(key.get("difficulty")), {}).setdefault(
+            key["status"], {"count": 0, "latency_total": 0.0, "latency_sq": 0.0, "timed": 0}
+        )
+        cell["count"] += group["count"]
+        tier = rollup["tiers"].setdefault(field_key(key.get("tier") or "llm"), {})
+        tier[key["status"]] = tier.get(key["status"], 0) + group["count"]
+        if key.get("bucket") is not None:
+            cell["latency_total"] += group["latency_total"]
+            cell["latency_sq"] += group["latency_sq"]
+            cell["timed"] += group["count"]
+            histogram = rollup["latency_histogram"]
+            histogram[key["bucket"]] = histogram.get(key["bucket"], 0) + group["count"]
+        for field in TOKEN_FIELDS:
+            rollup["tokens"][field] += group[field]
+        rollup["cost_usd"] += group["cost_usd"]
+        rollup["items"] += group["count"]
+    return rollup
+
+
+async def rebuild_run_rollup(run: dict, finalized: Optional[bool] = None) -> dict:
+    """Replace a run's counts with ones computed from its eval_results; `finalized` is kept unless given"""
+    rollup = {
+        **await compute_run_rollup(run["_id"]),
+        "kind": "run",
+        "run_id": run["_id"],
+        "domain_id": run["domain_id"],
+        "scope": run.get("scope", "full"),
+        "status": run["status"],
+        "completed_at": run.get("completed_at"),
+        "updated_at": datetime.utcnow()
+    }
+    if finalized is not None:
+        rollup["finalized"] = finalized
+    await get_rollups_collection().update_one({"_id": run_rollup_id(run["_id"])}, {"$set": rollup}, upsert=True)
+    return rollup
+
+
+async def promote_to_domain(rollup: dict):
+    """Make a completed full run's rollup the domain's metrics, unless a later run already is"""
+    domain_id, completed_at = rollup["domain_id"], rollup["completed_at"]
+    fields = {
+        "kind": "domain",
+        "domain_id": domain_id,
+        "run_id": rollup["run_id"],
+        "completed_at": completed_at,
+        "updated_at": datetime.utcnow(),
+        "cells": rollup.get("cells") or {},
+        "tiers": rollup.get("tiers") or {},
+        "latency_histogram": rollup.get("latency_histogram") or {},
+        "tokens": rollup.get("tokens") or {},
+        "cost_usd": rollup.get("cost_usd", 0.0),
+        "items": rollup.get("items", 0)
+    }
+    try:
+        await get_rollups_collection().update_one(
+            {
+                "_id": domain_rollup_id(domain_id),
+                "$or": [{"completed_at": {"$lt": completed_at}}, {"completed_at": None}]
+            },
+            {"$set": fields},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        # The domain rollup already reflects a run that completed later
+        pass
+
+
+async def record_full_run(rollup: dict):
+    """Promote a completed full run's rollup to its domain and append it to the metric history"""
+    await promote_to_domain(rollup)
+    await record_point(
+        rollup["domain_id"], rollup["run_id"], rollup["completed_at"] or datetime.utcnow(),
+        summarize_counts(rollup_groups(rollup)), rollup
+    )
+
+
+async def finalize_run_rollup(run_id: str):
+    """
+    Called when a run reaches a terminal state, after its last delta was flushed.
+    The incrementally maintained rollup is kept when it covers every processed
+    item; it is rebuilt from eval_results only if increments were lost (a crash
+    between a write and its flush, or failed writes). A completed full run is
+    then promoted to the domain's metrics. Completed and aborted runs are added
+    to the domain's lifetime totals once; failed runs can still be resumed, so
+    they are not.
+    """
+    run = await get_collection("eval_runs").find_one(
+        {"_id": run_id},
+        {"domain_id": 1, "status": 1, "scope": 1, "completed_at": 1, "processed": 1, "write_failures": 1}
+    )
+    if run is None:
+        return
+    rollups = get_rollups_collection()
+    rollup = await rollups.find_one({"_id": run_rollup_id(run_id)})
+    if rollup is None or rollup.get("items", 0) != run.get("processed", 0) or run.get("write_failures"):
+        rollup = await rebuild_run_rollup(run)
+    else:
+        fields = {
+            "scope": run.get("scope", "full"),
+            "status": run["status"],
+            "completed_at": run.get("completed_at"),
+            "updated_at": datetime.utcnow()
+        }
+        await rollups.update_one({"_id": run_rollup_id(run_id)}, {"$set": fields})
+        rollup.update(fields)
+    if run["status"] not in ("completed", "aborted"):
+        await bump_generation(run["domain_id"])
+        return
+
+    if run["status"] == "completed" and run.get("scope", "full") in FULL_SCOPES:
+        await record_full_run(rollup)
+    # Claim the lifetime increment only once the rollup is written; several workers may finish the same run
+    claim = await rollups.update_one(
+        {"_id": run_rollup_id(run_id), "finalized": {"$ne": True}},
+        {"$set": {"finalized": True}}
+    )
+    if claim.modified_count:
+        tokens = rollup.get("tokens") or {}
+        await rollups.update_one(
+            {"_id": domain_rollup_id(run["domain_id"])},
+            {
+                "$inc": {
+                    "lifetime.runs": 1,
+                    "lifetime.items": rollup.get("items", 0),
+                    "lifetime.cost_usd": rollup.get("cost_usd", 0.0),
+                    **{f"lifetime.tokens.{key}": count for key, count in tokens.items()}
+                },
+                "$setOnInsert": {"kind": "domain", "domain_id": run["domain_id"], "completed_at": None}
+            },
+            upsert=True
+        )
+    await bump_generation(run["domain_id"])
+
+
+async def load_run_rollup(run_id: str) -> Optional[dict]:
+    """A run's rollup, built from its results if it has none yet (runs recorded before rollups existed)"""
+    rollup = await get_rollups_collection().find_one({"_id": run_rollup_id(run_id)})
+    if rollup is not None:
+        return rollup
+    run = await get_collection("eval_runs").find_one(
+        {"_id": run_id}, {"domain_id": 1, "status": 1, "scope": 1, "completed_at": 1}
+    )
+    return await rebuild_run_rollup(run) if run else None
+
+
+async def load_domain_rollup(domain_id: str) -> Optional[dict]:
+    """
+    The rollup behind a domain's metrics. Domains whose latest completed full
+    run predates rollups are backfilled on first read; None without such a run.
+    """
+    rollup = await get_rollups_collection().find_one({"_id": domain_rollup_id(domain_id)})
+    if rollup is not None and rollup.get("run_id"):
+        return rollup
+    latest_run = await get_collection("eval_runs").find_one(
+        {"domain_id": domain_id, "status": "completed", "scope": {"$nin": ["sequential", "sample"]}},
+        {"domain_id": 1, "status": 1, "scope": 1, "completed_at": 1},
+        sort=[("completed_at", -1)]
+    )
+    if latest_run is None:
+        return None
+    await record_full_run(await rebuild_run_rollup(latest_run))
+    return await get_rollups_collection().find_one({"_id": domain_rollup_id(domain_id)})
+
+
+def same(stored, expected) -> bool:
+    """Compare rollup fields, allowing float rounding from summing in a different order"""
+    if isinstance(expected, dict):
+        stored = stored or {}
+        return set(stored) == set(expected) and all(same(stored[k], expected[k]) for k in expected)
+    if isinstance(expected, float) or isinstance(stored, float):
+        return isinstance(stored, (int, float)) and math.isclose(stored, expected, rel_tol=1e-9, abs_tol=1e-6)
+    return stored == expected
+
+
+async def rebuild_rollups(domain_id: Optional[str] = None, check: bool = False) -> List[str]:
+    """
+    Recompute rollups from eval_results. With `check`, nothing is written.
+    Returns the IDs of rollups whose stored counts differed from the recomputed ones.
+    """
+    rollups = get_rollups_collection()
+    query = {"status": {"$in": ["completed", "failed", "aborted"]}}
+    if domain_id:
+        query["domain_id"] = domain_id
+    runs = await get_collection("eval_runs").find(
+        query, {"domain_id": 1, "status": 1, "scope": 1, "completed_at": 1}
+    ).sort("completed_at", 1).to_list(length=None)
+
+    compared = ("cells", "tiers", "latency_histogram", "tokens", "items")
+    drifted = []
+    lifetime: Dict[str, dict] = {}
+    latest: Dict[str, dict] = {}
+    for run in runs:
+        expected = await compute_run_rollup(run["_id"])
+        stored = await rollups.find_one({"_id": run_rollup_id(run["_id"])}) or {}
+        if not all(same(stored.get(key), expected[key]) for key in compared):
+            drifted.append(run_rollup_id(run["_id"]))
+        if not check:
+            await rebuild_run_rollup(run, finalized=run["status"] != "failed")
+
+        if run["status"] == "failed":
+            continue
+        totals = lifetime.setdefault(run["domain_id"], {
+            "runs": 0, "items": 0, "cost_usd": 0.0, "tokens": {key: 0 for key in TOKEN_FIELDS}
+        })
+        totals["runs"] += 1
+        totals["items"] += expected["items"]
+        totals["cost_usd"] += expected["cost_usd"]
+        for key in TOKEN_FIELDS:
+            totals["tokens"][key] += expected["tokens"][key]
+        if run["status"] == "completed" and run.get("scope", "full") in FULL_SCOPES:
+            latest[run["domain_id"]] = {**expected, "run_id": run["_id"], "completed_at": run.get("completed_at")}
+            if not check:
+                await record_point(
+                    run["domain_id"], run["_id"], run.get("completed_at") or datetime.utcnow(),
+                    summarize_counts(rollup_groups(expected)), expected
+                )
+
+    for domain, totals in lifetime.items():
+        stored = await rollups.find_one({"_id": domain_rollup_id(domain)}) or {}
+        expected = latest.get(domain)
+        if expected is not None and (
+            stored.get("run_id") != expected["run_id"]
+            or not all(same(stored.get(key), expected[key]) for key in compared)
+        ):
+            drifted.append(domain_rollup_id(domain))
+        if check:
+            continue
+        fields = {"kind": "domain", "domain_id": domain, "lifetime": totals, "updated_at": datetime.utcnow()}
+        if expected is not None:
+            fields.update(expected)
+        await rollups.replace_one({"_id": domain_rollup_id(domain)}, fields, upsert=True)
+    return drifted
+
+
+async def main():
+    from database import connect_to_mongo, close_mongo_connection, ensure_indexes
+
+    parser = argparse.ArgumentParser(description="Rebuild metrics rollups from eval_results")
+    parser.add_argument("--domain", default=None, help="Only rebuild this domain's rollups")
+    parser.add_argument("--check", action="store_true", help="Report drifted rollups without rewriting them")
+    args = parser.parse_args()
+
+    await connect_to_mongo()
+    try:
+        await ensure_indexes()
+        drifted = await rebuild_rollups(args.domain, args.check)
+        for rollup_id in drifted:
+            print(f"{'Drifted' if args.check else 'Repaired'}: {rollup_id}")
+        print(f"{len(drifted)} rollups {'drifted' if args.check else 'repaired'}")
+        if args.check and drifted:
+            sys.exit(1)
+    finally:
+        await close_mongo_connection()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
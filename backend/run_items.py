@@ -0,0 +1,118 @@
+"""
+Work queue of evaluation run items for standalone workers.
+Each test set of a worker-executed run is one document in `eval_run_items`.
+Workers lease items atomically with find_one_and_update and extend their
+leases with heartbeats; items whose lease expires (a crashed or stalled
+worker) become claimable again.
+"""
+from datetime import datetime, timedelta
+from typing import List
+import os
+
+from pymongo import ReturnDocument
+
+from database import get_collection
+
+# Item states
+ITEM_PENDING = "pending"
+ITEM_LEASED = "leased"
+ITEM_DONE = "done"
+
+# Seconds a claimed item stays leased without a heartbeat
+WORKER_LEASE_SECONDS = float(os.getenv("WORKER_LEASE_SECONDS", "60"))
+
+# Claims of one item after which it is recorded as an error instead of evaluated again
+WORKER_MAX_ATTEMPTS = int(os.getenv("WORKER_MAX_ATTEMPTS", "5"))
+
+
+def get_items_collection():
+    return get_collection("eval_run_items")
+
+
+async def enqueue_run_items(run_id: str, domain_id: str, test_sets: List[dict]):
+    """Queue one pending item per test set of a run, with its difficulty for results recorded without evaluation"""
+    now = datetime.utcnow()
+    await get_items_collection().insert_many([
+        {
+            "_id": f"{run_id}:{test_set['_id']}",
+            "run_id": run_id,
+            "domain_id": domain_id,
+            "test_set_id": test_set["_id"],
+            "difficulty": test_set.get("difficulty"),
+            "state": ITEM_PENDING,
+            "attempts": 0,
+            "lease_owner": None,
+            "lease_expires_at": None,
+            "created_at": now
+        }
+        for test_set in test_sets
+    ], ordered=False)
+
+
+async def claim_items(worker_id: str, limit: int) -> List[dict]:
+    """
+    Lease up to `limit` items, oldest first: pending items or items whose lease expired.
+    Each claim is a single atomic find_one_and_update, so an item is leased
+    to at most one worker at a time.
+    """
+    collection = get_items_collection()
+    claimed = []
+    while len(claimed) < limit:
+        now = datetime.utcnow()
+        item = await collection.find_one_and_update(
+            {"$or": [
+                {"state": ITEM_PENDING},
+                {"state": ITEM_LEASED, "lease_expires_at": {"$lt": now}}
+            ]},
+            {
+                "$set": {
+                    "state": ITEM_LEASED,
+                    "lease_owner": worker_id,
+                    "lease_expires_at": now + timedelta(seconds=WORKER_LEASE_SECONDS)
+                },
+                "$inc": {"attempts": 1}
+            },
+            sort=[("created_at", 1)],
+            return_document=ReturnDocument.AFTER
+        )
+        if item is None:
+            break
+        claimed.append(item)
+    return claimed
+
+
+async def extend_leases(worker_id: str) -> int:
+    """Heartbeat: push back the lease expiry of every item this worker holds"""
+    result = await get_items_collection().update_many(
+        {"state": ITEM_LEASED, "lease_owner": worker_id},
+        {"$set": {"lease_expires_at": datetime.utcnow() + timedelta(seconds=WORKER_LEASE_SECONDS)}}
+    )
+    return result.modified_count
+
+
+async def complete_items(worker_id: str, item_ids: List[str]):
+    """Mark items done; items whose lease was taken over by another worker are left to it"""
+    if not item_ids:
+        return
+    await get_items_collection().update_many(
+        {"_id": {"$in": item_ids}, "lease_owner": worker_id},
+        {"$set": {"state": ITEM_DONE, "lease_expires_at": None}}
+    )
+
+
+async def release_items(worker_id: str, item_ids: List[str]):
+    """Return unfinished items to the queue, e.g. when a worker shuts down"""
+    if not item_ids:
+        return
+    await get_items_collection().update_many(
+        {"_id": {"$in": item_ids}, "state": ITEM_LEASED, "lease_owner": worker_id},
+        {"$set": {"state": ITEM_PENDING, "lease_owner": None, "lease_expires_at": None}}
+    )
+
+
+async def run_finished(run_id: str) -> bool:
+    """True once every item of the run is done"""
+    remaining = await get_items_collection().count_documents(
+        {"run_id": run_id, "state": {"$ne": ITEM_DONE}}, limit=1
+    )
+    return remaining == 0
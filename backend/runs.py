@@ -0,0 +1,750 @@
+"""
+Evaluation run registry.
+Runs execute as background tasks; their state lives in the `eval_runs`
+collection so progress can be read or streamed while a run is in flight.
+"""
+from fastapi import APIRouter, HTTPException, Depends
+from fastapi.responses import StreamingResponse
+from typing import List, Optional
+from datetime import datetime, timedelta
+import asyncio
+import json
+import os
+import time
+
+from database import get_collection
+from models import EvalRun, EvalResult, GateResult
+from auth import get_current_user
+from engine import run_engine, agent_config_hash, judge_config_hash, test_set_fingerprint
+from cache import content_hash, answer_key, load_recorded_answers
+from llm import model_settings
+from result_writer import BulkResultWriter
+from sampling import SequentialGate, stratified_order
+from rollups import RollupDelta, finalize_run_rollup
+from response_cache import bump_generation
+
+# Run states
+RUN_QUEUED = "queued"
+RUN_RUNNING = "running"
+RUN_COMPLETED = "completed"
+RUN_FAILED = "failed"
+RUN_ABORTED = "aborted"
+TERMINAL_STATES = (RUN_COMPLETED, RUN_FAILED, RUN_ABORTED)
+
+# Minimum seconds between progress writes to eval_runs while a run is in flight
+PROGRESS_FLUSH_INTERVAL = float(os.getenv("EVAL_PROGRESS_FLUSH_INTERVAL", "1.0"))
+
+# Seconds between eval_runs reads while streaming progress
+STREAM_POLL_INTERVAL = float(os.getenv("EVAL_STREAM_POLL_INTERVAL", "1.0"))
+
+# Where runs execute: "api" (a background task in the API process) or "worker" (python -m backend.worker)
+RUN_EXECUTOR = os.getenv("EVAL_RUN_EXECUTOR", "api")
+
+# Seconds between heartbeats of an in-flight run
+RUN_HEARTBEAT_INTERVAL = float(os.getenv("EVAL_RUN_HEARTBEAT_INTERVAL", "10"))
+
+# Seconds without a heartbeat after which a queued or running run is considered abandoned
+RUN_STALE_SECONDS = float(os.getenv("EVAL_RUN_STALE_SECONDS", "60"))
+
+router = APIRouter()
+
+# Strong references to in-flight run tasks so they are not garbage collected
+_active_tasks: dict = {}
+
+
+def get_runs_collection():
+    return get_collection("eval_runs")
+
+
+def run_to_model(run: dict) -> EvalRun:
+    """Convert an eval_runs document to its API model"""
+    return EvalRun(
+        id=run["_id"],
+        domain_id=run["domain_id"],
+        status=run["status"],
+        processed=run.get("processed", 0),
+        total=run.get("total", 0),
+        passed=run.get("passed", 0),
+        failed=run.get("failed", 0),
+        warned=run.get("warned", 0),
+        errored=run.get("errored", 0),
+        decided_by=run.get("decided_by", {}),
+        eta_seconds=run.get("eta_seconds"),
+        replayed_answers=run.get("replayed_answers", 0),
+        carried_forward=run.get("carried_forward", 0),
+        resumes=run.get("resumes", 0),
+        scope=run.get("scope", "full"),
+        sample=run.get("sample"),
+        models=run.get("models"),
+        gate=GateResult(**run["gate"]) if run.get("gate") else None,
+        tokens=run.get("tokens", {}),
+        cost_usd=run.get("cost_usd", 0.0),
+        budget_usd=run.get("options", {}).get("budget_usd"),
+        error=run.get("error"),
+        created_at=run["created_at"],
+        started_at=run.get("started_at"),
+        completed_at=run.get("completed_at")
+    )
+
+
+class RunProgress:
+    """Tracks per-run counters in memory and flushes them to eval_runs periodically"""
+
+    def __init__(self, run_id: str, total: int):
+        self.run_id = run_id
+        self.total = total
+        self.processed = 0
+        self.counts = {"pass": 0, "fail": 0, "warn": 0, "error": 0}
+        self.tiers = {}
+        self.carried = 0
+        self.tokens = {"prompt_tokens": 0, "completion_tokens": 0, "cached_tokens": 0}
+        self.cost_usd = 0.0
+        # Items counted without being evaluated by this process (carried forward or restored on resume)
+        self.skipped = 0
+        self.started = time.monotonic()
+        self.last_flush = 0.0
+        # Rollup increments of the results counted since the last flush, if the caller tracks them
+        self.rollup: Optional[RollupDelta] = None
+
+    def record(self, status: str, decided_by: str, count: int = 1):
+        self.processed += count
+        if status in self.counts:
+            self.counts[status] += count
+        self.tiers[decided_by] = self.tiers.get(decided_by, 0) + count
+
+    def add_usage(self, tokens: dict):
+        """Add one item's agent and judge token usage and cost"""
+        for usage in tokens.values():
+            for key in self.tokens:
+                self.tokens[key] += usage.get(key, 0)
+            self.cost_usd += usage.get("cost_usd", 0.0)
+
+    def over_budget(self, budget_usd: Optional[float]) -> bool:
+        return budget_usd is not None and self.cost_usd >= budget_usd
+
+    def restore(self, results: List[dict]):
+        """Count results checkpointed by an earlier attempt of the run"""
+        for result in results:
+            self.record(result["status"], result.get("decided_by", "llm"))
+            self.add_usage(result.get("tokens") or {})
+            self.skipped += 1
+            if result.get("answer_source") == "carried":
+                self.carried += 1
+
+    def eta_seconds(self) -> Optional[float]:
+        # Skipped items complete instantly and say nothing about the pace of the rest
+        evaluated = self.processed - self.skipped
+        if evaluated == 0:
+            return None
+        elapsed = time.monotonic() - self.started
+        remaining = self.total - self.processed
+        return round(elapsed / evaluated * remaining, 1)
+
+    def fields(self) -> dict:
+        return {
+            "processed": self.processed,
+            "passed": self.counts["pass"],
+            "failed": self.counts["fail"],
+            "warned": self.counts["warn"],
+            "errored": self.counts["error"],
+            "decided_by": dict(self.tiers),
+            "carried_forward": self.carried,
+            "tokens": dict(self.tokens),
+            "cost_usd": round(self.cost_usd, 6),
+            "eta_seconds": self.eta_seconds()
+        }
+
+    async def maybe_flush(self):
+        now = time.monotonic()
+        if now - self.last_flush < PROGRESS_FLUSH_INTERVAL:
+            return
+        self.last_flush = now
+        await get_runs_collection().update_one({"_id": self.run_id}, {"$set": self.fields()})
+        if self.rollup is not None:
+            await self.rollup.flush()
+            await bump_generation(self.rollup.domain_id)
+
+
+def result_id(run_id: str, test_set_id: str) -> str:
+    """ID of the eval_results record for one test set in one run"""
+    return f"{run_id}:{test_set_id}"
+
+
+def result_document(run_id: str, domain_id: str, result: dict, fingerprint: str) -> dict:
+    """Build the eval_results record for one evaluated test set"""
+    return {
+        "run_id": run_id,
+        "domain_id": domain_id,
+        "test_set_id": result["test_set_id"],
+        "difficulty": result["difficulty"],
+        "status": result["status"],
+        "confidence": result["confidence"],
+        "decided_by": result["decided_by"],
+        "answer_source": result["answer_source"],
+        "agent_answer": result["agent_answer"],
+        "reasoning": result["reasoning"],
+        "agent_latency_ms": result["agent_latency_ms"],
+        "judge_latency_ms": result["judge_latency_ms"],
+        "tokens": result["tokens"],
+        "models": result.get("models"),
+        "cost_usd": result.get("cost_usd", 0.0),
+        "fingerprint": fingerprint,
+        "carried_from": None,
+        "created_at": datetime.utcnow()
+    }
+
+
+def test_set_update(run_id: str, result: dict, fingerprint: str) -> dict:
+    """Update that makes a result the latest one shown on its test set"""
+    return {"$set": {
+        "last_status": result["status"],
+        "last_agent_answer": result["agent_answer"],
+        "last_evaluation_reasoning": result["reasoning"],
+        "last_run_id": run_id,
+        "last_decided_by": result["decided_by"],
+        "confidence_score": result["confidence"],
+        "last_fingerprint": fingerprint,
+        "last_result_id": result_id(run_id, result["test_set_id"])
+    }}
+
+
+def answer_record(domain_id: str, config_hash: str, result: dict) -> dict:
+    """Update that stores a freshly generated agent answer for later replay"""
+    return {"$set": {
+        "value": {"answer": result["agent_answer"]},
+        "domain_id": domain_id,
+        "test_set_id": result["test_set_id"],
+        "agent_config_hash": config_hash,
+        "question": result["question"],
+        "created_at": datetime.utcnow()
+    }}
+
+
+def should_record_answer(answer_mode: str, result: dict) -> bool:
+    return answer_mode != "live" and result["answer_source"] == "live" and not result["agent_error"]
+
+
+def carried_document(run_id: str, test_set: dict, previous: dict) -> dict:
+    """
+    Copy a previous result into a new run for a test set whose inputs did not change.
+    Nothing was called, so token usage is zero; carried_from points at the original result.
+    """
+    return {
+        **{k: v for k, v in previous.items() if k != "_id"},
+        "run_id": run_id,
+        "difficulty": test_set.get("difficulty"),
+        "answer_source": "carried",
+        "judge_latency_ms": 0.0,
+        "tokens": {},
+        "cost_usd": 0.0,
+        "carried_from": previous.get("carried_from") or previous["_id"],
+        "created_at": datetime.utcnow()
+    }
+
+
+async def load_domain_settings(domain_id: str) -> dict:
+    """Domain fields that shape a run: judge batching, SQL dialect and LLM models"""
+    return await get_collection("domains").find_one(
+        {"_id": domain_id},
+        {
+            "judge_batch_size": 1, "dialect": 1, "agent_model": 1, "judge_model": 1,
+            "agent_temperature": 1, "agent_max_output_tokens": 1
+        }
+    ) or {}
+
+
+async def domain_prompt_hash(domain_id: str) -> str:
+    """Hash of the domain's prompts (key, type, content), ordered by key"""
+    prompts = await get_collection("prompts").find(
+        {"domain_id": domain_id}, {"_id": 0, "key": 1, "type": 1, "content": 1}
+    ).sort("key", 1).to_list(length=None)
+    return content_hash(*(json.dumps(p, sort_keys=True) for p in prompts))
+
+
+async def load_carried_results(test_sets: List[dict], fingerprints: dict) -> dict:
+    """
+    Fetch the last successful result of every test set whose fingerprint is unchanged.
+    Returns a map of test set ID to that eval_results record.
+    """
+    unchanged = {
+        ts["last_result_id"]: ts["_id"] for ts in test_sets
+        if ts.get("last_result_id") and ts.get("last_fingerprint") == fingerprints[ts["_id"]]
+    }
+    if not unchanged:
+        return {}
+    previous = await get_collection("eval_results").find(
+        {"_id": {"$in": list(unchanged)}}
+    ).to_list(length=None)
+    return {
+        unchanged[r["_id"]]: r for r in previous
+        if r["status"] != "error" and r.get("fingerprint") == fingerprints[unchanged[r["_id"]]]
+    }
+
+
+async def create_run(
+    run_id: str,
+    domain_id: str,
+    test_set_ids: List[str],
+    options: Optional[dict] = None,
+    executor: str = "api",
+    scope: str = "full",
+    sample: Optional[dict] = None
+) -> dict:
+    """Register a queued run in eval_runs, recording which test sets it covers so it can be resumed"""
+    now = datetime.utcnow()
+    run_doc = {
+        "_id": run_id,
+        "domain_id": domain_id,
+        "status": RUN_QUEUED,
+        "test_set_ids": test_set_ids,
+        "processed": 0,
+        "total": len(test_set_ids),
+        "passed": 0,
+        "failed": 0,
+        "warned": 0,
+        "errored": 0,
+        "eta_seconds": None,
+        "error": None,
+        "options": options or {},
+        "scope": scope,
+        "sample": sample,
+        "executor": executor,
+        "resumes": 0,
+        "created_at": now,
+        "heartbeat_at": now,
+        "started_at": None,
+        "completed_at": None
+    }
+    await get_runs_collection().insert_one(run_doc)
+    return run_doc
+
+
+async def heartbeat(run_id: str):
+    """Mark a run as alive until cancelled"""
+    while True:
+        await asyncio.sleep(RUN_HEARTBEAT_INTERVAL)
+        try:
+            await get_runs_collection().update_one({"_id": run_id}, {"$set": {"heartbeat_at": datetime.utcnow()}})
+        except Exception as e:
+            print(f"Heartbeat for evaluation run {run_id} failed: {e}")
+
+
+async def execute_run(
+    run_id: str,
+    domain_id: str,
+    test_sets: List[dict],
+    options: dict,
+    completed: Optional[List[dict]] = None
+):
+    """
+    Evaluate test sets for a registered run and keep its eval_runs state current.
+    `completed` holds the results checkpointed by an interrupted attempt of the run;
+    they are counted towards progress and `test_sets` should hold only the rest.
+    """
+    runs_collection = get_runs_collection()
+    test_sets_collection = get_collection("test_sets")
+    completed = completed or []
+    progress = RunProgress(run_id, len(completed) + len(test_sets))
+    progress.restore(completed)
+    progress.rollup = RollupDelta(run_id, domain_id)
+
+    # Sequential runs stop starting new items once the pass rate interval clears the threshold
+    # Runs stop starting new items once their cost reaches the budget cap
+    sequential = options.get("sequential")
+    budget_usd = options.get("budget_usd")
+    gate = None
+    stop = asyncio.Event()
+    if progress.over_budget(budget_usd):
+        stop.set()
+    if sequential:
+        gate = SequentialGate(
+            sequential["threshold"], sequential["confidence"], sequential["method"], sequential["min_items"]
+        )
+        for result in completed:
+            gate.record(result["status"])
+        if gate.decision():
+            stop.set()
+        test_sets = stratified_order(test_sets, sequential["seed"])
+
+    def record_verdict(status: str, decided_by: str):
+        progress.record(status, decided_by)
+        if gate is not None:
+            gate.record(status)
+            if gate.decision():
+                stop.set()
+    answer_mode = options.get("answer_mode", "live")
+    config_hash = None
+    fingerprints = {}
+    carried = {}
+
+    now = datetime.utcnow()
+    await runs_collection.update_one(
+        {"_id": run_id},
+        {"$set": {
+            "status": RUN_RUNNING,
+            "total": progress.total,
+            "heartbeat_at": now,
+            **({"resumed_at": now} if completed else {"started_at": now})
+        }}
+    )
+    heartbeat_task = asyncio.create_task(heartbeat(run_id))
+
+    writer = BulkResultWriter(test_sets_collection)
+    results_writer = BulkResultWriter(get_collection("eval_results"))
+    answers_writer = BulkResultWriter(get_collection("agent_answers"))
+    recorded_answers = None
+
+    # Buffer each result as soon as its test set finishes; the writers flush in batches
+    async def save_result(result: dict):
+        record_verdict(result["status"], result["decided_by"])
+        progress.add_usage(result["tokens"])
+        if progress.over_budget(budget_usd):
+            stop.set()
+        doc = result_document(run_id, domain_id, result, fingerprints[result["test_set_id"]])
+        progress.rollup.add(doc)
+        await progress.maybe_flush()
+        # Per-item result records are immutable: $setOnInsert never overwrites an existing record
+        await results_writer.update(
+            {"_id": result_id(run_id, result["test_set_id"])},
+            {"$setOnInsert": doc},
+            upsert=True
+        )
+        # Errored items keep their previous result instead of recording a provider failure as a verdict
+        if result["status"] != "error":
+            await writer.update(
+                {"_id": result["test_set_id"]},
+                test_set_update(run_id, result, fingerprints[result["test_set_id"]])
+            )
+        # Record freshly generated answers so later runs can replay them
+        if should_record_answer(answer_mode, result):
+            await answers_writer.update(
+                {"_id": answer_key(domain_id, result["test_set_id"], config_hash)},
+                answer_record(domain_id, config_hash, result),
+                upsert=True
+            )
+
+    try:
+        domain = await load_domain_settings(domain_id)
+        models = model_settings(domain)
+        config_hash = agent_config_hash(models)
+        await runs_collection.update_one(
+            {"_id": run_id}, {"$set": {"agent_config_hash": config_hash, "models": models}}
+        )
+        prompt_hash = await domain_prompt_hash(domain_id)
+        judge_hash = judge_config_hash(models, domain, options.get("judge_cascade", True))
+        fingerprints = {
+            ts["_id"]: test_set_fingerprint(ts, prompt_hash, config_hash, judge_hash) for ts in test_sets
+        }
+        if options.get("incremental"):
+            carried = await load_carried_results(test_sets, fingerprints)
+        pending = [ts for ts in test_sets if ts["_id"] not in carried]
+        if answer_mode == "replay":
+            recorded_answers = await load_recorded_answers(domain_id, pending, config_hash)
+        async with writer, results_writer, answers_writer:
+            # Unchanged items keep their last result without calling the agent or judge
+            for test_set in test_sets:
+                previous = carried.get(test_set["_id"])
+                if previous is None:
+                    continue
+                test_set_id = test_set["_id"]
+                progress.carried += 1
+                progress.skipped += 1
+                record_verdict(previous["status"], previous.get("decided_by", "llm"))
+                doc = carried_document(run_id, test_set, previous)
+                progress.rollup.add(doc)
+                await results_writer.update(
+                    {"_id": result_id(run_id, test_set_id)},
+                    {"$setOnInsert": doc},
+                    upsert=True
+                )
+                await writer.update(
+                    {"_id": test_set_id},
+                    {"$set": {"last_run_id": run_id, "last_result_id": result_id(run_id, test_set_id)}}
+                )
+            await progress.maybe_flush()
+            await run_engine(
+                pending,
+                concurrency=options.get("concurrency"),
+                on_result=save_result,
+                recorded_answers=recorded_answers,
+                judge_batch_size=domain.get("judge_batch_size", 1),
+                cascade=options.get("judge_cascade", True),
+                sql_context={"dialect": domain.get("dialect"), "domain_id": domain_id},
+                stop=stop,
+                models=models
+            )
+        final = {"status": RUN_COMPLETED}
+        if progress.over_budget(budget_usd):
+            final = {
+                "status": RUN_ABORTED,
+                "error": f"Budget cap exceeded: ${progress.cost_usd:.4f} of ${budget_usd:.4f}"
+            }
+        if gate is not None:
+            final["gate"] = gate.summary(progress.processed)
+    except Exception as e:
+        print(f"Evaluation run {run_id} failed: {e}")
+        final = {"status": RUN_FAILED, "error": str(e)}
+    finally:
+        heartbeat_task.cancel()
+
+    # Apply the increments counted since the last throttled flush before the run is finalized
+    try:
+        await progress.rollup.flush()
+    except Exception as e:
+        print(f"Metrics rollup flush of evaluation run {run_id} failed: {e}")
+    await runs_collection.update_one(
+        {"_id": run_id},
+        {"$set": {
+            **progress.fields(),
+            **final,
+            "eta_seconds": 0,
+            "replayed_answers": len(recorded_answers or {}),
+            "write_failures": writer.failed + results_writer.failed + answers_writer.failed,
+            "completed_at": datetime.utcnow()
+        }}
+    )
+    try:
+        await finalize_run_rollup(run_id)
+    except Exception as e:
+        print(f"Metrics rollup of evaluation run {run_id} failed: {e}")
+
+
+async def recount_run(run_id: str) -> dict:
+    """Recompute a run's counters from its eval_results records"""
+    counts = await get_collection("eval_results").aggregate([
+        {"$match": {"run_id": run_id}},
+        {"$group": {
+            "_id": {"status": "$status", "decided_by": "$decided_by"},
+            "count": {"$sum": 1},
+            "carried": {"$sum": {"$cond": [{"$eq": ["$answer_source", "carried"]}, 1, 0]}},
+            **{
+                key: {"$sum": {"$sum": [f"$tokens.agent.{key}", f"$tokens.judge.{key}"]}}
+                for key in ("prompt_tokens", "completion_tokens", "cached_tokens", "cost_usd")
+            }
+        }}
+    ]).to_list(length=None)
+    progress = RunProgress(run_id, 0)
+    for group in counts:
+        status, decided_by = group["_id"]["status"], group["_id"].get("decided_by") or "llm"
+        progress.record(status, decided_by, group["count"])
+        progress.carried += group["carried"]
+        progress.add_usage({"total": group})
+    fields = progress.fields()
+    fields["eta_seconds"] = 0
+    return fields
+
+
+def start_run(
+    run_id: str,
+    domain_id: str,
+    test_sets: List[dict],
+    options: dict,
+    completed: Optional[List[dict]] = None
+) -> asyncio.Task:
+    """Schedule a registered run on the event loop and return immediately"""
+    task = asyncio.create_task(execute_run(run_id, domain_id, test_sets, options, completed))
+    _active_tasks[run_id] = task
+    task.add_done_callback(lambda _: _active_tasks.pop(run_id, None))
+    return task
+
+
+async def resume_run(run: dict) -> asyncio.Task:
+    """
+    Restart an interrupted run, evaluating only the test sets without a checkpointed result.
+    Test sets deleted since the run was created are dropped from it.
+    """
+    completed = await get_collection("eval_results").find(
+        {"run_id": run["_id"]},
+        {"test_set_id": 1, "status": 1, "decided_by": 1, "answer_source": 1, "tokens": 1}
+    ).to_list(length=None)
+    done = {r["test_set_id"] for r in completed}
+    remaining = [ts_id for ts_id in run.get("test_set_ids", []) if ts_id not in done]
+    test_sets = await get_collection("test_sets").find(
+        {"_id": {"$in": remaining}, "domain_id": run["domain_id"]}
+    ).to_list(length=None)
+
+    await get_runs_collection().update_one(
+        {"_id": run["_id"]},
+        {"$set": {"status": RUN_QUEUED, "error": None, "completed_at": None}, "$inc": {"resumes": 1}}
+    )
+    return start_run(run["_id"], run["domain_id"], test_sets, run.get("options", {}), completed)
+
+
+async def recover_stale_runs() -> List[str]:
+    """
+    Resume queued or running runs whose heartbeat is older than RUN_STALE_SECONDS.
+    Each run is claimed atomically by refreshing its heartbeat, so concurrent API
+    processes never resume the same run twice. Returns the resumed run IDs.
+    """
+    collection = get_runs_collection()
+    resumed = []
+    while True:
+        now = datetime.utcnow()
+        run = await collection.find_one_and_update(
+            {
+                "status": {"$in": [RUN_QUEUED, RUN_RUNNING]},
+                "executor": {"$ne": "worker"},
+                "heartbeat_at": {"$lt": now - timedelta(seconds=RUN_STALE_SECONDS)},
+                "_id": {"$nin": list(_active_tasks) + resumed}
+            },
+            {"$set": {"heartbeat_at": now}}
+        )
+        if run is None:
+            return resumed
+        print(f"Resuming stale evaluation run {run['_id']}")
+        await resume_run(run)
+        resumed.append(run["_id"])
+
+
+async def watch_stale_runs():
+    """Recover stale runs at startup and keep checking every RUN_STALE_SECONDS"""
+    while True:
+        try:
+            await recover_stale_runs()
+        except Exception as e:
+            print(f"Stale run recovery failed: {e}")
+        await asyncio.sleep(RUN_STALE_SECONDS)
+
+
+# Run Endpoints
+
+@router.get("/domains/{domain_id}/runs", response_model=List[EvalRun])
+async def list_runs(
+    domain_id: str,
+    limit: int = 20,
+    current_user: dict = Depends(get_current_user)
+):
+    """List recent evaluation runs for a domain, newest first"""
+    runs = await get_runs_collection().find({"domain_id": domain_id}).sort(
+        "created_at", -1
+    ).limit(limit).to_list(length=limit)
+    return [run_to_model(run) for run in runs]
+
+
+@router.get("/runs/{run_id}/results", response_model=List[EvalResult])
+async def list_run_results(
+    run_id: str,
+    status: Optional[str] = None,
+    skip: int = 0,
+    limit: int = 100,
+    current_user: dict = Depends(get_current_user)
+):
+    """List per-item results recorded for an evaluation run"""
+    query = {"run_id": run_id}
+    if status:
+        query["status"] = status
+    results = await get_collection("eval_results").find(query).sort("_id", 1).skip(skip).limit(limit).to_list(length=limit)
+    return [EvalResult(
+        id=r["_id"],
+        run_id=r["run_id"],
+        domain_id=r["domain_id"],
+        test_set_id=r["test_set_id"],
+        difficulty=r.get("difficulty"),
+        status=r["status"],
+        confidence=r.get("confidence"),
+        decided_by=r.get("decided_by"),
+        answer_source=r.get("answer_source"),
+        agent_answer=r.get("agent_answer"),
+        reasoning=r.get("reasoning"),
+        agent_latency_ms=r.get("agent_latency_ms"),
+        judge_latency_ms=r.get("judge_latency_ms"),
+        tokens=r.get("tokens", {}),
+        models=r.get("models"),
+        cost_usd=r.get("cost_usd", 0.0),
+        fingerprint=r.get("fingerprint"),
+        carried_from=r.get("carried_from"),
+        created_at=r["created_at"]
+    ) for r in results]
+
+
+@router.get("/runs/{run_id}", response_model=EvalRun)
+async def get_run(run_id: str, current_user: dict = Depends(get_current_user)):
+    """Get the current state of an evaluation run"""
+    run = await get_runs_collection().find_one({"_id": run_id})
+    if not run:
+        raise HTTPException(status_code=404, detail="Evaluation run not found")
+    return run_to_model(run)
+
+
+@router.post("/runs/{run_id}/resume")
+async def resume_run_endpoint(run_id: str, current_user: dict = Depends(get_current_user)):
+    """
+    Resume an interrupted or failed run, evaluating only its unfinished test sets.
+    Runs that are still alive (in this or another process) cannot be resumed.
+    """
+    collection = get_runs_collection()
+    run = await collection.find_one({"_id": run_id})
+    if not run:
+        raise HTTPException(status_code=404, detail="Evaluation run not found")
+    if run["status"] == RUN_COMPLETED:
+        raise HTTPException(status_code=409, detail="Evaluation run already completed")
+    if run["status"] == RUN_ABORTED:
+        raise HTTPException(status_code=409, detail="Evaluation run was aborted at its budget cap")
+    if run.get("executor") == "worker":
+        raise HTTPException(status_code=409, detail="Worker runs are re-queued automatically when item leases expire")
+
+    # Claim the run atomically so it is not resumed twice
+    now = datetime.utcnow()
+    stale_before = now - timedelta(seconds=RUN_STALE_SECONDS)
+    if run_id in _active_tasks:
+        raise HTTPException(status_code=409, detail="Evaluation run is still in progress")
+    claimed = await collection.find_one_and_update(
+        {
+            "_id": run_id,
+            "$or": [
+                {"status": RUN_FAILED},
+                {"status": {"$in": [RUN_QUEUED, RUN_RUNNING]}, "heartbeat_at": {"$lt": stale_before}}
+            ]
+        },
+        {"$set": {"heartbeat_at": now}}
+    )
+    if not claimed:
+        raise HTTPException(status_code=409, detail="Evaluation run is still in progress")
+
+    await resume_run(claimed)
+    return {
+        "status": RUN_QUEUED,
+        "run_id": run_id,
+        "total": len(claimed.get("test_set_ids", [])),
+        "stream_url": f"/api/v1/runs/{run_id}/stream",
+        "message": "Evaluation resumed"
+    }
+
+
+@router.get("/runs/{run_id}/stream")
+async def stream_run(
+    run_id: str,
+    format: str = "sse",
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Stream run progress until the run finishes.
+    Emits Server-Sent Events by default, or NDJSON with `format=ndjson`.
+    A new event is sent only when the run state changes.
+    """
+    if format not in ("sse", "ndjson"):
+        raise HTTPException(status_code=400, detail="format must be 'sse' or 'ndjson'")
+
+    collection = get_runs_collection()
+    if not await collection.find_one({"_id": run_id}, {"_id": 1}):
+        raise HTTPException(status_code=404, detail="Evaluation run not found")
+
+    async def events():
+        last_payload = None
+        while True:
+            run = await collection.find_one({"_id": run_id})
+            if run is None:
+                return
+            payload = json.dumps(run_to_model(run).model_dump(mode="json"))
+            if payload != last_payload:
+                last_payload = payload
+                if format == "sse":
+                    yield f"event: progress\ndata: {payload}\n\n"
+                else:
+                    yield payload + "\n"
+            if run["status"] in TERMINAL_STATES:
+                return
+            await asyncio.sleep(STREAM_POLL_INTERVAL)
+
+    media_type = "text/event-stream" if format == "sse" else "application/x-ndjson"
+    return StreamingResponse(events(), media_type=media_type, headers={"Cache-Control": "no-cache"})
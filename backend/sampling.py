@@ -0,0 +1,214 @@
+"""
+Sampling and statistics for partial evaluation runs.
+Orders or samples test sets reproducibly, stratified by difficulty, and
+tracks a binomial confidence interval on the pass rate so a run can stop
+as soon as it clears (or misses) a threshold.
+"""
+import math
+import random
+from statistics import NormalDist
+from typing import Dict, List, Optional, Tuple
+
+
+def difficulty_of(test_set: dict) -> str:
+    return test_set.get("difficulty") or "unknown"
+
+
+def stratified_order(test_sets: List[dict], seed: int) -> List[dict]:
+    """
+    Shuffle each difficulty stratum with `seed` and interleave the strata so
+    that every prefix of the result holds them in proportion to their size.
+    """
+    rng = random.Random(seed)
+    strata = {}
+    for test_set in sorted(test_sets, key=lambda ts: str(ts["_id"])):
+        strata.setdefault(difficulty_of(test_set), []).append(test_set)
+    for key in sorted(strata):
+        rng.shuffle(strata[key])
+
+    taken = {key: 0 for key in strata}
+    order = []
+    while len(order) < len(test_sets):
+        # Next item comes from the stratum furthest behind its share
+        key = min(
+            (k for k in strata if taken[k] < len(strata[k])),
+            key=lambda k: ((taken[k] + 1) / len(strata[k]), k)
+        )
+        order.append(strata[key][taken[key]])
+        taken[key] += 1
+    return order
+
+
+def wilson_interval(successes: int, trials: int, confidence: float) -> Tuple[float, float]:
+    """Wilson score interval for a binomial proportion"""
+    if trials == 0:
+        return 0.0, 1.0
+    z = NormalDist().inv_cdf(1 - (1 - confidence) / 2)
+    p = successes / trials
+    denominator = 1 + z * z / trials
+    center = (p + z * z / (2 * trials)) / denominator
+    half_width = z * math.sqrt(p * (1 - p) / trials + z * z / (4 * trials * trials)) / denominator
+    return max(0.0, center - half_width), min(1.0, center + half_width)
+
+
+def _beta_continued_fraction(a: float, b: float, x: float) -> float:
+    """Continued fraction of the incomplete beta function (modified Lentz's method)"""
+    tiny = 1e-300
+    c, d = 1.0, 1.0 - (a + b) * x / (a + 1)
+    d = 1.0 / (d if abs(d) > tiny else tiny)
+    result = d
+    for m in range(1, 300):
+        for numerator in (
+            m * (b - m) * x / ((a + 2 * m - 1) * (a + 2 * m)),
+            -(a + m) * (a + b + m) * x / ((a + 2 * m) * (a + 2 * m + 1))
+        ):
+            d = 1.0 + numerator * d
+            d = 1.0 / (d if abs(d) > tiny else tiny)
+            c = 1.0 + numerator / c
+            c = c if abs(c) > tiny else tiny
+            result *= c * d
+        if abs(c * d - 1.0) < 1e-12:
+            break
+    return result
+
+
+def _regularized_beta(a: float, b: float, x: float) -> float:
+    """Regularized incomplete beta function I_x(a, b)"""
+    if x <= 0.0:
+        return 0.0
+    if x >= 1.0:
+        return 1.0
+    front = math.exp(math.lgamma(a + b) - math.lgamma(a) - math.lgamma(b) + a * math.log(x) + b * math.log1p(-x))
+    if x < (a + 1) / (a + b + 2):
+        return front * _beta_continued_fraction(a, b, x) / a
+    return 1.0 - front * _beta_continued_fraction(b, a, 1.0 - x) / b
+
+
+def _beta_quantile(q: float, a: float, b: float) -> float:
+    """Inverse of I_x(a, b) by bisection"""
+    low, high = 0.0, 1.0
+    # 40 halvings resolve the quantile to ~1e-12
+    for _ in range(40):
+        mid = (low + high) / 2
+        if _regularized_beta(a, b, mid) < q:
+            low = mid
+        else:
+            high = mid
+    return (low + high) / 2
+
+
+def clopper_pearson_interval(successes: int, trials: int, confidence: float) -> Tuple[float, float]:
+    """Exact (Clopper-Pearson) interval for a binomial proportion"""
+    if trials == 0:
+        return 0.0, 1.0
+    alpha = 1 - confidence
+    lower = 0.0 if successes == 0 else _beta_quantile(alpha / 2, successes, trials - successes + 1)
+    upper = 1.0 if successes == trials else _beta_quantile(1 - alpha / 2, successes + 1, trials - successes)
+    return lower, upper
+
+
+INTERVALS = {
+    "wilson": wilson_interval,
+    "clopper_pearson": clopper_pearson_interval
+}
+
+
+class SequentialGate:
+    """
+    Pass-rate gate that decides as soon as the confidence interval is entirely
+    above (pass) or below (fail) the threshold. Thresholds and intervals are percentages.
+    Errored items carry no verdict and are ignored.
+    """
+
+    def __init__(self, threshold: float, confidence: float = 0.95, method: str = "wilson", min_items: int = 10):
+        self.threshold = threshold
+        self.confidence = confidence
+        self.method = method
+        self.min_items = min_items
+        self.passed = 0
+        self.decided = 0
+
+    def record(self, status: str):
+        if status == "error":
+            return
+        self.decided += 1
+        if status == "pass":
+            self.passed += 1
+
+    def interval(self) -> Tuple[float, float]:
+        low, high = INTERVALS[self.method](self.passed, self.decided, self.confidence)
+        return low * 100, high * 100
+
+    def decision(self) -> Optional[str]:
+        """'pass' or 'fail' once the interval clears the threshold, otherwise None"""
+        if self.decided < self.min_items:
+            return None
+        low, high = self.interval()
+        if low > self.threshold:
+            return "pass"
+        if high < self.threshold:
+            return "fail"
+        return None
+
+    def summary(self, items_consumed: int) -> dict:
+        low, high = self.interval()
+        return {
+            "decision": self.decision() or "inconclusive",
+            "threshold": self.threshold,
+            "confidence": self.confidence,
+            "method": self.method,
+            "pass_rate": round(self.passed / self.decided * 100, 2) if self.decided else 0.0,
+            "interval_low": round(low, 2),
+            "interval_high": round(high, 2),
+            "items_consumed": items_consumed
+        }
+
+
+def allocate(populations: Dict[str, int], size: int) -> Dict[str, int]:
+    """
+    Split a sample size across strata in proportion to their populations
+    (largest remainder), giving every stratum at least one item when the size allows.
+    """
+    total = sum(populations.values())
+    size = min(size, total)
+    quotas = {key: size * count / total for key, count in populations.items()}
+    allocation = {key: int(quota) for key, quota in quotas.items()}
+    by_remainder = sorted(quotas, key=lambda k: (-(quotas[k] - allocation[k]), k))
+    for key in by_remainder[:size - sum(allocation.values())]:
+        allocation[key] += 1
+
+    if size >= len(populations):
+        for key in sorted(populations):
+            if allocation[key] == 0:
+                donor = max(allocation, key=lambda k: (allocation[k], k))
+                allocation[donor] -= 1
+                allocation[key] = 1
+    return allocation
+
+
+def stratified_sample(test_sets: List[dict], size: int, seed: int) -> Tuple[List[dict], Dict[str, dict]]:
+    """
+    Draw a reproducible sample of `size` test sets, stratified by difficulty.
+    Returns the sample and, per difficulty, its population and sampled counts.
+    """
+    rng = random.Random(seed)
+    strata = {}
+    for test_set in sorted(test_sets, key=lambda ts: str(ts["_id"])):
+        strata.setdefault(difficulty_of(test_set), []).append(test_set)
+    allocation = allocate({key: len(items) for key, items in strata.items()}, size)
+
+    sample = []
+    summary = {}
+    for key in sorted(strata):
+        drawn = rng.sample(strata[key], allocation[key])
+        sample.extend(drawn)
+        summary[key] = {"population": len(strata[key]), "sampled": len(drawn)}
+    return sample, summary
+
+
+def stratum_weights(strata: Dict[str, dict]) -> Dict[str, float]:
+    """Weight of each sampled item: the number of suite items it stands for"""
+    return {
+        key: counts["population"] / counts["sampled"]
+        for key, counts in strata.items() if counts["sampled"]
+    }
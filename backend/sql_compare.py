@@ -0,0 +1,229 @@
+"""
+SQL-aware answer comparison.
+Parses agent and golden SQL, canonicalizes both ASTs (identifier casing,
+table aliases and qualifiers, ordering of commutative operands, whitespace)
+and compares them. When the ASTs differ and the domain has a SQLite
+fixture, both queries are executed against it; differing result sets fail
+the answer, matching ones leave it to the LLM judge.
+"""
+import asyncio
+import os
+import re
+import sqlite3
+import time
+from collections import Counter
+from typing import List, Optional, Tuple
+
+import sqlglot
+from sqlglot import exp
+from sqlglot.errors import SqlglotError
+from sqlglot.optimizer.normalize_identifiers import normalize_identifiers
+from sqlglot.optimizer.scope import traverse_scope
+
+# Directory holding per-domain fixtures: {domain_id}.sql (DDL + INSERTs in the domain dialect) or {domain_id}.sqlite
+SQL_FIXTURE_DIR = os.getenv("SQL_FIXTURE_DIR", "fixtures")
+
+# Maximum milliseconds a query may run against a fixture
+SQL_EXECUTION_TIMEOUT_MS = int(os.getenv("SQL_EXECUTION_TIMEOUT_MS", "2000"))
+
+# Decimal places used when comparing floating point result values
+SQL_RESULT_FLOAT_PRECISION = int(os.getenv("SQL_RESULT_FLOAT_PRECISION", "6"))
+
+SQL_START_PATTERN = re.compile(r"^\s*(select|with)\b", re.IGNORECASE)
+SQL_FENCE_PATTERN = re.compile(r"```(?:sql)?\s*(.*?)```", re.IGNORECASE | re.DOTALL)
+
+# Serialized fixture databases per domain, built once per process
+_fixtures: dict = {}
+
+
+def extract_sql(text: str) -> Optional[str]:
+    """Return the SQL query in text (bare, or in a fenced code block), or None"""
+    fenced = SQL_FENCE_PATTERN.search(text)
+    candidate = fenced.group(1) if fenced else text
+    candidate = candidate.strip().rstrip(";").strip()
+    if SQL_START_PATTERN.match(candidate):
+        return candidate
+    return None
+
+
+def read_dialect(dialect: Optional[str]) -> Optional[str]:
+    """Map a domain's dialect name (e.g. 'Snowflake') to a sqlglot dialect, if supported"""
+    name = (dialect or "").strip().lower()
+    if name in ("postgresql",):
+        name = "postgres"
+    return name if name in sqlglot.dialects.Dialect.classes else None
+
+
+def _sort_commutative(node: exp.Expression) -> exp.Expression:
+    if isinstance(node, (exp.And, exp.Or)):
+        operands = sorted(node.flatten(), key=lambda e: e.sql())
+        combine = exp.and_ if isinstance(node, exp.And) else exp.or_
+        return combine(*operands, copy=False)
+    if isinstance(node, (exp.EQ, exp.NEQ, exp.Add, exp.Mul)):
+        left, right = sorted((node.this, node.expression), key=lambda e: e.sql())
+        return node.__class__(this=left, expression=right)
+    return node
+
+
+def canonicalize(sql: str, dialect: Optional[str] = None) -> exp.Expression:
+    """
+    Parse SQL into a canonical AST.
+    Raises sqlglot errors if the SQL cannot be parsed.
+    """
+    tree = sqlglot.parse_one(sql, read=dialect)
+    tree = normalize_identifiers(tree, dialect=dialect)
+
+    # Replace table aliases with table names and drop catalog/schema qualifiers,
+    # unless a table appears more than once (self joins need their aliases)
+    tables = list(tree.find_all(exp.Table))
+    counts = Counter(t.name for t in tables)
+    aliases = {}
+    for table in tables:
+        table.set("db", None)
+        table.set("catalog", None)
+        if counts[table.name] == 1 and table.alias:
+            aliases[table.alias] = table.name
+            table.set("alias", None)
+    for column in tree.find_all(exp.Column):
+        if column.table in aliases:
+            column.set("table", exp.to_identifier(aliases[column.table]))
+        column.set("db", None)
+        column.set("catalog", None)
+
+    # In a SELECT over a single source, qualified and unqualified columns are the same column;
+    # correlated references to an outer query keep their qualifier
+    for scope in traverse_scope(tree):
+        if len(scope.sources) != 1:
+            continue
+        name = next(iter(scope.sources))
+        for column in scope.columns:
+            if column.table == name and column.find_ancestor(exp.Select) is scope.expression:
+                column.set("table", None)
+
+    # Children come before their parents in reversed pre-order
+    for node in reversed(list(tree.walk(bfs=False))):
+        sorted_node = _sort_commutative(node)
+        if sorted_node is not node:
+            if node is tree:
+                tree = sorted_node
+            else:
+                node.replace(sorted_node)
+    return tree
+
+
+def _load_fixture(domain_id: str, dialect: Optional[str]) -> Optional[bytes]:
+    """Build (once) and return the serialized SQLite fixture for a domain"""
+    if domain_id in _fixtures:
+        return _fixtures[domain_id]
+
+    fixture = None
+    sqlite_path = os.path.join(SQL_FIXTURE_DIR, f"{domain_id}.sqlite")
+    script_path = os.path.join(SQL_FIXTURE_DIR, f"{domain_id}.sql")
+    try:
+        if os.path.exists(sqlite_path):
+            source = sqlite3.connect(f"file:{sqlite_path}?mode=ro", uri=True)
+            try:
+                fixture = source.serialize()
+            finally:
+                source.close()
+        elif os.path.exists(script_path):
+            with open(script_path) as f:
+                statements = sqlglot.transpile(f.read(), read=dialect, write="sqlite")
+            conn = sqlite3.connect(":memory:")
+            try:
+                for statement in statements:
+                    conn.execute(_strip_qualifiers(statement))
+                conn.commit()
+                fixture = conn.serialize()
+            finally:
+                conn.close()
+    except (OSError, sqlite3.Error, SqlglotError) as e:
+        # Cached as missing, so a broken fixture is reported once and its items go to the LLM judge
+        print(f"SQL fixture for domain {domain_id} could not be loaded: {e}")
+        fixture = None
+
+    _fixtures[domain_id] = fixture
+    return fixture
+
+
+def _strip_qualifiers(sqlite_sql: str) -> str:
+    """Drop schema qualifiers so queries run against the fixture's flat table namespace"""
+    tree = sqlglot.parse_one(sqlite_sql, read="sqlite")
+    for table in tree.find_all(exp.Table):
+        table.set("db", None)
+        table.set("catalog", None)
+    return tree.sql(dialect="sqlite")
+
+
+def _execute(fixture: bytes, sql: str, dialect: Optional[str]) -> List[Tuple]:
+    conn = sqlite3.connect(":memory:")
+    try:
+        conn.deserialize(fixture)
+        deadline = time.monotonic() + SQL_EXECUTION_TIMEOUT_MS / 1000
+        conn.set_progress_handler(lambda: int(time.monotonic() > deadline), 10000)
+        query = _strip_qualifiers(sqlglot.transpile(sql, read=dialect, write="sqlite")[0])
+        rows = conn.execute(query).fetchall()
+    finally:
+        conn.close()
+    return [
+        tuple(round(v, SQL_RESULT_FLOAT_PRECISION) if isinstance(v, float) else v for v in row)
+        for row in rows
+    ]
+
+
+def compare_on_fixture(domain_id: str, agent_sql: str, golden_sql: str, dialect: Optional[str]) -> Optional[dict]:
+    """
+    Execute both queries on the domain fixture and compare result sets.
+    Only a mismatch decides the item (fail): equal results on one sample
+    dataset do not prove the queries equivalent, so a match returns None
+    and the item goes to the LLM judge, as does a query that cannot run.
+    """
+    fixture = _load_fixture(domain_id, dialect)
+    if fixture is None:
+        return None
+    try:
+        expected = _execute(fixture, golden_sql, dialect)
+    except (sqlite3.Error, SqlglotError) as e:
+        print(f"Golden SQL failed on fixture for domain {domain_id}: {e}")
+        return None
+    try:
+        actual = _execute(fixture, agent_sql, dialect)
+    except (sqlite3.Error, SqlglotError):
+        return None
+
+    ordered = sqlglot.parse_one(golden_sql, read=dialect).args.get("order") is not None
+    if not ordered:
+        expected, actual = sorted(expected, key=repr), sorted(actual, key=repr)
+    if expected == actual:
+        return None
+    return {"status": "fail", "reasoning": f"Result sets differ on the fixture ({len(actual)} rows vs {len(expected)} expected)"}
+
+
+def compare_sql(agent_answer: str, ground_truth: str, dialect: Optional[str], domain_id: Optional[str] = None) -> Optional[dict]:
+    """
+    Compare an agent's SQL answer with golden SQL.
+    Returns a pass/fail verdict, or None when the comparison is not conclusive.
+    """
+    golden_sql = extract_sql(ground_truth)
+    agent_sql = extract_sql(agent_answer)
+    if golden_sql is None or agent_sql is None:
+        return None
+
+    sqlglot_dialect = read_dialect(dialect)
+    try:
+        golden_tree = canonicalize(golden_sql, sqlglot_dialect)
+        agent_tree = canonicalize(agent_sql, sqlglot_dialect)
+    except SqlglotError:
+        return None
+
+    if golden_tree == agent_tree or golden_tree.sql() == agent_tree.sql():
+        return {"status": "pass", "reasoning": "SQL is equivalent to the golden query after canonicalization"}
+
+    if domain_id is not None:
+        return compare_on_fixture(domain_id, agent_sql, golden_sql, sqlglot_dialect)
+    return None
+
+
+async def sql_verdict(agent_answer: str, ground_truth: str, dialect: Optional[str], domain_id: Optional[str] = None) -> Optional[dict]:
+    """compare_sql off the event loop, since parsing and fixture execution are CPU bound"""
+    return await asyncio.to_thread(compare_sql, agent_answer, ground_truth, dialect, domain_id)
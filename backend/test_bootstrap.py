@@ -0,0 +1,60 @@
+"""Bootstrap intervals and run-vs-run comparisons"""
+import numpy as np
+import pytest
+
+from bootstrap import bootstrap_samples, compare_samples, percentile_interval
+
+
+def group(status: str, count: int, difficulty: str = "easy", latency: float = 0.0) -> dict:
+    return {
+        "status": status,
+        "difficulty": difficulty,
+        "count": count,
+        "latency_total": latency * count,
+        "latency_sq": latency * latency * count,
+        "timed": count if latency else 0
+    }
+
+
+RUN = [group("pass", 60, latency=2.0), group("fail", 40, latency=3.0), group("pass", 10, "hard"), group("warn", 10, "hard")]
+
+
+def test_no_verdicts_gives_no_samples():
+    assert bootstrap_samples([]) == {}
+    assert bootstrap_samples([group("error", 5)]) == {}
+
+
+def test_same_seed_gives_same_samples():
+    first = bootstrap_samples(RUN, resamples=500, seed=3)
+    second = bootstrap_samples(RUN, resamples=500, seed=3)
+    assert first.keys() == second.keys()
+    for name in first:
+        assert np.array_equal(first[name], second[name])
+
+
+def test_intervals_contain_point_estimates():
+    samples = bootstrap_samples(RUN, resamples=2000)
+    low, high = percentile_interval(samples["pass_rate"])
+    assert low < 70 / 120 * 100 < high
+    low, high = percentile_interval(samples["overall_score"])
+    assert low < 75 / 120 * 100 < high
+    low, high = percentile_interval(samples["avg_latency"])
+    assert low < 2.4 < high
+    assert set(samples) >= {"difficulty:Easy", "difficulty:Hard", "hallucination_rate"}
+
+
+def test_identical_runs_are_not_significantly_different():
+    candidate = bootstrap_samples(RUN, resamples=2000, seed=1)
+    baseline = bootstrap_samples(RUN, resamples=2000, seed=2)
+    comparison = compare_samples(candidate, baseline)
+    assert not comparison["pass_rate"]["significant"]
+    assert comparison["pass_rate"]["low"] < 0 < comparison["pass_rate"]["high"]
+
+
+def test_clearly_different_runs_are_significant():
+    candidate = bootstrap_samples([group("pass", 90), group("fail", 10)], resamples=2000, seed=1)
+    baseline = bootstrap_samples([group("pass", 50), group("fail", 50)], resamples=2000, seed=2)
+    comparison = compare_samples(candidate, baseline)["pass_rate"]
+    assert comparison["significant"]
+    assert comparison["difference"] == pytest.approx(40, abs=3)
+    assert comparison["p_value"] < 0.05
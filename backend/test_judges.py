@@ -0,0 +1,54 @@
+"""Deterministic judge tiers: only certain verdicts, everything else left to the LLM"""
+import pytest
+
+from judges import deterministic_verdict, numeric_judge, token_set_judge
+
+
+def decided(ground_truth: str, agent_answer: str):
+    verdict = deterministic_verdict(ground_truth, agent_answer)
+    return verdict and (verdict["decided_by"], verdict["status"])
+
+
+@pytest.mark.parametrize("ground_truth, agent_answer, expected", [
+    ("50%", "0.5", "pass"),
+    ("0.25", "25%", "pass"),
+    ("12.5 %", "0.125", "pass"),
+    ("0.25", "30%", None),
+    ("0.5", "0.5%", None),
+    ("50", "50%", None),
+    ("40%", "45%", "fail"),
+])
+def test_numeric_percent_and_fraction_pairs(ground_truth, agent_answer, expected):
+    verdict = numeric_judge(ground_truth, agent_answer)
+    assert (verdict and verdict["status"]) == expected
+
+
+@pytest.mark.parametrize("ground_truth, agent_answer, expected", [
+    ("42", "42.0", ("numeric", "pass")),
+    ("1,000", "$1000", ("numeric", "pass")),
+    ("42", "41", ("numeric", "fail")),
+    ("42", "The total is 42.", None),
+    ("42", "The total is not 42.", None),
+])
+def test_numeric_decides_bare_numbers_only(ground_truth, agent_answer, expected):
+    assert decided(ground_truth, agent_answer) == expected
+
+
+def test_exact_match_ignores_case_spacing_and_trailing_punctuation():
+    assert decided("Paris is the capital", "  paris IS the capital!") == ("exact", "pass")
+
+
+def test_token_tier_passes_punctuation_differences_only():
+    ground_truth = "Revenue grew, year over year, in Q4"
+    assert token_set_judge(ground_truth, "Revenue grew year over year in Q4")["status"] == "pass"
+    assert token_set_judge(ground_truth, "Revenue grew year over year, not in Q4") is None
+    assert token_set_judge(ground_truth, "In Q4 revenue grew year over year") is None
+
+
+def test_long_answer_with_added_negation_goes_to_llm():
+    ground_truth = "Paris is the capital of France and has many museums and parks"
+    assert decided(ground_truth, ground_truth.replace("is the", "is not the")) is None
+
+
+def test_deterministic_verdicts_are_certain():
+    assert deterministic_verdict("42", "42")["confidence"] == 100.0
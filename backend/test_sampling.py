@@ -0,0 +1,67 @@
+"""Binomial intervals and stratified sample allocation"""
+import pytest
+
+from sampling import SequentialGate, allocate, clopper_pearson_interval, stratified_sample, wilson_interval
+
+
+@pytest.mark.parametrize("successes, trials, expected", [
+    (5, 10, (0.187, 0.813)),
+    (0, 10, (0.0, 0.308)),
+    (10, 10, (0.692, 1.0)),
+    (1, 20, (0.001, 0.249)),
+])
+def test_clopper_pearson_known_values(successes, trials, expected):
+    low, high = clopper_pearson_interval(successes, trials, 0.95)
+    assert low == pytest.approx(expected[0], abs=1e-3)
+    assert high == pytest.approx(expected[1], abs=1e-3)
+
+
+def test_wilson_known_value_and_bounds():
+    low, high = wilson_interval(5, 10, 0.95)
+    assert low == pytest.approx(0.237, abs=1e-3)
+    assert high == pytest.approx(0.763, abs=1e-3)
+    assert wilson_interval(0, 10, 0.95)[0] == pytest.approx(0.0, abs=1e-12)
+    assert wilson_interval(10, 10, 0.95)[1] == pytest.approx(1.0, abs=1e-12)
+
+
+@pytest.mark.parametrize("interval", [wilson_interval, clopper_pearson_interval])
+def test_no_trials_is_uninformative(interval):
+    assert interval(0, 0, 0.95) == (0.0, 1.0)
+
+
+def test_gate_decides_once_interval_clears_threshold():
+    gate = SequentialGate(threshold=50, min_items=10)
+    for _ in range(9):
+        gate.record("pass")
+    assert gate.decision() is None
+    gate.record("error")
+    assert gate.decision() is None
+    gate.record("pass")
+    assert gate.decision() == "pass"
+
+
+@pytest.mark.parametrize("populations, size, expected", [
+    ({"easy": 50, "medium": 30, "hard": 20}, 10, {"easy": 5, "medium": 3, "hard": 2}),
+    ({"easy": 97, "medium": 2, "hard": 1}, 10, {"easy": 8, "medium": 1, "hard": 1}),
+    ({"a": 5, "b": 5}, 100, {"a": 5, "b": 5}),
+    ({"a": 1, "b": 1, "c": 1}, 2, {"a": 1, "b": 1, "c": 0}),
+])
+def test_allocate(populations, size, expected):
+    allocation = allocate(populations, size)
+    assert allocation == expected
+    assert sum(allocation.values()) == min(size, sum(populations.values()))
+
+
+def test_allocate_gives_every_stratum_at_least_one():
+    populations = {"easy": 1000, "medium": 3, "hard": 2, "expert": 1}
+    allocation = allocate(populations, 20)
+    assert all(count >= 1 for count in allocation.values())
+    assert sum(allocation.values()) == 20
+
+
+def test_stratified_sample_is_reproducible():
+    test_sets = [{"_id": str(i), "difficulty": ("easy", "hard")[i % 2]} for i in range(40)]
+    first, strata = stratified_sample(test_sets, 10, seed=7)
+    second, _ = stratified_sample(list(reversed(test_sets)), 10, seed=7)
+    assert [ts["_id"] for ts in first] == [ts["_id"] for ts in second]
+    assert strata == {"easy": {"population": 20, "sampled": 5}, "hard": {"population": 20, "sampled": 5}}
@@ -0,0 +1,71 @@
+"""SQL canonicalization and fixture comparison"""
+import pytest
+
+import sql_compare
+from sql_compare import canonicalize, compare_sql
+
+
+def equivalent(a: str, b: str) -> bool:
+    return canonicalize(a).sql() == canonicalize(b).sql()
+
+
+@pytest.mark.parametrize("agent_sql, golden_sql", [
+    ("select NAME from CUSTOMERS", "SELECT name FROM customers"),
+    ("SELECT c.name FROM maps.derived.customers c", "SELECT name FROM customers"),
+    ("SELECT name FROM customers WHERE 1 = id AND active", "SELECT name FROM customers WHERE active AND id = 1"),
+    ("SELECT c.name, COUNT(*) FROM customers c GROUP BY c.name", "SELECT name, count(*) FROM customers GROUP BY name"),
+    (
+        "SELECT o.id FROM orders o WHERE EXISTS (SELECT 1 FROM items i WHERE i.order_id = o.id)",
+        "SELECT id FROM orders WHERE EXISTS (SELECT 1 FROM items WHERE order_id = orders.id)",
+    ),
+])
+def test_canonically_equivalent(agent_sql, golden_sql):
+    assert equivalent(agent_sql, golden_sql)
+
+
+@pytest.mark.parametrize("agent_sql, golden_sql", [
+    ("SELECT a.id FROM x a JOIN y b ON a.id = b.id", "SELECT b.id FROM x a JOIN y b ON a.id = b.id"),
+    # An unqualified column in a subquery may refer to the subquery's own table
+    (
+        "SELECT id FROM orders WHERE EXISTS (SELECT 1 FROM items WHERE order_id = id)",
+        "SELECT id FROM orders WHERE EXISTS (SELECT 1 FROM items WHERE order_id = orders.id)",
+    ),
+    ("SELECT x FROM t WHERE x > 1", "SELECT x FROM t WHERE x > 2"),
+])
+def test_not_canonically_equivalent(agent_sql, golden_sql):
+    assert not equivalent(agent_sql, golden_sql)
+
+
+def test_canonical_match_passes():
+    verdict = compare_sql("```sql\nSELECT c.name FROM derived.customers c;\n```", "SELECT name FROM customers", "snowflake")
+    assert verdict["status"] == "pass"
+
+
+@pytest.fixture
+def fixture_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(sql_compare, "SQL_FIXTURE_DIR", str(tmp_path))
+    monkeypatch.setattr(sql_compare, "_fixtures", {})
+    (tmp_path / "shop.sql").write_text(
+        "CREATE TABLE t (x INT);\nINSERT INTO t VALUES (0);\nINSERT INTO t VALUES (5);\n"
+    )
+    return tmp_path
+
+
+def test_fixture_match_is_not_a_pass(fixture_dir):
+    # Both queries return the row 5 on the fixture, but they are not equivalent
+    assert compare_sql("SELECT x FROM t WHERE x > 1", "SELECT x FROM t WHERE x > 2", None, "shop") is None
+
+
+def test_fixture_mismatch_fails(fixture_dir):
+    verdict = compare_sql("SELECT x FROM t WHERE x >= 0", "SELECT x FROM t WHERE x > 2", None, "shop")
+    assert verdict["status"] == "fail"
+
+
+def test_unrunnable_agent_query_goes_to_llm(fixture_dir):
+    assert compare_sql("SELECT y FROM missing", "SELECT x FROM t", None, "shop") is None
+
+
+def test_broken_fixture_goes_to_llm(fixture_dir):
+    (fixture_dir / "broken.sql").write_text("CREATE TABLE t (x INT);\nINSERT INTO nope VALUES (1);\n")
+    assert compare_sql("SELECT x FROM t WHERE x > 1", "SELECT x FROM t", None, "broken") is None
+    assert sql_compare._fixtures["broken"] is None
@@ -0,0 +1,332 @@
+"""
+Standalone evaluation worker.
+Claims batches of run items from the `eval_run_items` queue with atomic
+leases, evaluates them and records each result exactly once. Any number of
+workers on any number of hosts can share one database; items held by a
+worker that dies are re-queued when their lease expires.
+
+Runs are executed by workers when the API is started with
+EVAL_RUN_EXECUTOR=worker.
+
+Usage:
+    python -m backend.worker --batch-size 50
+    python worker.py --exit-when-idle      (from the backend directory)
+"""
+import argparse
+import asyncio
+import os
+import socket
+import sys
+import uuid
+from datetime import datetime
+from typing import List, Optional
+
+# Backend modules import each other as top-level modules (the API runs as `uvicorn main:app` from here)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from database import connect_to_mongo, close_mongo_connection, get_collection, ensure_indexes
+from cache import ensure_cache_indexes, answer_key, load_recorded_answers
+from engine import run_engine, agent_config_hash, judge_config_hash, test_set_fingerprint
+from llm import LLM_WARMUP, shutdown_executor, model_settings, warm_up_models
+from runs import (
+    RUN_QUEUED, RUN_RUNNING, RUN_COMPLETED, RUN_ABORTED, TERMINAL_STATES, RunProgress,
+    get_runs_collection, result_id, result_document, carried_document,
+    test_set_update, answer_record, should_record_answer,
+    domain_prompt_hash, load_carried_results, load_domain_settings, recount_run
+)
+from rollups import RollupDelta, finalize_run_rollup
+from response_cache import bump_generation
+from run_items import (
+    WORKER_MAX_ATTEMPTS,
+    claim_items, extend_leases, complete_items, release_items, run_finished
+)
+
+# Items claimed per batch
+WORKER_BATCH_SIZE = int(os.getenv("WORKER_BATCH_SIZE", "50"))
+
+# Seconds to wait before polling again when the queue is empty
+WORKER_POLL_INTERVAL = float(os.getenv("WORKER_POLL_INTERVAL", "2.0"))
+
+# Seconds between lease extensions; must be well below WORKER_LEASE_SECONDS
+WORKER_HEARTBEAT_INTERVAL = float(os.getenv("WORKER_HEARTBEAT_INTERVAL", "15"))
+
+# MongoDB duplicate key error: another worker recorded the same result first
+DUPLICATE_KEY_ERROR = 11000
+
+
+def abandoned_result(item: dict) -> dict:
+    """Error result for an item whose lease expired WORKER_MAX_ATTEMPTS times"""
+    return {
+        "test_set_id": item["test_set_id"],
+        "difficulty": item.get("difficulty"),
+        "status": "error",
+        "confidence": None,
+        "decided_by": "worker",
+        "answer_source": "live",
+        "agent_answer": None,
+        "reasoning": f"Abandoned after {item['attempts'] - 1} expired leases",
+        "agent_latency_ms": None,
+        "judge_latency_ms": None,
+        "tokens": {}
+    }
+
+
+async def insert_results(run_id: str, records: List[tuple]) -> tuple:
+    """
+    Insert eval_results records with $setOnInsert upserts keyed by {run_id}:{test_set_id}.
+    Returns (indexes of records this call inserted, indexes that failed to write).
+    Records that already existed were written by another worker and are neither.
+    """
+    operations = [
+        UpdateOne({"_id": result_id(run_id, test_set_id)}, {"$setOnInsert": doc}, upsert=True)
+        for test_set_id, doc, _, _ in records
+    ]
+    try:
+        result = await get_collection("eval_results").bulk_write(operations, ordered=False)
+        return set(result.upserted_ids), set()
+    except BulkWriteError as e:
+        details = e.details or {}
+        inserted = {u["index"] for u in details.get("upserted", [])}
+        failed = {
+            error["index"] for error in details.get("writeErrors", [])
+            if error.get("code") != DUPLICATE_KEY_ERROR
+        }
+        return inserted, failed
+
+
+async def process_run_items(worker_id: str, run: dict, items: List[dict], concurrency: int):
+    """Evaluate and record one run's share of a claimed batch"""
+    run_id, domain_id = run["_id"], run["domain_id"]
+    options = run.get("options", {})
+    answer_mode = options.get("answer_mode", "live")
+    domain = await load_domain_settings(domain_id)
+    models = model_settings(domain)
+    config_hash = agent_config_hash(models)
+
+    await get_runs_collection().update_one(
+        {"_id": run_id, "status": RUN_QUEUED},
+        {"$set": {
+            "status": RUN_RUNNING,
+            "started_at": datetime.utcnow(),
+            "agent_config_hash": config_hash,
+            "models": models
+        }}
+    )
+
+    abandoned = [item for item in items if item["attempts"] > WORKER_MAX_ATTEMPTS]
+    active_ids = [item["test_set_id"] for item in items if item["attempts"] <= WORKER_MAX_ATTEMPTS]
+    test_sets = await get_collection("test_sets").find({"_id": {"$in": active_ids}}).to_list(length=None)
+
+    prompt_hash = await domain_prompt_hash(domain_id)
+    judge_hash = judge_config_hash(models, domain, options.get("judge_cascade", True))
+    fingerprints = {ts["_id"]: test_set_fingerprint(ts, prompt_hash, config_hash, judge_hash) for ts in test_sets}
+    carried = await load_carried_results(test_sets, fingerprints) if options.get("incremental") else {}
+    pending = [ts for ts in test_sets if ts["_id"] not in carried]
+    recorded_answers = None
+    if answer_mode == "replay":
+        recorded_answers = await load_recorded_answers(domain_id, pending, config_hash)
+
+    results = await run_engine(
+        pending,
+        concurrency=options.get("concurrency") or concurrency,
+        recorded_answers=recorded_answers,
+        judge_batch_size=domain.get("judge_batch_size", 1),
+        cascade=options.get("judge_cascade", True),
+        sql_context={"dialect": domain.get("dialect"), "domain_id": domain_id},
+        models=models
+    )
+
+    # (test set ID, eval_results record, test_sets update or None, engine result or None)
+    records = []
+    for test_set in test_sets:
+        previous = carried.get(test_set["_id"])
+        if previous is not None:
+            records.append((
+                test_set["_id"],
+                carried_document(run_id, test_set, previous),
+                {"$set": {"last_run_id": run_id, "last_result_id": result_id(run_id, test_set["_id"])}},
+                None
+            ))
+    for result in results:
+        fingerprint = fingerprints[result["test_set_id"]]
+        update = test_set_update(run_id, result, fingerprint) if result["status"] != "error" else None
+        records.append((result["test_set_id"], result_document(run_id, domain_id, result, fingerprint), update, result))
+    for item in abandoned:
+        records.append((item["test_set_id"], result_document(run_id, domain_id, abandoned_result(item), None), None, None))
+
+    inserted, failed = await insert_results(run_id, records) if records else (set(), set())
+
+    # Only the worker whose insert created a result applies its side effects
+    progress = RunProgress(run_id, 0)
+    rollup = RollupDelta(run_id, domain_id)
+    test_set_ops, answer_ops = [], []
+    for index in sorted(inserted):
+        test_set_id, doc, update, result = records[index]
+        progress.record(doc["status"], doc.get("decided_by") or "llm")
+        progress.add_usage(doc.get("tokens") or {})
+        rollup.add(doc)
+        if doc.get("answer_source") == "carried":
+            progress.carried += 1
+        if update is not None:
+            test_set_ops.append(UpdateOne({"_id": test_set_id}, update))
+        if result is not None and should_record_answer(answer_mode, result):
+            answer_ops.append(UpdateOne(
+                {"_id": answer_key(domain_id, test_set_id, config_hash)},
+                answer_record(domain_id, config_hash, result),
+                upsert=True
+            ))
+    if test_set_ops:
+        await get_collection("test_sets").bulk_write(test_set_ops, ordered=False)
+    if answer_ops:
+        await get_collection("agent_answers").bulk_write(answer_ops, ordered=False)
+    if inserted:
+        fields = progress.fields()
+        increments = {
+            "processed": fields["processed"],
+            "passed": fields["passed"],
+            "failed": fields["failed"],
+            "warned": fields["warned"],
+            "errored": fields["errored"],
+            "carried_forward": fields["carried_forward"],
+            "cost_usd": progress.cost_usd,
+            **{f"tokens.{key}": count for key, count in fields["tokens"].items()},
+            **{f"decided_by.{tier}": count for tier, count in fields["decided_by"].items()}
+        }
+        await get_runs_collection().update_one({"_id": run_id}, {"$inc": increments})
+        await rollup.flush()
+        await bump_generation(domain_id)
+        await abort_over_budget(run_id, options.get("budget_usd"))
+
+    # Items whose result failed to write stay leased and are retried after the lease expires
+    failed_ids = {result_id(run_id, records[index][0]) for index in failed}
+    await complete_items(worker_id, [item["_id"] for item in items if item["_id"] not in failed_ids])
+
+    await finish_run(run_id)
+
+
+async def abort_over_budget(run_id: str, budget_usd: Optional[float]):
+    """Abort a run whose recorded cost reached its budget; its remaining items are skipped"""
+    if budget_usd is None:
+        return
+    await get_runs_collection().update_one(
+        {"_id": run_id, "status": {"$in": [RUN_QUEUED, RUN_RUNNING]}, "cost_usd": {"$gte": budget_usd}},
+        {"$set": {
+            "status": RUN_ABORTED,
+            "error": f"Budget cap exceeded: ${budget_usd:.4f}",
+            "completed_at": datetime.utcnow()
+        }}
+    )
+
+
+async def finish_run(run_id: str):
+    """Record a run's final counters once every item is done"""
+    if not await run_finished(run_id):
+        return
+    # Final counters come from the recorded results, so they are exact even if a worker died mid-batch
+    fields = {**await recount_run(run_id), "completed_at": datetime.utcnow()}
+    runs = get_runs_collection()
+    await runs.update_one(
+        {"_id": run_id, "status": {"$nin": [RUN_COMPLETED, RUN_ABORTED]}},
+        {"$set": {**fields, "status": RUN_COMPLETED}}
+    )
+    await runs.update_one({"_id": run_id, "status": RUN_ABORTED}, {"$set": fields})
+    await finalize_run_rollup(run_id)
+
+
+async def keep_leases(worker_id: str):
+    """Extend this worker's leases until cancelled"""
+    while True:
+        await asyncio.sleep(WORKER_HEARTBEAT_INTERVAL)
+        try:
+            await extend_leases(worker_id)
+        except Exception as e:
+            print(f"Worker {worker_id} failed to extend leases: {e}")
+
+
+async def run_worker(worker_id: str, batch_size: int, concurrency: int, exit_when_idle: bool = False) -> int:
+    """Claim and process batches until cancelled (or until the queue is empty). Returns items processed."""
+    heartbeat_task = asyncio.create_task(keep_leases(worker_id))
+    held: List[dict] = []
+    processed = 0
+    try:
+        while True:
+            held = await claim_items(worker_id, batch_size)
+            if not held:
+                if exit_when_idle:
+                    return processed
+                await asyncio.sleep(WORKER_POLL_INTERVAL)
+                continue
+
+            by_run = {}
+            for item in held:
+                by_run.setdefault(item["run_id"], []).append(item)
+            runs = await get_runs_collection().find({"_id": {"$in": list(by_run)}}).to_list(length=None)
+            runs = {run["_id"]: run for run in runs}
+
+            async def process(run_id: str, items: List[dict]):
+                run = runs.get(run_id)
+                if run is None:
+                    # The run was deleted; nothing to record
+                    await complete_items(worker_id, [item["_id"] for item in items])
+                    return
+                if run["status"] in TERMINAL_STATES:
+                    # Aborted (or failed) runs start no new items
+                    await complete_items(worker_id, [item["_id"] for item in items])
+                    await finish_run(run_id)
+                    return
+                try:
+                    await process_run_items(worker_id, run, items, concurrency)
+                except Exception as e:
+                    print(f"Worker {worker_id} failed on run {run_id}: {e}")
+                    await release_items(worker_id, [item["_id"] for item in items])
+
+            await asyncio.gather(*(process(run_id, items) for run_id, items in by_run.items()))
+            processed += len(held)
+            held = []
+    finally:
+        heartbeat_task.cancel()
+        # Hand unfinished items back to the queue instead of waiting for their leases to expire
+        if held:
+            await release_items(worker_id, [item["_id"] for item in held])
+
+
+async def serve(args):
+    await connect_to_mongo()
+    await ensure_indexes()
+    await ensure_cache_indexes()
+    if LLM_WARMUP:
+        domains = await get_collection("domains").find(
+            {"is_active": True},
+            {"agent_model": 1, "judge_model": 1, "agent_temperature": 1, "agent_max_output_tokens": 1}
+        ).to_list(length=None)
+        await warm_up_models(domains)
+    worker_id = args.worker_id or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+    print(f"Worker {worker_id} started")
+    try:
+        concurrency = args.concurrency or args.batch_size
+        processed = await run_worker(worker_id, args.batch_size, concurrency, args.exit_when_idle)
+        print(f"Worker {worker_id} processed {processed} items")
+    finally:
+        shutdown_executor()
+        await close_mongo_connection()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate queued run items")
+    parser.add_argument("--batch-size", type=int, default=WORKER_BATCH_SIZE)
+    parser.add_argument("--concurrency", type=int, default=None,
+                        help="Items evaluated at once per batch when the run does not set concurrency (default: batch size)")
+    parser.add_argument("--worker-id", default=None)
+    parser.add_argument("--exit-when-idle", action="store_true", help="Exit once the queue is empty")
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
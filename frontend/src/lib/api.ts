@@ -212,9 +212,26 @@ export interface EvalMetrics {
 export interface EvalRunResponse {
   status: string;
   run_id: string;
-  test_sets_evaluated: number;
+  total: number;
+  stream_url: string;
+  message: string;
 }
 
+export interface EvalRunProgress {
+  id: string;
+  status: 'queued' | 'running' | 'completed' | 'failed' | 'aborted';
+  processed: number;
+  total: number;
+  passed: number;
+  failed: number;
+  warned: number;
+  errored: number;
+  eta_seconds?: number | null;
+  error?: string | null;
+}
+
+export const TERMINAL_RUN_STATES = ['completed', 'failed', 'aborted'];
+
 /**
  * Dashboard types
  */
@@ -567,6 +584,43 @@ export const api = {
       });
     },
 
+    /**
+     * Follow a run's progress stream (NDJSON, so the auth header can be sent)
+     * until the run finishes or the signal aborts. Resolves with the last state.
+     */
+    streamRun: async (
+      streamUrl: string,
+      onProgress: (progress: EvalRunProgress) => void,
+      signal?: AbortSignal
+    ): Promise<EvalRunProgress | null> => {
+      const token = getToken();
+      const response = await fetch(`${API_BASE_URL}${streamUrl}?format=ndjson`, {
+        headers: token ? { Authorization: `Bearer ${token}` } : {},
+        signal,
+      });
+      if (!response.ok || !response.body) {
+        throw new Error(`API Error: ${response.status} ${response.statusText}`);
+      }
+
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = '';
+      let last: EvalRunProgress | null = null;
+      while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        const lines = buffer.split('\n');
+        buffer = lines.pop() ?? '';
+        for (const line of lines) {
+          if (!line.trim()) continue;
+          last = JSON.parse(line) as EvalRunProgress;
+          onProgress(last);
+        }
+      }
+      return last;
+    },
+
     /**
      * Get metrics for a domain
      */
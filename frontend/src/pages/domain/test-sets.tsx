@@ -10,8 +10,8 @@ import { Select, SelectContent, SelectItem, SelectTrigger, SelectValue } from "@
 import { Play, CheckCircle2, XCircle, AlertCircle, Plus, Trash2, CheckCircle, Sparkles } from "lucide-react";
 import { useRoute } from "wouter";
 import { useQuery, useMutation, useQueryClient } from "@tanstack/react-query";
-import { api, TestSet, TestSetCreate } from "@/lib/api";
-import { useState } from "react";
+import { api, TestSet, TestSetCreate, EvalRunProgress, TERMINAL_RUN_STATES } from "@/lib/api";
+import { useEffect, useRef, useState } from "react";
 import { useToast } from "@/hooks/use-toast";
 import { Card, CardContent } from "@/components/ui/card";
 
@@ -24,6 +24,8 @@ export default function TestSets() {
   const [showTestSets, setShowTestSets] = useState(false);
   const [isApproved, setIsApproved] = useState(false);
   const [showResults, setShowResults] = useState(false);
+  const [runProgress, setRunProgress] = useState<EvalRunProgress | null>(null);
+  const streamAbort = useRef<AbortController | null>(null);
   const [newTestSet, setNewTestSet] = useState<TestSetCreate>({
     question: "",
     ground_truth: "",
@@ -88,17 +90,66 @@ export default function TestSets() {
     },
   });
 
+  // Stop following a run's progress when leaving the page
+  useEffect(() => () => streamAbort.current?.abort(), []);
+
+  // Follow a queued run's progress stream and refresh results once it finishes
+  const followRun = async (streamUrl: string) => {
+    streamAbort.current?.abort();
+    const controller = new AbortController();
+    streamAbort.current = controller;
+    try {
+      const final = await api.evaluation.streamRun(streamUrl, setRunProgress, controller.signal);
+      if (!final || !TERMINAL_RUN_STATES.includes(final.status)) return;
+      queryClient.invalidateQueries({ queryKey: ["testSets", domainId] });
+      queryClient.invalidateQueries({ queryKey: ["metrics", domainId] });
+      setShowResults(true);
+      if (final.status === "completed") {
+        toast({
+          title: "Success",
+          description: `Evaluation completed: ${final.passed} of ${final.total} test sets passed.`,
+        });
+      } else {
+        toast({
+          title: "Error",
+          description: `Evaluation ${final.status}${final.error ? `: ${final.error}` : ""}`,
+          variant: "destructive",
+        });
+      }
+    } catch (error) {
+      if (controller.signal.aborted) return;
+      toast({
+        title: "Error",
+        description: `Lost evaluation progress: ${(error as Error).message}`,
+        variant: "destructive",
+      });
+    } finally {
+      if (streamAbort.current === controller) {
+        streamAbort.current = null;
+        setRunProgress(null);
+      }
+    }
+  };
+
   // Run evaluation mutation
   const runEvalMutation = useMutation({
     mutationFn: () => api.evaluation.run(domainId!),
     onSuccess: (data) => {
-      queryClient.invalidateQueries({ queryKey: ["testSets", domainId] });
-      queryClient.invalidateQueries({ queryKey: ["metrics", domainId] });
-      setShowResults(true);
+      setRunProgress({
+        id: data.run_id,
+        status: "queued",
+        processed: 0,
+        total: data.total,
+        passed: 0,
+        failed: 0,
+        warned: 0,
+        errored: 0,
+      });
       toast({
         title: "Success",
-        description: `Evaluation completed! Evaluated ${(data as any).test_sets_evaluated} test sets.`,
+        description: `Evaluation queued for ${data.total} test sets.`,
       });
+      followRun(data.stream_url);
     },
     onError: (error: Error) => {
       toast({
@@ -252,10 +303,14 @@ export default function TestSets() {
               <Button
                 className="gap-2 bg-indigo-600 hover:bg-indigo-700 shadow-md shadow-indigo-200"
                 onClick={() => runEvalMutation.mutate()}
-                disabled={runEvalMutation.isPending || testSets.length === 0}
+                disabled={runEvalMutation.isPending || !!runProgress || testSets.length === 0}
               >
                 <Play className="w-4 h-4" />
-                {runEvalMutation.isPending ? "Running..." : "Run Evaluation"}
+                {runProgress
+                  ? `Running... ${runProgress.processed}/${runProgress.total}${
+                      runProgress.eta_seconds != null ? ` (ETA ${Math.ceil(runProgress.eta_seconds)}s)` : ""
+                    }`
+                  : runEvalMutation.isPending ? "Running..." : "Run Evaluation"}
               </Button>
             )}
           </div>